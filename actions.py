@@ -5,6 +5,7 @@ from typing import Optional, Tuple, TYPE_CHECKING
 
 import color  # type: ignore
 import exceptions  # type: ignore
+import tracing  # type: ignore
 
 if TYPE_CHECKING:
     from engine import Engine
@@ -18,6 +19,15 @@ class Action:
         super().__init__()
         self.entity = entity
 
+    # every subclass's perform shows up in traces, see tracing.py
+    def __init_subclass__( cls, **kwargs ) -> None:
+
+        super().__init_subclass__( **kwargs )
+
+        if "perform" in cls.__dict__:
+
+            cls.perform = tracing.traced_perform( cls.perform ) # type: ignore
+
     # return the engine this action belongs to
     @property
     def engine( self ) -> Engine:
@@ -33,6 +43,38 @@ class Action:
 
         # this method must be overridden by Action subclasses
         raise NotImplementedError()
+
+    # return why this action can't be performed right now, or None if it can. nothing is
+    # changed, perform raises exceptions.Impossible with the same reason
+    def check( self ) -> Optional[ str ]:
+
+        return None
+
+    @property
+    def can_perform( self ) -> bool:
+
+        return self.check() is None
+
+    # perform this action if it can be and return None, otherwise return the reason it
+    # can't. for ai, which has no use for the exception the player's actions raise
+    def try_perform( self ) -> Optional[ str ]:
+
+        reason = self.check()
+
+        if reason is None:
+
+            self.perform()
+
+        return reason
+
+    # raise exceptions.Impossible if this action can't be performed
+    def require( self ) -> None:
+
+        reason = self.check()
+
+        if reason is not None:
+
+            raise exceptions.Impossible( reason )
     
 # pickup an item and add it to the inventory, if there is room for it
 class PickupAction( Action ):
@@ -41,31 +83,44 @@ class PickupAction( Action ):
 
         super().__init__( entity )
 
-    def perform( self ) -> None:
-
-        actor_location_x = self.entity.x
-        actor_location_y = self.entity.y
-        inventory = self.entity.inventory
+    # the item on the actor's tile, if there is one
+    @property
+    def item_here( self ) -> Optional[ Item ]:
 
         for item in self.engine.game_map.items:
 
-            if actor_location_x == item.x and actor_location_y == item.y:
+            if self.entity.x == item.x and self.entity.y == item.y:
+
+                return item
+
+        return None
+
+    def check( self ) -> Optional[ str ]:
+
+        if self.item_here is None:
+
+            return "There is nothing here to pick up."
 
-                if len( inventory.items ) >= inventory.capacity:
+        if len( self.entity.inventory.items ) >= self.entity.inventory.capacity:
 
-                    raise exceptions.Impossible( "Your inventory is full." )
-                
-                self.engine.game_map.entities.remove( item )
+            return "Your inventory is full."
 
-                item.parent = self.entity.inventory
+        return None
+
+    def perform( self ) -> None:
+
+        self.require()
+
+        item = self.item_here
+        inventory = self.entity.inventory
 
-                inventory.items.append( item )
+        self.engine.game_map.entities.remove( item )
 
-                self.engine.message_log.add_message( f"You picked up the {item.name}!" )
+        item.parent = inventory
 
-                return
-            
-        raise exceptions.Impossible( "There is nothing here to pick up." )
+        inventory.items.append( item )
+
+        self.engine.message_log.add_message( f"You picked up the {item.name}!" )
     
 class ItemAction( Action ):
 
@@ -84,6 +139,14 @@ class ItemAction( Action ):
 
         return self.engine.game_map.get_actor_at_location( *self.target_xy )
     
+    def check( self ) -> Optional[ str ]:
+
+        if self.item.consumable:
+
+            return self.item.consumable.check( self )
+
+        return None
+
     # invok the item's ability, this action will be given to provide context
     def perform( self ) -> None:
 
@@ -121,20 +184,47 @@ class WaitAction( Action ):
 #
 class TakeStairsAction( Action ):
 
-    def perform( self ) -> None:
+    def check( self ) -> Optional[ str ]:
 
-        if( self.entity.x, self.entity.y ) == self.engine.game_map.downstairs_location:
+        if ( self.entity.x, self.entity.y ) != self.engine.game_map.downstairs_location:
 
-            self.engine.game_world.generate_floor()
+            return "There are no stairs here."
 
-            self.engine.message_log.add_message(
+        return None
 
-                "You descend the staircase.", color.descend
-            )
-        else:
+    def perform( self ) -> None:
+
+        self.require()
+
+        self.engine.game_world.generate_floor()
 
-            raise exceptions.Impossible( "There are no stairs here." )
+        self.engine.message_log.add_message(
+
+            "You descend the staircase.", color.descend
+        )
     
+#
+class TakeUpStairsAction( Action ):
+
+    def check( self ) -> Optional[ str ]:
+
+        if ( self.entity.x, self.entity.y ) != self.engine.game_map.upstairs_location:
+
+            return "There are no stairs here."
+
+        return None
+
+    def perform( self ) -> None:
+
+        self.require()
+
+        self.engine.game_world.ascend()
+
+        self.engine.message_log.add_message(
+
+            "You ascend the staircase.", color.ascend
+        )
+
 #
 class ActionWithDirection( Action ):
 
@@ -171,14 +261,20 @@ class ActionWithDirection( Action ):
 # attacks an enemy entity if it exists on the target tile
 class MeleeAction( ActionWithDirection ):
 
+    def check( self ) -> Optional[ str ]:
+
+        if not self.target_actor:
+
+            return "Nothing to attack."
+
+        return None
+
     def perform( self ) -> None:
 
-        target = self.target_actor
+        self.require()
 
-        if not target:
+        target = self.target_actor
 
-            raise exceptions.Impossible("Nothing to attack.")
-        
         # execute combat sequence
         damage = self.entity.fighter.power - target.fighter.defense
 
@@ -208,30 +304,53 @@ class MeleeAction( ActionWithDirection ):
 # move the player in the specified direction
 class MovementAction( ActionWithDirection ):
 
-    def perform( self ) -> None:
+    def check( self ) -> Optional[ str ]:
 
         dest_x, dest_y = self.dest_xy
+        game_map = self.engine.game_map
 
-        if not self.engine.game_map.in_bounds( dest_x, dest_y ):
+        if not game_map.in_bounds( dest_x, dest_y ):
 
             # destination is out of bounds
-            raise exceptions.Impossible("That way is blocked.")
+            return "That way is blocked."
         
-        if not self.engine.game_map.tiles[ "walkable" ][ dest_x, dest_y ]:
+        if not game_map.tiles[ "walkable" ][ dest_x, dest_y ]:
 
             # destination is blocked by a tile
-            raise exceptions.Impossible("That way is blocked.")
+            return "That way is blocked."
         
-        if self.engine.game_map.get_blocking_entity_at_location( dest_x, dest_y ):
+        if game_map.get_blocking_entity_at_location( dest_x, dest_y ):
 
             # destination is blocked by an entity
-            raise exceptions.Impossible("That way is blocked.")
-        
+            return "That way is blocked."
+
+        return None
+
+    def perform( self ) -> None:
+
+        self.require()
+
         self.entity.move( self.dx, self.dy )
 
 # decides to attack or move depending on the contents of the target tile
 class BumpAction( ActionWithDirection ):
 
+    def check( self ) -> Optional[ str ]:
+
+        if self.target_actor:
+
+            return None
+
+        return MovementAction( self.entity, self.dx, self.dy ).check()
+
+    def try_perform( self ) -> Optional[ str ]:
+
+        if self.target_actor:
+
+            return MeleeAction( self.entity, self.dx, self.dy ).perform()
+
+        return MovementAction( self.entity, self.dx, self.dy ).try_perform()
+
     def perform( self ) -> None:
 
         if self.target_actor:
@@ -0,0 +1,109 @@
+# periodic saves that don't stall the game.
+#
+# the only work done on the main thread is taking a snapshot of the engine, which copies
+# the map and entity state into plain arrays. encoding, compressing and writing the file
+# happen on a worker thread, and the finished file is renamed over the old save so a
+# crash mid-write leaves the previous save intact
+from __future__ import annotations
+
+from concurrent.futures import Future, ThreadPoolExecutor
+import time
+import traceback
+from typing import Optional, TYPE_CHECKING, Union
+
+import instrumentation # type: ignore
+import save_format # type: ignore
+
+if TYPE_CHECKING:
+    from engine import Engine # type: ignore
+
+# write_snapshot, timed on the worker thread
+_write_snapshot = instrumentation.timed( "autosave.write" )( save_format.write_snapshot )
+
+class Autosaver:
+
+    def __init__(
+        self,
+        filename: str,
+        interval: float = 60.0,
+        codec: Union[ str, save_format.Codec, None ] = None
+    ):
+        self.filename = filename
+
+        # a save_format.Codec or a spec, the same as Engine.save_as takes
+        self.codec = save_format.Codec.of( codec )
+
+        # seconds between autosaves
+        self.interval = interval
+
+        self.last_save = time.perf_counter()
+
+        # time spent on the main thread by the last autosave
+        self.snapshot_time = 0.0
+
+        self._executor = ThreadPoolExecutor( max_workers=1, thread_name_prefix="autosave" )
+        self._pending: Optional[ Future ] = None
+
+    # true while a save is being written in the background
+    @property
+    def saving( self ) -> bool:
+
+        return self._pending is not None and not self._pending.done()
+
+    # save the engine if the interval has passed since the last save
+    def update( self, engine: Engine ) -> None:
+
+        if time.perf_counter() - self.last_save >= self.interval:
+
+            self.save( engine )
+
+    # snapshot the engine and write it in the background, returns false if the previous
+    # save hasn't finished yet, in which case this one is skipped rather than queued
+    def save( self, engine: Engine ) -> bool:
+
+        if self.saving:
+
+            return False
+
+        self.wait()
+
+        start = time.perf_counter()
+
+        with instrumentation.timer( "autosave.snapshot" ):
+
+            data = save_format.snapshot( engine )
+
+        self.snapshot_time = time.perf_counter() - start
+
+        # the journal carries on from this save
+        if engine.journal is not None:
+
+            engine.journal.rotate()
+
+        self._pending = self._executor.submit(
+            _write_snapshot, data, self.filename, self.codec
+        )
+        self.last_save = time.perf_counter()
+
+        return True
+
+    # block until the save in progress, if any, has been written. a failed autosave is
+    # reported but doesn't interrupt the game
+    def wait( self ) -> None:
+
+        if self._pending is None:
+
+            return
+
+        try:
+            self._pending.result()
+        except Exception:
+            traceback.print_exc()
+
+        self._pending = None
+
+    # finish the save in progress and stop the worker thread
+    def close( self ) -> None:
+
+        self.wait()
+        self._executor.shutdown()
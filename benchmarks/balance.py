@@ -0,0 +1,277 @@
+# play many seeded games with the headless bot across a process pool, to tune monster
+# counts, spawn chances and fighter stats. reports how deep and how long the bot survives,
+# kills and xp by the floor it died on, game throughput and worker memory.
+#
+# balance changes are given as json, either inline or as a file:
+#   max_monsters_by_floor, max_items_by_floor   [ [ floor, count ], ... ]
+#   enemy_chances, item_chances                 { floor: [ [ entity name, weight ], ... ] }
+#   fighters                                    { entity name: { hp, base_power, base_defense } }
+#   tactics                                     { turn_rollouts, rollouts, depth, ... }
+# where entity names are those in entity_factories. the tactics only matter once a tactical
+# monster such as orc_captain is added to enemy_chances, none spawn by default.
+#
+# run from the repository root:
+#   python -m benchmarks.balance --games 2000 --turns 5000
+#   python -m benchmarks.balance --balance '{"fighters": {"orc": {"hp": 8}}}'
+#   python -m benchmarks.balance --games 200 --scaling
+from __future__ import annotations
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+try:
+    import resource
+except ImportError: # not available on windows, memory isn't reported there
+    resource = None # type: ignore
+
+from benchmarks.dungeon_gen import describe # type: ignore
+from components.ai import TacticalEnemy # type: ignore
+import entity_factories # type: ignore
+import headless # type: ignore
+import proc_gen # type: ignore
+
+# apply balance changes to the module level tables, runs once in every worker process and
+# never in the parent, so one run's balance can't leak into the next
+def apply_balance( balance: Dict[ str, Any ] ) -> None:
+
+    for name in ( "max_monsters_by_floor", "max_items_by_floor" ):
+
+        if name in balance:
+
+            setattr( proc_gen, name, [ tuple( entry ) for entry in balance[ name ] ] )
+
+    for name in ( "enemy_chances", "item_chances" ):
+
+        if name in balance:
+
+            setattr( proc_gen, name, {
+                int( floor ): [
+                    ( getattr( entity_factories, entity ), weight ) for entity, weight in chances
+                ]
+                for floor, chances in balance[ name ].items()
+            } )
+
+    for entity, stats in balance.get( "fighters", {} ).items():
+
+        fighter = getattr( entity_factories, entity ).fighter
+
+        if "hp" in stats:
+
+            fighter.max_hp = stats[ "hp" ]
+            fighter._hp = stats[ "hp" ]
+
+        for stat in ( "base_power", "base_defense" ):
+
+            if stat in stats:
+
+                setattr( fighter, stat, stats[ stat ] )
+
+    # the settings of the elite monsters' lookahead, see TacticalEnemy
+    for setting, value in balance.get( "tactics", {} ).items():
+
+        if not hasattr( TacticalEnemy, setting ):
+
+            raise ValueError( f"unknown tactics setting { setting }" )
+
+        setattr( TacticalEnemy, setting, value )
+
+# play a single game and return its report, runs in a worker process
+def play_one( job: Tuple[ int, int ] ) -> Dict[ str, Any ]:
+
+    seed, turns = job
+
+    report = headless.simulate( seed, turns )
+
+    # peak resident memory of this worker so far, in kilobytes on linux
+    report[ "worker" ] = os.getpid()
+    report[ "max_rss" ] = (
+        resource.getrusage( resource.RUSAGE_SELF ).ru_maxrss if resource is not None else 0
+    )
+    return report
+
+# play "games" games of at most "turns" turns and return the aggregated report
+def run(
+    games: int,
+    turns: int,
+    balance: Optional[ Dict[ str, Any ] ] = None,
+    seed: int = 0,
+    workers: Optional[ int ] = None
+) -> dict:
+
+    balance = balance or {}
+
+    jobs = [ ( seed + i, turns ) for i in range( games ) ]
+
+    workers = workers or os.cpu_count() or 1
+
+    start = time.perf_counter()
+
+    # games are independent and only their reports come back, so throughput grows with
+    # the number of workers until they run out of cores. a single worker is still its own
+    # process, the balance changes the module level tables and must not outlive the run
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=apply_balance, initargs=( balance, )
+    ) as pool:
+
+        chunksize = max( 1, len( jobs ) // ( workers * 8 ) )
+        results = list( pool.map( play_one, jobs, chunksize=chunksize ) )
+
+    elapsed = time.perf_counter() - start
+
+    total_turns = sum( r[ "turns" ] for r in results )
+
+    # the peak of every worker, each one reported with every game it played
+    peaks: Dict[ int, int ] = {}
+
+    for r in results:
+
+        peaks[ r[ "worker" ] ] = max( peaks.get( r[ "worker" ], 0 ), r[ "max_rss" ] )
+
+    report: dict = {
+        "games": len( results ),
+        "turns_limit": turns,
+        "workers": workers,
+        "wall_time": elapsed,
+        "games_per_sec": len( results ) / elapsed,
+        "turns_per_sec": total_turns / elapsed,
+        "balance": balance,
+        "survived": sum( r[ "alive" ] for r in results ) / len( results ),
+        "floor": describe( [ r[ "floor" ] for r in results ] ),
+        "turns": describe( [ r[ "turns" ] for r in results ] ),
+        "kills": describe( [ r[ "kills" ] for r in results ] ),
+        "xp": describe( [ r[ "xp" ] for r in results ] ),
+        "character_level": describe( [ r[ "character_level" ] for r in results ] ),
+        "phases_us_per_turn": {
+            phase: sum( r[ "phases" ][ phase ] for r in results ) / max( total_turns, 1 ) * 1e6
+            for phase in headless.PHASES
+        },
+        "worker_max_rss_mb": max( peaks.values() ) / 1024 if peaks else 0.0,
+        "by_floor": {}
+    }
+
+    # how the games that ended on each floor went
+    for floor in sorted( { r[ "floor" ] for r in results } ):
+
+        floor_results = [ r for r in results if r[ "floor" ] == floor ]
+
+        report[ "by_floor" ][ floor ] = {
+            "games": len( floor_results ),
+            "died": sum( not r[ "alive" ] for r in floor_results ),
+            "turns": describe( [ r[ "turns" ] for r in floor_results ] ),
+            "kills": describe( [ r[ "kills" ] for r in floor_results ] ),
+            "xp": describe( [ r[ "xp" ] for r in floor_results ] )
+        }
+    return report
+
+# print a report in a readable form
+def print_report( report: dict ) -> None:
+
+    print(
+        f"{ report[ 'games' ] } games in { report[ 'wall_time' ]:.2f}s "
+        f"on { report[ 'workers' ] } workers: { report[ 'games_per_sec' ]:.1f} games/sec, "
+        f"{ report[ 'turns_per_sec' ]:.0f} turns/sec"
+    )
+    print(
+        f"survived { report[ 'turns_limit' ] } turns: { report[ 'survived' ]:.1%}, "
+        f"worker peak memory { report[ 'worker_max_rss_mb' ]:.1f}MB"
+    )
+
+    for key in ( "floor", "turns", "kills", "xp", "character_level" ):
+
+        values = report[ key ]
+
+        print(
+            f"  { key:<16} mean { values[ 'mean' ]:8.2f}  p50 { values[ 'p50' ]:g}"
+            f"  p95 { values[ 'p95' ]:g}  max { values[ 'max' ]:g}"
+        )
+
+    print( "  time per turn " + ", ".join(
+        f"{ phase } { us:.1f}us" for phase, us in report[ "phases_us_per_turn" ].items()
+    ) )
+
+    print( f"\n  { 'floor':>5} { 'games':>6} { 'died':>6} { 'turns':>8} { 'kills':>6} { 'xp':>8}" )
+
+    for floor, data in report[ "by_floor" ].items():
+
+        print(
+            f"  { floor:>5} { data[ 'games' ]:>6} { data[ 'died' ]:>6} "
+            f"{ data[ 'turns' ][ 'mean' ]:8.1f} { data[ 'kills' ][ 'mean' ]:6.1f} "
+            f"{ data[ 'xp' ][ 'mean' ]:8.1f}"
+        )
+
+# run the same games on 1, 2, 4 ... workers and print the speedup of each
+def print_scaling(
+    games: int, turns: int, balance: Dict[ str, Any ], seed: int, counts: Sequence[ int ]
+) -> None:
+
+    base: Optional[ float ] = None
+
+    for workers in counts:
+
+        report = run( games, turns, balance, seed, workers )
+
+        base = base or report[ "games_per_sec" ]
+        speedup = report[ "games_per_sec" ] / base
+
+        print(
+            f"  { workers:>3} workers { report[ 'games_per_sec' ]:8.1f} games/sec "
+            f"speedup { speedup:5.2f}x efficiency { speedup / workers:6.1%}"
+        )
+
+def load_balance( text: Optional[ str ] ) -> Dict[ str, Any ]:
+
+    if not text:
+
+        return {}
+
+    if os.path.isfile( text ):
+
+        with open( text ) as f:
+
+            return json.load( f )
+
+    return json.loads( text )
+
+def main( argv: Optional[ List[ str ] ] = None ) -> None:
+
+    parser = argparse.ArgumentParser( description="Play many bot games to tune game balance." )
+    parser.add_argument( "--games", type=int, default=200 )
+    parser.add_argument( "--turns", type=int, default=5000, help="turns per game at most" )
+    parser.add_argument( "--balance", help="balance changes as json, or a json file" )
+    parser.add_argument( "--seed", type=int, default=0 )
+    parser.add_argument( "--workers", type=int, default=None )
+    parser.add_argument(
+        "--scaling", action="store_true", help="measure the speedup from 1 worker up to --workers"
+    )
+    parser.add_argument( "--json", help="also write the report to this file" )
+    args = parser.parse_args( argv )
+
+    balance = load_balance( args.balance )
+
+    if args.scaling:
+
+        workers = args.workers or os.cpu_count() or 1
+
+        counts = sorted( { 2 ** i for i in range( workers.bit_length() ) } | { workers } )
+
+        print_scaling( args.games, args.turns, balance, args.seed, counts )
+
+        return
+
+    report = run( args.games, args.turns, balance, args.seed, args.workers )
+
+    print_report( report )
+
+    if args.json:
+
+        with open( args.json, "w" ) as f:
+
+            json.dump( report, f, indent=2 )
+
+if __name__ == "__main__":
+
+    main()
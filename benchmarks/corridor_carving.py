@@ -0,0 +1,95 @@
+# measure tile writes per second when carving corridors one cell at a time,
+# one fancy-index assignment per corridor, and all corridors in a single batch.
+#
+# run from the repository root:
+#   python -m benchmarks.corridor_carving --size 1000 --corridors 5000
+from __future__ import annotations
+
+import argparse
+import random
+import time
+from typing import Callable, List, Optional
+
+import numpy as np
+
+from game_map import GameMap # type: ignore
+import proc_gen # type: ignore
+import tile_types # type: ignore
+
+# carve every tunnel by assigning one tile at a time, the way generate_dungeon used to
+def carve_per_cell( dungeon: GameMap, tunnels: List[ np.ndarray ] ) -> None:
+
+    for tunnel in tunnels:
+
+        for x, y in tunnel.T.tolist():
+
+            dungeon.tiles[ x, y ] = tile_types.floor
+
+# carve each tunnel with its own fancy-index assignment
+def carve_per_corridor( dungeon: GameMap, tunnels: List[ np.ndarray ] ) -> None:
+
+    for x, y in tunnels:
+
+        dungeon.tiles[ x, y ] = tile_types.floor
+
+# run "carve" on a fresh map and return the tile writes per second
+def measure(
+    carve: Callable[ [ GameMap, List[ np.ndarray ] ], None ],
+    size: int,
+    tunnels: List[ np.ndarray ],
+    repeat: int
+) -> float:
+
+    writes = sum( tunnel.shape[ 1 ] for tunnel in tunnels )
+    best = float( "inf" )
+
+    for _ in range( repeat ):
+
+        dungeon = GameMap( None, size, size ) # type: ignore
+
+        start = time.perf_counter()
+        carve( dungeon, tunnels )
+        best = min( best, time.perf_counter() - start )
+
+    return writes / best
+
+def main( argv: Optional[ List[ str ] ] = None ) -> None:
+
+    parser = argparse.ArgumentParser( description="Benchmark corridor carving." )
+    parser.add_argument( "--size", type=int, default=1000, help="map width and height" )
+    parser.add_argument( "--corridors", type=int, default=5000 )
+    parser.add_argument( "--repeat", type=int, default=3 )
+    parser.add_argument( "--seed", type=int, default=0 )
+    args = parser.parse_args( argv )
+
+    rng = random.Random( args.seed )
+
+    def random_point() -> tuple:
+
+        return rng.randrange( args.size ), rng.randrange( args.size )
+
+    start = time.perf_counter()
+    tunnels = [
+        proc_gen.tunnel_coordinates( random_point(), random_point(), rng )
+        for _ in range( args.corridors )
+    ]
+    elapsed = time.perf_counter() - start
+
+    writes = sum( tunnel.shape[ 1 ] for tunnel in tunnels )
+
+    print(
+        f"{ args.corridors } corridors, { writes } tile writes on a "
+        f"{ args.size }x{ args.size } map ( coordinates computed in { elapsed:.3f}s )"
+    )
+    for name, carve in (
+        ( "per cell", carve_per_cell ),
+        ( "per corridor", carve_per_corridor ),
+        ( "single batch", proc_gen.carve_tunnels )
+    ):
+        rate = measure( carve, args.size, tunnels, args.repeat )
+
+        print( f"  { name:<13} { rate / 1e6:10.2f} M tile writes/sec" )
+
+if __name__ == "__main__":
+
+    main()
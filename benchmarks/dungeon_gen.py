@@ -0,0 +1,208 @@
+# generate many dungeon floors outside of a tcod window and report throughput,
+# per-stage timings, room and entity counts and connectivity statistics.
+#
+# run from the repository root:
+#   python -m benchmarks.dungeon_gen --count 500 --floors 1 4 8 --workers 4
+from __future__ import annotations
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import json
+import os
+import statistics
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from entity import Actor, Item # type: ignore
+from game_map import GameWorld # type: ignore
+import proc_gen # type: ignore
+
+# timing keys reported by generate_dungeon, plus the total measured here
+STAGES = (
+    "rooms_time", "tunnels_time", "entities_time", "connectivity_time", "total_time"
+)
+
+# generate a single floor and return its statistics, runs in a worker process
+def generate_one( job: Tuple[ int, int, dict ] ) -> Dict[ str, float ]:
+
+    seed, floor, params = job
+
+    world = GameWorld( engine=None, seed=seed, **params ) # type: ignore
+
+    stats: Dict[ str, float ] = {}
+
+    start = time.perf_counter()
+    game_map = world.build_floor( floor, stats )
+    stats[ "total_time" ] = time.perf_counter() - start
+
+    walkable = game_map.tiles[ "walkable" ]
+    reachable = proc_gen.reachable_from( walkable, game_map.player_start_location )
+
+    stats[ "floor" ] = floor
+    stats[ "monsters" ] = sum( isinstance( e, Actor ) for e in game_map.entities )
+    stats[ "items" ] = sum( isinstance( e, Item ) for e in game_map.entities )
+    stats[ "walkable_tiles" ] = int( walkable.sum() )
+    stats[ "reachable_fraction" ] = float( reachable.sum() / max( 1, walkable.sum() ) )
+    stats[ "stairs_reachable" ] = bool( reachable[ game_map.downstairs_location ] )
+    stats[ "unreachable_entities" ] = sum(
+        not reachable[ e.x, e.y ] for e in game_map.entities
+    )
+    return stats
+
+# summarize a list of values as mean / p50 / p95 / max
+def describe( values: Sequence[ float ] ) -> Dict[ str, float ]:
+
+    ordered = sorted( values )
+
+    return {
+        "mean": statistics.fmean( ordered ),
+        "p50": ordered[ len( ordered ) // 2 ],
+        "p95": ordered[ min( len( ordered ) - 1, int( len( ordered ) * 0.95 ) ) ],
+        "max": ordered[ -1 ]
+    }
+
+# generate "count" floors for every floor number and return the aggregated report
+def run(
+    count: int,
+    floors: Sequence[ int ],
+    params: dict,
+    seed: int = 0,
+    workers: Optional[ int ] = None
+) -> dict:
+
+    jobs = [ ( seed + i, floor, params ) for floor in floors for i in range( count ) ]
+
+    workers = workers or os.cpu_count() or 1
+
+    start = time.perf_counter()
+
+    if workers == 1:
+
+        results = [ generate_one( job ) for job in jobs ]
+
+    else:
+
+        with ProcessPoolExecutor( max_workers=workers ) as pool:
+
+            chunksize = max( 1, len( jobs ) // ( workers * 8 ) )
+            results = list( pool.map( generate_one, jobs, chunksize=chunksize ) )
+
+    elapsed = time.perf_counter() - start
+
+    report: dict = {
+        "floors_generated": len( results ),
+        "workers": workers,
+        "wall_time": elapsed,
+        "floors_per_sec": len( results ) / elapsed,
+        "params": params,
+        "by_floor": {}
+    }
+    for floor in floors:
+
+        floor_results = [ r for r in results if r[ "floor" ] == floor ]
+
+        report[ "by_floor" ][ floor ] = {
+            "generators": {
+                name: sum( r[ "generator" ] == name for r in floor_results )
+                for name in sorted( { r[ "generator" ] for r in floor_results } )
+            },
+            "stages_ms": {
+                stage: { k: v * 1000 for k, v in describe(
+                    [ r[ stage ] for r in floor_results ]
+                ).items() }
+                for stage in STAGES
+            },
+            "rooms": describe( [ r[ "rooms" ] for r in floor_results ] ),
+            "monsters": describe( [ r[ "monsters" ] for r in floor_results ] ),
+            "items": describe( [ r[ "items" ] for r in floor_results ] ),
+            "regions": describe( [ r[ "regions" ] for r in floor_results ] ),
+            "tunnels_added": describe( [ r[ "tunnels_added" ] for r in floor_results ] ),
+            "reachable_fraction": describe(
+                [ r[ "reachable_fraction" ] for r in floor_results ]
+            ),
+            "fully_connected": sum(
+                r[ "reachable_fraction" ] == 1.0 for r in floor_results
+            ) / len( floor_results ),
+            "stairs_reachable": sum(
+                r[ "stairs_reachable" ] for r in floor_results
+            ) / len( floor_results ),
+            "unreachable_entities": describe(
+                [ r[ "unreachable_entities" ] for r in floor_results ]
+            )
+        }
+    return report
+
+# print a report in a readable form
+def print_report( report: dict ) -> None:
+
+    print(
+        f"{ report[ 'floors_generated' ] } floors in { report[ 'wall_time' ]:.2f}s "
+        f"on { report[ 'workers' ] } workers: { report[ 'floors_per_sec' ]:.1f} floors/sec"
+    )
+    for floor, data in report[ "by_floor" ].items():
+
+        print( f"\nfloor { floor }  generators { data[ 'generators' ] }" )
+
+        for stage, values in data[ "stages_ms" ].items():
+
+            print(
+                f"  { stage:<17} mean { values[ 'mean' ]:8.3f}ms"
+                f"  p95 { values[ 'p95' ]:8.3f}ms  max { values[ 'max' ]:8.3f}ms"
+            )
+        for key in (
+            "rooms", "monsters", "items", "regions", "tunnels_added", "unreachable_entities"
+        ):
+
+            values = data[ key ]
+
+            print(
+                f"  { key:<20} mean { values[ 'mean' ]:6.2f}  max { values[ 'max' ]:g}"
+            )
+        print( f"  fully connected      { data[ 'fully_connected' ]:.1%}" )
+        print( f"  stairs reachable     { data[ 'stairs_reachable' ]:.1%}" )
+        print( f"  reachable fraction   { data[ 'reachable_fraction' ][ 'mean' ]:.1%} mean" )
+
+def main( argv: Optional[ List[ str ] ] = None ) -> None:
+
+    parser = argparse.ArgumentParser( description=__doc__ or "Batch dungeon generation." )
+    parser.add_argument( "--count", type=int, default=100, help="floors per floor number" )
+    parser.add_argument( "--floors", type=int, nargs="+", default=[ 1 ] )
+    parser.add_argument( "--width", type=int, default=80 )
+    parser.add_argument( "--height", type=int, default=43 )
+    parser.add_argument( "--max-rooms", type=int, default=30 )
+    parser.add_argument( "--room-min-size", type=int, default=6 )
+    parser.add_argument( "--room-max-size", type=int, default=10 )
+    parser.add_argument(
+        "--generator",
+        choices=sorted( proc_gen.generators ),
+        help="always use this generator instead of the per-floor chances"
+    )
+    parser.add_argument( "--seed", type=int, default=0 )
+    parser.add_argument( "--workers", type=int, default=None )
+    parser.add_argument( "--json", help="also write the report to this file" )
+    args = parser.parse_args( argv )
+
+    params = {
+        "map_width": args.width,
+        "map_height": args.height,
+        "max_rooms": args.max_rooms,
+        "room_min_size": args.room_min_size,
+        "room_max_size": args.room_max_size
+    }
+    if args.generator:
+
+        params[ "generator_chances" ] = { 0: [ ( args.generator, 1 ) ] }
+
+    report = run( args.count, args.floors, params, args.seed, args.workers )
+
+    print_report( report )
+
+    if args.json:
+
+        with open( args.json, "w" ) as f:
+
+            json.dump( report, f, indent=2 )
+
+if __name__ == "__main__":
+
+    main()
@@ -0,0 +1,80 @@
+# compare save codecs by file size and save and load times on a few representative saves:
+# the first floor of a new game, a fully explored deeper floor, and a large map.
+#
+# run from the repository root:
+#   python -m benchmarks.save_codecs
+#   python -m benchmarks.save_codecs --codec zlib:1 --codec bitpack+delta+lzma:1
+from __future__ import annotations
+
+import argparse
+from typing import List, Optional
+
+from benchmarks.save_load import best_time, build_engine # type: ignore
+import save_format # type: ignore
+
+DEFAULT_CODECS = (
+    "none",
+    "bitpack+none",
+    "zlib:1",
+    "zlib:6",
+    "zlib:9",
+    "bitpack+zlib:1",
+    "bitpack+zlib:6",
+    "bitpack+delta+zlib:6",
+    "lzma:0",
+    "lzma:6",
+    "bitpack+lzma:0",
+    "bitpack+delta+lzma:0",
+    "bitpack+lzma:6"
+)
+
+# name, map width, map height, floor
+SAVES = (
+    ( "new game", 80, 43, 1 ),
+    ( "floor 8", 80, 43, 8 ),
+    ( "200x200", 200, 200, 5 )
+)
+
+def main( argv: Optional[ List[ str ] ] = None ) -> None:
+
+    parser = argparse.ArgumentParser( description="Benchmark save codecs." )
+    parser.add_argument(
+        "--codec", action="append", help="a codec spec to measure, may be repeated"
+    )
+    parser.add_argument( "--seed", type=int, default=0 )
+    parser.add_argument( "--repeat", type=int, default=5 )
+    args = parser.parse_args( argv )
+
+    codecs = [ save_format.Codec.parse( spec ) for spec in args.codec or DEFAULT_CODECS ]
+
+    for name, width, height, floor in SAVES:
+
+        engine = build_engine( width, height, floor, args.seed )
+
+        # the first save is a new game, which has only seen the starting room
+        if floor == 1:
+
+            engine.game_map.explored[ ... ] = engine.game_map.visible
+
+        data = save_format.snapshot( engine )
+
+        print( f"{ name } ( { width }x{ height }, { len( engine.game_map.entities ) } entities )" )
+        print( f"  { 'codec':<22} { 'size':>8} { 'save':>10} { 'load':>10}" )
+
+        for codec in codecs:
+
+            save_data = save_format.encode( data, codec )
+
+            save_time = best_time( lambda: save_format.encode( data, codec ), args.repeat )
+            load_time = best_time(
+                lambda: save_format.restore( save_format.decode( save_data ) ), args.repeat
+            )
+
+            print(
+                f"  { str( codec ):<22} { len( save_data ):>8} "
+                f"{ save_time * 1000:8.2f}ms { load_time * 1000:8.2f}ms"
+            )
+
+if __name__ == "__main__":
+
+    main()
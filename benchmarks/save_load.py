@@ -0,0 +1,113 @@
+# compare the save format against pickling the whole engine, the way saves used to be
+# written, by file size and save and load times.
+#
+# run from the repository root:
+#   python -m benchmarks.save_load --width 200 --height 200 --floor 5
+from __future__ import annotations
+
+import argparse
+import lzma
+import pickle
+import time
+from typing import Callable, List, Optional
+
+from engine import Engine # type: ignore
+import save_format # type: ignore
+from setup_game import new_game # type: ignore
+
+def pickle_save( engine: Engine ) -> bytes:
+
+    return lzma.compress( pickle.dumps( engine ) )
+
+def pickle_load( save_data: bytes ) -> Engine:
+
+    return pickle.loads( lzma.decompress( save_data ) )
+
+def format_save( engine: Engine ) -> bytes:
+
+    return save_format.encode( save_format.snapshot( engine ) )
+
+def format_load( save_data: bytes ) -> Engine:
+
+    return save_format.restore( save_format.decode( save_data ) )
+
+# return the best time out of "repeat" calls
+def best_time( function: Callable[ [], object ], repeat: int ) -> float:
+
+    best = float( "inf" )
+
+    for _ in range( repeat ):
+
+        start = time.perf_counter()
+        function()
+        best = min( best, time.perf_counter() - start )
+
+    return best
+
+# a game on the given floor, with every tile explored so the map isn't mostly zeros
+def build_engine( width: int, height: int, floor: int, seed: int ) -> Engine:
+
+    engine = new_game( seed )
+
+    world = engine.game_world
+    world.cancel_pregeneration()
+    world.map_width = width
+    world.map_height = height
+    world.current_floor = floor - 1
+    world.generate_floor()
+    world.cancel_pregeneration()
+
+    engine.game_map.explored[ ... ] = True
+    engine.update_fov()
+
+    return engine
+
+def main( argv: Optional[ List[ str ] ] = None ) -> None:
+
+    parser = argparse.ArgumentParser( description="Benchmark saving and loading." )
+    parser.add_argument( "--width", type=int, default=80 )
+    parser.add_argument( "--height", type=int, default=43 )
+    parser.add_argument( "--floor", type=int, default=5 )
+    parser.add_argument( "--seed", type=int, default=0 )
+    parser.add_argument( "--repeat", type=int, default=5 )
+    args = parser.parse_args( argv )
+
+    engine = build_engine( args.width, args.height, args.floor, args.seed )
+
+    print(
+        f"{ args.width }x{ args.height } map on floor { args.floor }, "
+        f"{ len( engine.game_map.entities ) } entities, "
+        f"{ len( engine.message_log.messages ) } messages"
+    )
+    print( f"  { 'format':<12} { 'size':>10} { 'save':>10} { 'load':>10}" )
+
+    results = []
+
+    for name, save, load in (
+        ( "pickle+lzma", pickle_save, pickle_load ),
+        ( "save format", format_save, format_load )
+    ):
+        save_data = save( engine )
+
+        save_time = best_time( lambda: save( engine ), args.repeat )
+        load_time = best_time( lambda: load( save_data ), args.repeat )
+
+        results.append( ( len( save_data ), save_time, load_time ) )
+
+        print(
+            f"  { name:<12} { len( save_data ):>10} "
+            f"{ save_time * 1000:8.2f}ms { load_time * 1000:8.2f}ms"
+        )
+
+    # the save format over pickle+lzma, below 1.00 is smaller or faster. loading is mostly
+    # building the entities and their components again, which both have to do
+    ( pickle_size, pickle_save_time, pickle_load_time ), ( size, save_time, load_time ) = results
+
+    print(
+        f"  { 'ratio':<12} { size / pickle_size:>9.2f}x "
+        f"{ save_time / pickle_save_time:>9.2f}x { load_time / pickle_load_time:>9.2f}x"
+    )
+
+if __name__ == "__main__":
+
+    main()
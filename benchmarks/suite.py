@@ -0,0 +1,518 @@
+# microbenchmarks for the engine's hot paths, over a range of map sizes and entity
+# counts. results are written as json and can be compared against a saved baseline,
+# a benchmark whose median gets slower than its threshold allows is a regression and
+# makes the run exit with status 1.
+#
+# run from the repository root:
+#   python -m benchmarks.suite --output results.json
+#   python -m benchmarks.suite --save-baseline baseline.json
+#   python -m benchmarks.suite --baseline baseline.json --threshold 0.1 --threshold "save_as*=0.25"
+#   python -m benchmarks.suite --filter "update_fov*" --sizes 80x43 500x500
+from __future__ import annotations
+
+import argparse
+import fnmatch
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import tcod
+
+from actions import MeleeAction # type: ignore
+from benchmarks.save_load import build_engine # type: ignore
+from components.ai import ConfusedEnemy # type: ignore
+from engine import Engine # type: ignore
+import entity_factories # type: ignore
+from game_map import GameMap # type: ignore
+from message_log import MessageLog # type: ignore
+import proc_gen # type: ignore
+import setup_game # type: ignore
+
+# a benchmark prepares its state untimed and returns the function to time. when it also
+# returns a reset function, that is called untimed before every timed call, for
+# benchmarks that change the state they run on
+Prepared = Tuple[ Callable[ [], Any ], Optional[ Callable[ [], Any ] ] ]
+
+DEFAULT_SIZES = ( ( 80, 43 ), ( 200, 200 ) )
+DEFAULT_ENTITIES = ( 10, 100 )
+
+# save files written by the benchmarks, removed on exit
+scratch = tempfile.TemporaryDirectory( prefix="bench-" )
+
+# a game on floor 5 with "entities" orcs in place of the floor's own monsters
+def build_scenario( width: int, height: int, entities: int, seed: int = 0 ) -> Engine:
+
+    engine = build_engine( width, height, 5, seed )
+    game_map = engine.game_map
+
+    for actor in list( game_map.actors ):
+
+        if actor is not engine.player:
+
+            game_map.entities.remove( actor )
+
+    rng = random.Random( seed )
+
+    free = [
+        ( int( x ), int( y ) ) for x, y in np.argwhere( game_map.tiles[ "walkable" ] )
+        if ( x, y ) != ( engine.player.x, engine.player.y )
+    ]
+
+    for x, y in rng.sample( free, min( entities, len( free ) ) ):
+
+        entity_factories.orc.spawn( game_map, x, y )
+
+    engine.update_fov()
+
+    # every monster plans every turn, however long it takes
+    engine.ai_budget = None
+
+    return engine
+
+def bench_generate_dungeon( width: int, height: int, entities: int ) -> Prepared:
+
+    def run() -> None:
+
+        proc_gen.generate_dungeon(
+            max_rooms=30,
+            room_min_size=6,
+            room_max_size=10,
+            map_width=width,
+            map_height=height,
+            engine=None, # type: ignore
+            floor_number=5,
+            layout_rng=random.Random( 0 ),
+            spawn_rng=random.Random( 1 )
+        )
+
+    return run, None
+
+def bench_update_fov( width: int, height: int, entities: int ) -> Prepared:
+
+    engine = build_scenario( width, height, 0 )
+
+    return engine.update_fov, None
+
+def bench_game_map_render( width: int, height: int, entities: int ) -> Prepared:
+
+    engine = build_scenario( width, height, entities )
+
+    # every entity is drawn
+    engine.game_map.visible[ ... ] = True
+
+    console = tcod.console.Console( width, height, order="F" )
+
+    return lambda: engine.game_map.render( console ), None
+
+def bench_render_messages( width: int, height: int, entities: int ) -> Prepared:
+
+    log = MessageLog()
+
+    for i in range( 1000 ):
+
+        log.add_message( f"The orc attacks the player for { i % 7 } hit points, a long enough line to wrap." )
+
+    console = tcod.console.Console( 80, 50, order="F" )
+
+    return lambda: MessageLog.render_messages( console, 21, 45, 40, 5, log.messages ), None
+
+def bench_handle_enemy_turns( width: int, height: int, entities: int ) -> Prepared:
+
+    engine = build_scenario( width, height, entities )
+    game_map = engine.game_map
+
+    actors = [ actor for actor in game_map.actors if actor is not engine.player ]
+    positions = [ ( actor.x, actor.y ) for actor in actors ]
+
+    player_hp = engine.player.fighter.hp
+
+    # every monster sees the player and paths towards it, the worst case
+    def reset() -> None:
+
+        for actor, ( x, y ) in zip( actors, positions ):
+
+            actor.x, actor.y = x, y
+            actor.ai.path = []
+
+        engine.player.fighter.hp = player_hp
+        engine.message_log.messages.clear()
+        game_map.visible[ ... ] = True
+
+    return engine.handle_enemy_turns, reset
+
+# confused monsters bumping into walls and each other. mostly melee, messages and the
+# search for an actor at each destination, refused steps are a small part of it
+def bench_confused_horde( width: int, height: int, entities: int ) -> Prepared:
+
+    engine = build_scenario( width, height, entities )
+    game_map = engine.game_map
+
+    actors = [ actor for actor in game_map.actors if actor is not engine.player ]
+    positions = [ ( actor.x, actor.y ) for actor in actors ]
+
+    for actor in actors:
+
+        actor.ai = ConfusedEnemy( actor, actor.ai, 0 )
+
+        # they hit each other, nobody may die
+        actor.fighter.max_hp = 1000
+
+    # every monster stumbles around, mostly into walls and each other
+    def reset() -> None:
+
+        for actor, ( x, y ) in zip( actors, positions ):
+
+            actor.x, actor.y = x, y
+            actor.ai.turns_remaining = 1000
+            actor.fighter.hp = actor.fighter.max_hp
+
+        game_map.ai_rng.seed( 0 )
+        engine.message_log.messages.clear()
+
+    return engine.handle_enemy_turns, reset
+
+# the player, with the dagger and leather armor they start with, hitting an orc that
+# can't die
+def bench_melee( width: int, height: int, entities: int ) -> Prepared:
+
+    engine = build_scenario( width, height, 0 )
+    player = engine.player
+    game_map = engine.game_map
+
+    dx, dy = next(
+        ( dx, dy ) for dx, dy in ( (-1, -1), ( 0, -1), ( 1, -1), (-1,  0), ( 1,  0), (-1,  1), ( 0,  1), ( 1,  1) )
+        if game_map.tiles[ "walkable" ][ player.x + dx, player.y + dy ]
+    )
+
+    orc = entity_factories.orc.spawn( game_map, player.x + dx, player.y + dy )
+    orc.fighter.max_hp = orc.fighter.hp = 10 ** 9
+
+    return MeleeAction( player, dx, dy ).perform, None
+
+def bench_get_path_to( width: int, height: int, entities: int ) -> Prepared:
+
+    engine = build_scenario( width, height, entities )
+    player = engine.player
+
+    # the monster furthest from the player
+    monster = max(
+        ( actor for actor in engine.game_map.actors if actor is not player ),
+        key=lambda actor: actor.distance( player.x, player.y )
+    )
+
+    return lambda: monster.ai.get_path_to( player.x, player.y ), None
+
+def bench_spawn( width: int, height: int, entities: int ) -> Prepared:
+
+    game_map = GameMap( None, width, height ) # type: ignore
+
+    rng = random.Random( 0 )
+    locations = [ ( rng.randrange( width ), rng.randrange( height ) ) for _ in range( entities ) ]
+
+    def run() -> None:
+
+        for x, y in locations:
+
+            entity_factories.orc.spawn( game_map, x, y )
+
+    return run, game_map.entities.clear
+
+def bench_save_as( width: int, height: int, entities: int ) -> Prepared:
+
+    engine = build_scenario( width, height, entities )
+    filename = os.path.join( scratch.name, f"{ width }x{ height }-{ entities }.sav" )
+
+    return lambda: engine.save_as( filename ), None
+
+def bench_load_game( width: int, height: int, entities: int ) -> Prepared:
+
+    engine = build_scenario( width, height, entities )
+    filename = os.path.join( scratch.name, f"{ width }x{ height }-{ entities }.sav" )
+
+    engine.save_as( filename )
+
+    def run() -> None:
+
+        # loading starts building the next floor, which isn't part of the load
+        setup_game.load_game( filename ).game_world.cancel_pregeneration()
+
+    return run, None
+
+def bench_fork( width: int, height: int, entities: int ) -> Prepared:
+
+    engine = build_scenario( width, height, entities )
+
+    return engine.fork, None
+
+# every benchmark, with the parameters it depends on: "size", "entities", both or neither
+BENCHMARKS: Dict[ str, Tuple[ Callable[ [ int, int, int ], Prepared ], Tuple[ str, ... ] ] ] = {
+    "generate_dungeon": ( bench_generate_dungeon, ( "size", ) ),
+    "update_fov": ( bench_update_fov, ( "size", ) ),
+    "game_map_render": ( bench_game_map_render, ( "size", "entities" ) ),
+    "render_messages": ( bench_render_messages, () ),
+    "handle_enemy_turns": ( bench_handle_enemy_turns, ( "size", "entities" ) ),
+    "confused_horde": ( bench_confused_horde, ( "size", "entities" ) ),
+    "melee": ( bench_melee, () ),
+    "get_path_to": ( bench_get_path_to, ( "size", "entities" ) ),
+    "spawn": ( bench_spawn, ( "entities", ) ),
+    "save_as": ( bench_save_as, ( "size", "entities" ) ),
+    "load_game": ( bench_load_game, ( "size", "entities" ) ),
+    "fork": ( bench_fork, ( "size", "entities" ) )
+}
+
+# the name of one benchmark with one set of parameters, such as "save_as[80x43,e=100]"
+def case_name( name: str, params: Tuple[ str, ... ], width: int, height: int, entities: int ) -> str:
+
+    labels = []
+
+    if "size" in params:
+
+        labels.append( f"{ width }x{ height }" )
+
+    if "entities" in params:
+
+        labels.append( f"e={ entities }" )
+
+    return f"{ name }[{ ','.join( labels ) }]" if labels else name
+
+# every ( case name, benchmark, width, height, entities ) to run, without duplicates for
+# the parameters a benchmark doesn't depend on
+def cases(
+    sizes: Sequence[ Tuple[ int, int ] ], entity_counts: Sequence[ int ], pattern: str = "*"
+) -> List[ Tuple[ str, Callable[ [ int, int, int ], Prepared ], int, int, int ] ]:
+
+    found: Dict[ str, Tuple[ str, Callable[ [ int, int, int ], Prepared ], int, int, int ] ] = {}
+
+    for name, ( function, params ) in BENCHMARKS.items():
+
+        for width, height in sizes if "size" in params else sizes[ :1 ]:
+
+            for entities in entity_counts if "entities" in params else entity_counts[ -1: ]:
+
+                case = case_name( name, params, width, height, entities )
+
+                if fnmatch.fnmatchcase( case, pattern ):
+
+                    found.setdefault( case, ( case, function, width, height, entities ) )
+
+    return list( found.values() )
+
+# time a prepared benchmark, "repeat" samples of at least "min_time" seconds each unless
+# it has a reset function, which is then called before every single timed call
+def measure( prepared: Prepared, repeat: int, min_time: float = 0.01 ) -> Dict[ str, float ]:
+
+    function, reset = prepared
+
+    if reset is not None:
+
+        reset()
+
+    # warm up, and find how many calls make up a sample
+    start = time.perf_counter()
+    function()
+    single = time.perf_counter() - start
+
+    number = 1 if reset is not None else max( 1, int( min_time / max( single, 1e-9 ) ) )
+
+    samples = []
+
+    for _ in range( repeat ):
+
+        if reset is not None:
+
+            reset()
+
+        start = time.perf_counter()
+
+        for _ in range( number ):
+
+            function()
+
+        samples.append( ( time.perf_counter() - start ) / number )
+
+    return {
+        "median": statistics.median( samples ),
+        "min": min( samples ),
+        "mean": statistics.fmean( samples ),
+        "stdev": statistics.stdev( samples ) if len( samples ) > 1 else 0.0,
+        "samples": len( samples ),
+        "number": number
+    }
+
+def run(
+    sizes: Sequence[ Tuple[ int, int ] ] = DEFAULT_SIZES,
+    entity_counts: Sequence[ int ] = DEFAULT_ENTITIES,
+    pattern: str = "*",
+    repeat: int = 10,
+    verbose: bool = True
+) -> dict:
+
+    results: Dict[ str, Dict[ str, float ] ] = {}
+
+    for case, function, width, height, entities in cases( sizes, entity_counts, pattern ):
+
+        results[ case ] = measure( function( width, height, entities ), repeat )
+
+        if verbose:
+
+            print( f"  { case:<40} { results[ case ][ 'median' ] * 1000:10.4f}ms", flush=True )
+
+    return {
+        "meta": {
+            "time": time.time(),
+            "python": sys.version.split()[ 0 ],
+            "numpy": np.__version__,
+            "tcod": tcod.__version__,
+            "platform": platform.platform(),
+            "repeat": repeat
+        },
+        "results": results
+    }
+
+# the threshold for a case, the last matching pattern wins over the default
+def threshold_for( case: str, default: float, patterns: Sequence[ Tuple[ str, float ] ] ) -> float:
+
+    threshold = default
+
+    for pattern, value in patterns:
+
+        if fnmatch.fnmatchcase( case, pattern ):
+
+            threshold = value
+
+    return threshold
+
+# compare medians with a baseline, returns ( case, baseline, current, change, status )
+# for every case in both, status being "regression", "improvement" or "ok"
+def compare(
+    report: dict,
+    baseline: dict,
+    default_threshold: float = 0.1,
+    thresholds: Sequence[ Tuple[ str, float ] ] = ()
+) -> List[ Tuple[ str, float, float, float, str ] ]:
+
+    rows = []
+
+    for case, result in report[ "results" ].items():
+
+        if case not in baseline[ "results" ]:
+
+            continue
+
+        before = baseline[ "results" ][ case ][ "median" ]
+        after = result[ "median" ]
+        change = after / before - 1
+
+        threshold = threshold_for( case, default_threshold, thresholds )
+
+        if change > threshold:
+
+            status = "regression"
+
+        elif change < -threshold:
+
+            status = "improvement"
+
+        else:
+
+            status = "ok"
+
+        rows.append( ( case, before, after, change, status ) )
+
+    return rows
+
+def print_comparison( rows: List[ Tuple[ str, float, float, float, str ] ] ) -> None:
+
+    print( f"\n  { 'benchmark':<40} { 'baseline':>12} { 'current':>12} { 'change':>8}" )
+
+    for case, before, after, change, status in rows:
+
+        print(
+            f"  { case:<40} { before * 1000:10.4f}ms { after * 1000:10.4f}ms "
+            f"{ change:+8.1%} { status if status != 'ok' else '' }"
+        )
+
+def parse_size( text: str ) -> Tuple[ int, int ]:
+
+    width, height = text.lower().split( "x" )
+
+    return int( width ), int( height )
+
+# "pattern=value" or just "value" for the default threshold
+def parse_threshold( text: str ) -> Tuple[ str, float ]:
+
+    pattern, _, value = text.rpartition( "=" )
+
+    return pattern, float( value )
+
+def main( argv: Optional[ List[ str ] ] = None ) -> None:
+
+    parser = argparse.ArgumentParser( description="Microbenchmarks for the engine's hot paths." )
+    parser.add_argument( "--sizes", type=parse_size, nargs="+", default=list( DEFAULT_SIZES ) )
+    parser.add_argument( "--entities", type=int, nargs="+", default=list( DEFAULT_ENTITIES ) )
+    parser.add_argument( "--filter", default="*", help="only run cases matching this pattern" )
+    parser.add_argument( "--repeat", type=int, default=10, help="samples per case" )
+    parser.add_argument( "--output", help="write the results to this file" )
+    parser.add_argument( "--save-baseline", help="write the results as the new baseline" )
+    parser.add_argument( "--baseline", help="compare the results with this baseline" )
+    parser.add_argument(
+        "--threshold",
+        type=parse_threshold,
+        action="append",
+        default=[],
+        help="allowed slowdown as a fraction, default 0.1, or pattern=fraction for "
+        "the cases matching pattern, may be repeated"
+    )
+    args = parser.parse_args( argv )
+
+    report = run( args.sizes, args.entities, args.filter, args.repeat )
+
+    for filename in ( args.output, args.save_baseline ):
+
+        if filename:
+
+            with open( filename, "w" ) as f:
+
+                json.dump( report, f, indent=2 )
+
+    if args.baseline:
+
+        with open( args.baseline ) as f:
+
+            baseline = json.load( f )
+
+        default = 0.1
+        patterns = []
+
+        for pattern, value in args.threshold:
+
+            if pattern:
+
+                patterns.append( ( pattern, value ) )
+
+            else:
+
+                default = value
+
+        rows = compare( report, baseline, default, patterns )
+
+        print_comparison( rows )
+
+        regressions = [ row for row in rows if row[ 4 ] == "regression" ]
+
+        if regressions:
+
+            print( f"\n{ len( regressions ) } regressions" )
+
+            raise SystemExit( 1 )
+
+if __name__ == "__main__":
+
+    main()
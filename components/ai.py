@@ -2,31 +2,78 @@
 from __future__ import annotations
 
 import random
-from typing import List, Optional, Tuple, TYPE_CHECKING
+import time
+from typing import List, Optional, Set, Tuple, TYPE_CHECKING
 
 import numpy as np
 import tcod
+import tcod.los
 
 from actions import Action, BumpAction, MeleeAction, MovementAction, WaitAction # type: ignore
+import instrumentation # type: ignore
 
 if TYPE_CHECKING:
+    from engine import Engine # type: ignore
     from entity import Actor # type: ignore
+    from game_map import GameMap # type: ignore
 
 # basic ai functionality for enemy entities
 class BaseAI( Action ):
 
+    # set while a monster that ran out of planning budget waits to plan its path, it acts
+    # first the next turn
+    deferred = False
+
     # implemented by subclass
     def perform( self ) -> None:
 
         raise NotImplementedError()
+
+    # true until the planning budget of this turn's enemy turns runs out, see Engine
+    @property
+    def within_budget( self ) -> bool:
+
+        return self.engine.ai_budget_left > 0
+
+    # a step toward ( x, y ) that needs no pathfinding: along the line of sight when that
+    # tile is free, otherwise the free neighbour closest to it, or waiting if there is none
+    def step_towards( self, x: int, y: int ) -> Action:
+
+        actor = self.entity
+        blocked = _blocked( actor.gamemap )
+        steps = _open_steps( actor, blocked )
+
+        line = tcod.los.bresenham( ( actor.x, actor.y ), ( x, y ) )
+
+        if len( line ) > 1:
+
+            step = ( int( line[ 1 ][ 0 ] ) - actor.x, int( line[ 1 ][ 1 ] ) - actor.y )
+
+            if step in steps:
+
+                return MovementAction( actor, *step )
+
+        if not steps:
+
+            return WaitAction( actor )
+
+        dx, dy = min(
+            steps,
+            key=lambda step: max( abs( x - actor.x - step[ 0 ] ), abs( y - actor.y - step[ 1 ] ) )
+        )
+        return MovementAction( actor, dx, dy )
     
     # compute and return a path to the target position,
     # if there is no valid path then returns an empty list
+    @instrumentation.timed( "get_path_to" )
     def get_path_to( self, dest_x: int, dest_y: int ) -> List[ Tuple[ int, int ] ]:
 
         # copy the walkable array
         cost = np.array( self.entity.gamemap.tiles[ "walkable" ], dtype=np.int8 )
 
+        # the search may cover the whole map
+        self.engine.ai_budget_left -= cost.size
+
         for entity in self.entity.gamemap.entities:
 
             # check that an entity blocks movement and the cost isn't zero (blocking)
@@ -73,8 +120,8 @@ class ConfusedEnemy( BaseAI ):
 
         else:
 
-            # pick a random direction
-            direction_x, direction_y = random.choice(
+            # pick a random direction from this floor's ai stream
+            direction_x, direction_y = self.entity.gamemap.ai_rng.choice(
                 [
                     (-1, -1), # northwest
                     ( 0, -1), # north
@@ -90,7 +137,7 @@ class ConfusedEnemy( BaseAI ):
 
             # the actor will either try to move or attack in the chosen random direction.
             # it is possible the actor will just bump into the wall, wasting a turn
-            return BumpAction( self.entity, direction_x, direction_y ).perform()
+            BumpAction( self.entity, direction_x, direction_y ).try_perform()
     
 # implementation of base ai for hostile entities
 class HostileEnemy( BaseAI ):
@@ -114,8 +161,26 @@ class HostileEnemy( BaseAI ):
             if distance <= 1:
 
                 return MeleeAction( self.entity, dx, dy ).perform()
-            
-            self.path = self.get_path_to( target.x, target.y )
+
+            if self.within_budget:
+
+                if self.deferred:
+
+                    instrumentation.count( "ai.deferred_paths" )
+                    self.deferred = False
+
+                self.path = self.get_path_to( target.x, target.y )
+
+            else:
+
+                # out of budget this turn, the path is planned next turn. the last one is
+                # still followed if there is one
+                instrumentation.count( "ai.fallback" )
+                self.deferred = True
+
+                if not self.path:
+
+                    return self.step_towards( target.x, target.y ).perform()
 
         # if the player can see the entity, but the entity is too far away to attack,
         # then move towards the player
@@ -123,9 +188,326 @@ class HostileEnemy( BaseAI ):
 
             dest_x, dest_y = self.path.pop( 0 )
 
-            return MovementAction(
+            # another monster may have stepped into the path since it was planned, which
+            # wastes the turn
+            MovementAction(
                 self.entity, dest_x - self.entity.x, dest_y - self.entity.y
-            ).perform()
+            ).try_perform()
+
+            return None
         
         # if the entity is not in the player's vision, simply wait
         return WaitAction( self.entity ).perform()
+
+# the eight steps an actor can take
+DIRECTIONS = ( (-1, -1), ( 0, -1), ( 1, -1), (-1,  0), ( 1,  0), (-1,  1), ( 0,  1), ( 1,  1) )
+
+# the tiles taken by entities that block movement
+def _blocked( game_map: GameMap ) -> Set[ Tuple[ int, int ] ]:
+
+    return { ( entity.x, entity.y ) for entity in game_map.entities if entity.blocks_movement }
+
+# the steps an actor can take onto walkable tiles nobody is standing on
+def _open_steps( actor: Actor, blocked: Set[ Tuple[ int, int ] ] ) -> List[ Tuple[ int, int ] ]:
+
+    game_map = actor.gamemap
+    walkable = game_map.tiles[ "walkable" ]
+
+    steps = []
+
+    for dx, dy in DIRECTIONS:
+
+        x, y = actor.x + dx, actor.y + dy
+
+        if game_map.in_bounds( x, y ) and walkable[ x, y ] and ( x, y ) not in blocked:
+
+            steps.append( ( dx, dy ) )
+
+    return steps
+
+# attack "target" if it is next to "actor", otherwise take the open step that brings it
+# closest to "target", or furthest away when "away" is set. ties are broken with "rng"
+def _greedy_turn( actor: Actor, target: Actor, rng: random.Random, away: bool = False ) -> None:
+
+    dx, dy = target.x - actor.x, target.y - actor.y
+
+    if max( abs( dx ), abs( dy ) ) <= 1 and not away:
+
+        MeleeAction( actor, dx, dy ).perform()
+
+        return
+
+    steps = _open_steps( actor, _blocked( actor.gamemap ) )
+
+    if not steps:
+
+        # cornered, so fight if it can
+        if max( abs( dx ), abs( dy ) ) <= 1:
+
+            MeleeAction( actor, dx, dy ).perform()
+
+        return
+
+    def distance( step: Tuple[ int, int ] ) -> int:
+
+        return max( abs( dx - step[ 0 ] ), abs( dy - step[ 1 ] ) )
+
+    rng.shuffle( steps )
+    step = max( steps, key=distance ) if away else min( steps, key=distance )
+
+    MovementAction( actor, *step ).perform()
+
+# an elite monster that looks ahead before acting. once the player is close, every step
+# it could take ( and waiting, and attacking ) is tried on forks of the game, each one
+# played out a few turns with cheap greedy moves for everyone, and the step that did best
+# on average is taken. hurting the player is worth more the weaker the player already is,
+# getting hurt is worth less the weaker the monster is, so a wounded monster backs off,
+# preferably into a corridor, rather than trading blows.
+#
+# the lookahead shares a budget of rollouts per turn, kept on the engine, with every
+# other tactical monster. once it is used up they act like HostileEnemy until the next
+# turn. the search always plays whole rounds of one rollout per candidate, and rollout i
+# of every candidate uses the same random stream, so the same position is decided the
+# same way on any machine. a time limit can be set as well, at the cost of that. the
+# settings are class attributes, for subclasses or balance runs
+class TacticalEnemy( HostileEnemy ):
+
+    # rollouts the tactical monsters together may play in one turn, a full search of the
+    # nine steps and an attack for one monster, about 4ms
+    turn_rollouts = 30
+
+    # seconds they may spend as well, None for no limit. a round is only started when the
+    # last rollouts suggest it will finish in time, decisions then depend on how fast the
+    # machine is
+    turn_budget: Optional[ float ] = None
+
+    # rounds of simulations, one per candidate each, and the turns each one plays out
+    rollouts = 3
+    depth = 3
+
+    # how close the player must be for the monster to look ahead, and how close other
+    # actors must be to the monster to be part of the simulation
+    engage_distance = 4
+    radius = 8
+
+    # the fraction of its hp below which the monster retreats
+    flee_below = 0.4
+
+    def perform( self ) -> None:
+
+        target = self.engine.player
+        distance = max( abs( target.x - self.entity.x ), abs( target.y - self.entity.y ) )
+
+        if (
+            not self.engine.game_map.visible[ self.entity.x, self.entity.y ]
+            or distance > self.engage_distance
+        ):
+            return super().perform()
+
+        step = self.plan()
+
+        if step is None:
+
+            instrumentation.count( "tactics.fallback" )
+
+            return super().perform()
+
+        # the path is out of date once the monster moves on its own
+        self.path = []
+
+        if step == ( 0, 0 ):
+
+            return WaitAction( self.entity ).perform()
+
+        return BumpAction( self.entity, *step ).perform()
+
+    # waiting, attacking the player when it is next to the monster and every open step
+    def candidates( self ) -> List[ Tuple[ int, int ] ]:
+
+        actor = self.entity
+        target = self.engine.player
+
+        steps = [ ( 0, 0 ) ] + _open_steps( actor, _blocked( actor.gamemap ) )
+
+        if max( abs( target.x - actor.x ), abs( target.y - actor.y ) ) <= 1:
+
+            steps.append( ( target.x - actor.x, target.y - actor.y ) )
+
+        return steps
+
+    # the best step, ( 0, 0 ) to wait, or None if the turn's budget ran out before one
+    # round of rollouts could be played
+    def plan( self ) -> Optional[ Tuple[ int, int ] ]:
+
+        engine = self.engine
+        actor = self.entity
+
+        # the first tactical monster to plan in the enemy turns starts the budget, kept on
+        # the engine next to ai_budget_left, see Engine.handle_enemy_turns
+        if engine.tactics_rollouts_left is None or engine.tactics_time_left is None:
+
+            engine.tactics_rollouts_left = self.turn_rollouts
+            engine.tactics_time_left = self.turn_budget if self.turn_budget is not None else 0.0
+
+        start = time.perf_counter()
+        deadline = (
+            start + engine.tactics_time_left if self.turn_budget is not None else float( "inf" )
+        )
+
+        candidates = self.candidates()
+
+        # the whole rounds left in the turn's rollouts
+        planned = min( self.rollouts, engine.tactics_rollouts_left // len( candidates ) )
+
+        # only the actors that can reach the monster within the lookahead, in an order that
+        # doesn't depend on memory layout
+        nearby = sorted(
+            ( other for other in engine.game_map.actors
+              if max( abs( other.x - actor.x ), abs( other.y - actor.y ) ) <= self.radius ),
+            key=lambda other: ( other.y, other.x )
+        )
+
+        scores = [ 0.0 ] * len( candidates )
+        rounds = 0
+
+        with instrumentation.timer( "tactics" ):
+
+            for i in range( planned ):
+
+                round_start = time.perf_counter()
+
+                # a round that wouldn't finish in time isn't started
+                if round_start + len( candidates ) * engine.tactics_rollout_time > deadline:
+
+                    break
+
+                seed = f"{ engine.game_world.seed }/{ engine.turn }/{ actor.x },{ actor.y }/{ i }"
+
+                scores = [
+                    total + self.rollout( nearby, step, random.Random( seed ) )
+                    for total, step in zip( scores, candidates )
+                ]
+                rounds += 1
+
+                engine.tactics_rollout_time = ( time.perf_counter() - round_start ) / len( candidates )
+
+        engine.tactics_rollouts_left -= rounds * len( candidates )
+        engine.tactics_time_left -= time.perf_counter() - start
+
+        if rounds == 0:
+
+            return None
+
+        instrumentation.count( "tactics.rollouts", rounds * len( candidates ) )
+
+        return candidates[ max( range( len( candidates ) ), key=lambda c: scores[ c ] ) ]
+
+    # take "step" on a fork of the game holding the "nearby" actors, play "depth" more
+    # turns and score the outcome
+    def rollout( self, nearby: List[ Actor ], step: Tuple[ int, int ], rng: random.Random ) -> float:
+
+        engine = self.engine.fork( nearby )
+
+        monster = engine.game_map.get_actor_at_location( self.entity.x, self.entity.y )
+        player = engine.player
+
+        hp, player_hp = monster.fighter.hp, player.fighter.hp
+
+        if step != ( 0, 0 ):
+
+            BumpAction( monster, *step ).perform()
+
+        others = sorted(
+            ( actor for actor in engine.game_map.actors if actor is not player and actor is not monster ),
+            key=lambda actor: ( actor.y, actor.x )
+        )
+
+        # the rest of this turn, then "depth" more
+        for turn in range( self.depth + 1 ):
+
+            if turn:
+
+                self._player_turn( player, engine, rng )
+
+                if monster.is_alive:
+
+                    _greedy_turn(
+                        monster, player, rng, away=monster.fighter.hp < self.flee_below * monster.fighter.max_hp
+                    )
+
+            for other in others:
+
+                if other.is_alive and player.is_alive:
+
+                    _greedy_turn( other, player, rng )
+
+            if not player.is_alive or not monster.is_alive:
+
+                break
+
+        return self.score( monster, player, hp, player_hp, turn )
+
+    # how the player is assumed to play: mostly attacking the weakest monster next to it,
+    # or closing in on the nearest one, sometimes doing something else entirely
+    def _player_turn( self, player: Actor, engine: Engine, rng: random.Random ) -> None:
+
+        if not player.is_alive or rng.random() < 0.2:
+
+            return
+
+        # sorted, the ties below are broken with rng in this order
+        monsters = sorted(
+            ( actor for actor in engine.game_map.actors if actor is not player ),
+            key=lambda actor: ( actor.y, actor.x )
+        )
+
+        if not monsters:
+
+            return
+
+        adjacent = [
+            actor for actor in monsters
+            if max( abs( actor.x - player.x ), abs( actor.y - player.y ) ) <= 1
+        ]
+
+        if adjacent:
+
+            target = min( adjacent, key=lambda actor: ( actor.fighter.hp, rng.random() ) )
+
+        else:
+
+            target = min( monsters, key=lambda actor: ( actor.distance( player.x, player.y ), rng.random() ) )
+
+        _greedy_turn( player, target, rng )
+
+    # the value of a rollout to the monster that ended after "turns" turns, from the hp it
+    # and the player had before it
+    def score( self, monster: Actor, player: Actor, hp: int, player_hp: int, turns: int ) -> float:
+
+        # damage is worth more against a player who is already low
+        focus = 2.0 - player_hp / player.fighter.max_hp
+
+        # and costs more to a monster that is already low
+        caution = 1.0 + 3.0 * ( 1.0 - hp / monster.fighter.max_hp )
+
+        score = ( player_hp - player.fighter.hp ) * focus - ( hp - monster.fighter.hp ) * caution
+
+        # the sooner the better
+        if not player.is_alive:
+
+            score += 100.0 - 10.0 * turns
+
+        if not monster.is_alive:
+
+            score -= 50.0 * caution
+
+        elif hp < self.flee_below * monster.fighter.max_hp:
+
+            # somewhere away from the player, with few open sides to be caught from
+            blocked = _blocked( monster.gamemap )
+
+            score += monster.distance( player.x, player.y ) + 0.5 * (
+                len( DIRECTIONS ) - len( _open_steps( monster, blocked ) )
+            )
+
+        return score
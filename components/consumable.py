@@ -25,6 +25,11 @@ class Consumable( BaseComponent ):
 
         return actions.ItemAction( consumer, self.parent )
     
+    # return why this item can't be used for 'action', or None if it can, see Action.check
+    def check( self, action: actions.ItemAction ) -> Optional[ str ]:
+
+        return None
+
     # invoke this item's ability, 'action' is the context for this activation
     def activate( self, action: actions.ItemAction ) -> None:
 
@@ -57,17 +62,27 @@ class ConfusionConsumable( Consumable ):
             callback=lambda xy: actions.ItemAction( consumer, self.parent, xy )
         )
     
-    def activate( self, action: actions.ItemAction ) -> None:
+    def check( self, action: actions.ItemAction ) -> Optional[ str ]:
 
-        consumer = action.entity
         target = action.target_actor
 
         if not self.engine.game_map.visible[ action.target_xy ]:
-            raise Impossible("You cannot target an area that you cannot see.")
+            return "You cannot target an area that you cannot see."
         if not target:
-            raise Impossible("You must select an enemy to target.")
-        if target is consumer:
-            raise Impossible("You cannot confuse yourself!")
+            return "You must select an enemy to target."
+        if target is action.entity:
+            return "You cannot confuse yourself!"
+
+        return None
+
+    def activate( self, action: actions.ItemAction ) -> None:
+
+        reason = self.check( action )
+
+        if reason is not None:
+            raise Impossible( reason )
+
+        target = action.target_actor
         
         self.engine.message_log.add_message(
             f"The eyes of the {target.name} look vacant, as it starts to stumble around!",
@@ -84,21 +99,32 @@ class HealingConsumable( Consumable ):
 
         self.amount = amount
 
+    def check( self, action: actions.ItemAction ) -> Optional[ str ]:
+
+        fighter = action.entity.fighter
+
+        if fighter.hp >= fighter.max_hp:
+
+            return "Your health is already full."
+
+        return None
+
     def activate( self, action: actions.ItemAction ) -> None:
 
-        consumer = action.entity
-        amount_recovered = consumer.fighter.heal( self.amount )
+        reason = self.check( action )
 
-        if amount_recovered > 0:
+        if reason is not None:
 
-            self.engine.message_log.add_message(
-                f"You consume the {self.parent.name}, and recover {amount_recovered} HP!",
-                color.health_recovered
-            )
-            self.consume()
-        else:
+            raise Impossible( reason )
 
-            raise Impossible( f"Your health is already full." )
+        consumer = action.entity
+        amount_recovered = consumer.fighter.heal( self.amount )
+
+        self.engine.message_log.add_message(
+            f"You consume the {self.parent.name}, and recover {amount_recovered} HP!",
+            color.health_recovered
+        )
+        self.consume()
 
 #
 class FireballDamageConsumable( Consumable ):
@@ -117,23 +143,32 @@ class FireballDamageConsumable( Consumable ):
             callback=lambda xy: actions.ItemAction( consumer, self.parent, xy )
         )
     
-    def activate( self, action: actions.ItemAction ) -> None:
+    def check( self, action: actions.ItemAction ) -> Optional[ str ]:
         target_xy = action.target_xy
 
         if not self.engine.game_map.visible[target_xy]:
-            raise Impossible("You cannot target an area that you cannot see.")
-        
-        targets_hit = False
+            return "You cannot target an area that you cannot see."
+
+        if not any( actor.distance(*target_xy) <= self.radius for actor in self.engine.game_map.actors ):
+            return "There are no targets in the radius."
+
+        return None
+    
+    def activate( self, action: actions.ItemAction ) -> None:
+        reason = self.check( action )
+
+        if reason is not None:
+            raise Impossible( reason )
+
+        target_xy = action.target_xy
+
         for actor in self.engine.game_map.actors:
             if actor.distance(*target_xy) <= self.radius:
                 self.engine.message_log.add_message(
                     f"The {actor.name} is engulfed in a firey explosion, taking {self.damage} damage!"
                 )
                 actor.fighter.take_damage( self.damage )
-                targets_hit = True
         
-        if not targets_hit:
-            raise Impossible("There are no targets in the radius.")
         self.consume()
 
 #
@@ -145,9 +180,8 @@ class LightningDamageConsumable( Consumable ):
 
         self.maximum_range = maximum_range
 
-    def activate( self, action: actions.ItemAction ) -> None:
-
-        consumer = action.entity
+    # the closest visible actor in range, if there is one
+    def find_target( self, consumer: Actor ) -> Optional[ Actor ]:
 
         target = None
 
@@ -165,13 +199,26 @@ class LightningDamageConsumable( Consumable ):
 
                     closest_distance = distance
 
-        if target:
+        return target
+
+    def check( self, action: actions.ItemAction ) -> Optional[ str ]:
+
+        if self.find_target( action.entity ) is None:
 
-            self.engine.message_log.add_message(
-                f"A lightning bolt strikes the {target.name} with a loud thunder, for {self.damage} damage!"
-            )
-            target.fighter.take_damage( self.damage )
-            self.consume()
-        else:
+            return "No enemy is close enough to strike."
+
+        return None
+
+    def activate( self, action: actions.ItemAction ) -> None:
 
-            raise Impossible( "No enemy is close enough to strike." )
\ No newline at end of file
+        target = self.find_target( action.entity )
+
+        if target is None:
+
+            raise Impossible( "No enemy is close enough to strike." )
+
+        self.engine.message_log.add_message(
+            f"A lightning bolt strikes the {target.name} with a loud thunder, for {self.damage} damage!"
+        )
+        target.fighter.take_damage( self.damage )
+        self.consume()
\ No newline at end of file
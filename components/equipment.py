@@ -61,6 +61,11 @@ class Equipment( BaseComponent ):
 
         setattr(self, slot, item)
 
+        if item.equippable is not None:
+            self.parent.fighter.add_modifier(
+                item, item.equippable.power_bonus, item.equippable.defense_bonus
+            )
+
         if add_message:
             self.equip_message(item.name)
     
@@ -72,6 +77,8 @@ class Equipment( BaseComponent ):
 
         setattr(self, slot, None)
 
+        self.parent.fighter.remove_modifier(current_item)
+
     def toggle_equip(self, equippable_item: Item, add_message: bool = True) -> None:
         if(
             equippable_item.equippable
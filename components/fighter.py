@@ -1,7 +1,7 @@
 # import dependencies
 from __future__ import annotations
 
-from typing import TYPE_CHECKING
+from typing import Dict, Hashable, Optional, Tuple, TYPE_CHECKING
 
 import color # type: ignore
 from components.base_component import BaseComponent # type: ignore
@@ -22,6 +22,28 @@ class Fighter( BaseComponent ):
         self.base_defense = base_defense
         self.base_power = base_power
 
+        # the ( power, defense ) each source adds, by source: an equipped item, a status
+        # effect, anything that changes the fighter's stats for a while
+        self.modifiers: Dict[ Hashable, Tuple[ int, int ] ] = {}
+
+        # the sum of the modifiers, None until it is next read
+        self._bonus: Optional[ Tuple[ int, int ] ] = None
+
+    # set on fighters pickled before modifiers, see __setstate__
+    _add_equipment = False
+
+    # saves from before the save format are pickled, fighters in them have no modifiers.
+    # the parent may not be unpickled yet, so its equipment is added once it is needed
+    def __setstate__( self, state: dict ) -> None:
+
+        self.__dict__.update( state )
+
+        if "modifiers" not in state:
+
+            self.modifiers = {}
+            self._bonus = None
+            self._add_equipment = True
+
     @property
     def hp( self ) -> int:
 
@@ -46,17 +68,49 @@ class Fighter( BaseComponent ):
     
     @property
     def defense_bonus(self) -> int:
-        if self.parent.equipment:
-            return self.parent.equipment.defense_bonus
-        else:
-            return 0
+        return self.bonus[ 1 ]
         
     @property
     def power_bonus(self) -> int:
-        if self.parent.equipment:
-            return self.parent.equipment.power_bonus
-        else:
-            return 0
+        return self.bonus[ 0 ]
+
+    # the ( power, defense ) added by every modifier, summed once each time they change
+    @property
+    def bonus( self ) -> Tuple[ int, int ]:
+
+        if self._bonus is None:
+
+            if self._add_equipment:
+
+                self._add_equipment = False
+
+                for item in ( self.parent.equipment.weapon, self.parent.equipment.armor ):
+
+                    if item is not None and item.equippable is not None:
+
+                        self.modifiers.setdefault(
+                            item, ( item.equippable.power_bonus, item.equippable.defense_bonus )
+                        )
+
+            self._bonus = (
+                sum( power for power, _ in self.modifiers.values() ),
+                sum( defense for _, defense in self.modifiers.values() )
+            )
+
+        return self._bonus
+
+    # add to the fighter's stats until the modifier is removed, replaces any modifier
+    # "source" already added
+    def add_modifier( self, source: Hashable, power: int = 0, defense: int = 0 ) -> None:
+
+        self.modifiers[ source ] = ( power, defense )
+        self._bonus = None
+
+    def remove_modifier( self, source: Hashable ) -> None:
+
+        if self.modifiers.pop( source, None ) is not None:
+
+            self._bonus = None
 
     # heal an amount of HP, up to the max, and return the amount that was healed
     def heal( self, amount: int ) -> int:
@@ -1,21 +1,30 @@
 # import dependencies
 from __future__ import annotations
 
-import lzma
-import pickle
 from tcod.console import Console
 from tcod.map import compute_fov
-from typing import TYPE_CHECKING
+from typing import Iterable, Optional, TYPE_CHECKING, Union
 
 from entity import Entity # type: ignore
 from game_map import GameMap # type: ignore
 import exceptions
+import instrumentation # type: ignore
 from message_log import MessageLog # type: ignore
+import metrics # type: ignore
 import render_functions
+import tracing # type: ignore
 
 if TYPE_CHECKING:
     from entity import Actor # type: ignore
+    from journal import Journal # type: ignore
     from game_map import GameMap, GameWorld
+    from save_format import Codec # type: ignore
+
+# map tiles the monsters' pathfinding may search in one turn, every path searches the
+# whole map. counted rather than timed so a turn plays out the same on any machine, which
+# journal replay and recorded sessions depend on. about a dozen paths on the standard
+# 80x43 map, roughly half a 60 fps frame
+AI_BUDGET = 40_000
 
 # manages the current state of the game
 class Engine:
@@ -31,13 +40,63 @@ class Engine:
         self.mouse_location = ( 0, 0 )
         self.player = player
 
+        # turns completed by the player
+        self.turn = 0
+
+        # records every turn between saves when set, see journal.py
+        self.journal: Optional[ Journal ] = None
+
+        # the save this game was loaded from or is saved to by the game, set by the main
+        # menu. a finished game deletes it
+        self.save_filename: Optional[ str ] = None
+
+        # the monsters' planning budget per turn in tiles, None for no limit. monsters that
+        # find it spent take a cheap step instead and plan first the next turn, see
+        # HostileEnemy
+        self.ai_budget: Optional[ int ] = AI_BUDGET
+
+        # what is left of the budget in the enemy turns in progress
+        self.ai_budget_left: float = float( "inf" )
+
+        # what is left of the tactical monsters' rollouts and seconds in the enemy turns in
+        # progress, None until the first of them plans, see TacticalEnemy
+        self.tactics_rollouts_left: Optional[ int ] = None
+        self.tactics_time_left: Optional[ float ] = None
+
+        # seconds the last rollout took, to tell whether a round fits TacticalEnemy.turn_budget
+        self.tactics_rollout_time = 0.0
+
+    # engines pickled before the save format have none of the attributes added since,
+    # they start out with the defaults
+    def __setstate__( self, state: dict ) -> None:
+
+        if "turn" not in state:
+
+            self.__init__( state[ "player" ] ) # type: ignore
+
+        self.__dict__.update( state )
+
     # handle moves for enemy entities
+    @instrumentation.timed( "enemies" )
     def handle_enemy_turns( self ) -> None:
 
-        for entity in set( self.game_map.actors ) - { self.player }:
+        self.ai_budget_left = self.ai_budget if self.ai_budget is not None else float( "inf" )
+        self.tactics_rollouts_left = None
+        self.tactics_time_left = None
+
+        # living actors never share a tile, so ordering by position gives a turn order
+        # that doesn't depend on memory layout and keeps the ai rng reproducible. monsters
+        # that had to put off planning last turn go first
+        enemies = sorted(
+            ( actor for actor in self.game_map.actors if actor is not self.player ),
+            key=lambda actor: ( not actor.ai.deferred, actor.y, actor.x )
+        )
+        for entity in enemies:
     
             if entity.ai:
 
+                x, y = entity.x, entity.y
+
                 try:
 
                     entity.ai.perform()
@@ -46,7 +105,25 @@ class Engine:
 
                     pass # ignore impossible action exceptions from AI
 
+                if self.journal is not None and ( entity.x, entity.y ) != ( x, y ):
+
+                    self.journal.record_move( x, y, entity.x, entity.y )
+
+    # everything that happens after the player has acted
+    def end_turn( self ) -> None:
+
+        self.handle_enemy_turns()
+
+        self.update_fov()
+
+        self.turn += 1
+
+        instrumentation.count( "turns" )
+
+        metrics.turn_ended( self )
+
     # recompute the visible area based on the player's point of view
+    @instrumentation.timed( "fov" )
     def update_fov( self ) -> None:
 
         self.game_map.visible[:] = compute_fov(
@@ -59,13 +136,18 @@ class Engine:
         self.game_map.explored |= self.game_map.visible
             
     # render the current frame to the screen
+    @instrumentation.timed( "render" )
     def render( self, console: Console ) -> None:
 
         # render the game map
-        self.game_map.render( console )
+        with tracing.span( "render.map" ):
+
+            self.game_map.render( console )
 
         # render the message log
-        self.message_log.render( console=console, x=21, y=45, width=40, height=5 )
+        with tracing.span( "render.messages" ):
+
+            self.message_log.render( console=console, x=21, y=45, width=40, height=5 )
 
         # render health bar
         render_functions.render_bar(
@@ -86,11 +168,24 @@ class Engine:
             console=console, x=21, y=44, engine=self
         )
 
-    # save this engine instance as a compressed file
-    def save_as( self, filename: str ) -> None:
+    # a copy of the game to look ahead with or to go back to, far cheaper than a deepcopy,
+    # see fork.py. only the given entities are copied onto the fork's floor when set
+    def fork( self, entities: Optional[ Iterable[ Entity ] ] = None ) -> Engine:
+
+        import fork # type: ignore
+
+        return fork.fork_engine( self, entities )
+
+    # save this engine instance as a compressed file, "codec" is a save_format.Codec or a spec
+    # such as "bitpack+zlib:6" and defaults to save_format.DEFAULT_CODEC
+    @instrumentation.timed( "save" )
+    def save_as( self, filename: str, codec: Union[ str, Codec, None ] = None ) -> None:
+
+        import save_format # type: ignore
 
-        save_data = lzma.compress( pickle.dumps( self ) )
+        save_format.save_engine( self, filename, save_format.Codec.of( codec ) )
 
-        with open( filename, "wb" ) as f:
+        # the journal carries on from this save
+        if self.journal is not None:
 
-            f.write( save_data )
\ No newline at end of file
+            self.journal.rotate()
\ No newline at end of file
@@ -1,7 +1,6 @@
 # import dependencies
 from __future__ import annotations
 
-import copy
 import math
 from typing import Optional, Tuple, Type, TypeVar, TYPE_CHECKING, Union
 
@@ -61,7 +60,9 @@ class Entity:
     # spawn a copy of this instance at the given location
     def spawn( self: T, gamemap: GameMap, x: int, y: int ) -> T:
 
-        clone = copy.deepcopy( self )
+        import fork # type: ignore
+
+        clone = fork.copy_entity( self )
         clone.x = x
         clone.y = y
         clone.parent = gamemap
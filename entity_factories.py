@@ -1,5 +1,5 @@
 # import dependencies
-from components.ai import HostileEnemy # type: ignore
+from components.ai import HostileEnemy, TacticalEnemy # type: ignore
 from components import consumable, equippable # type: ignore
 from components.equipment import Equipment # type: ignore
 from components.fighter import Fighter # type: ignore
@@ -43,6 +43,19 @@ troll = Actor(
     level=Level(xp_given=100)
 )
 
+# elite monster, orc captain, thinks a few turns ahead. not in proc_gen's spawn tables,
+# games and balance runs that want it add it to enemy_chances
+orc_captain = Actor(
+    char="o",
+    color=( 191, 63, 63 ),
+    name="Orc Captain",
+    ai_cls=TacticalEnemy,
+    equipment=Equipment(),
+    fighter=Fighter( hp=14, base_defense=1, base_power=4 ),
+    inventory=Inventory(capacity=0),
+    level=Level(xp_given=80)
+)
+
 # health potion
 health_potion = Item(
     char="!",
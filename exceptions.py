@@ -7,4 +7,14 @@ class Impossible( Exception ):
 # can be raised to exit the game without automatically saving
 class QuitWithoutSaving( SystemExit ):
 
-    pass
\ No newline at end of file
+    pass
+
+# raised when a save file can't be read, the reason is given as the exception message
+class SaveFormatError( Exception ):
+
+    pass
+
+# raised when an input recording can't be read
+class RecordingError( Exception ):
+
+    pass
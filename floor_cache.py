@@ -0,0 +1,349 @@
+# keeps the floors the player has left so they can be revisited.
+#
+# recently visited floors stay in memory, least recently used first out once their
+# estimated size goes over the memory budget. evicted floors are spilled to a directory of
+# their own: tiles and explored as plain .npy files, which are memory mapped when the
+# floor is loaded again so only the pages that are touched are read, and everything else
+# ( entities, components, visible, the ai rng ) as a small save file
+from __future__ import annotations
+
+from collections import OrderedDict
+import os
+import tempfile
+import weakref
+from typing import Any, Dict, Iterator, List, Optional, Tuple, TYPE_CHECKING
+
+import numpy as np
+
+import save_format # type: ignore
+
+if TYPE_CHECKING:
+    from engine import Engine # type: ignore
+    from game_map import GameMap # type: ignore
+
+# rough memory cost of one entity and its components, used to estimate a floor's size
+ENTITY_SIZE = 4096
+
+# estimate the memory used by a floor
+def estimate_size( game_map: GameMap ) -> int:
+
+    entities = len( game_map.entities ) + sum(
+        len( actor.inventory.items ) for actor in game_map.actors
+    )
+    return (
+        game_map.tiles.nbytes
+        + game_map.visible.nbytes
+        + game_map.explored.nbytes
+        + entities * ENTITY_SIZE
+    )
+
+class FloorCache:
+
+    def __init__( self, memory_budget: int = 32 * 1024 * 1024, directory: Optional[ str ] = None ):
+
+        # estimated bytes of floors kept in memory before the oldest are spilled
+        self.memory_budget = memory_budget
+
+        # where spilled floors are written, a temporary directory is made when needed
+        self.directory = directory
+        self._temporary_directory: Optional[ tempfile.TemporaryDirectory ] = None
+
+        # floors in memory, least recently used first, and their estimated sizes
+        self._floors: OrderedDict[ int, GameMap ] = OrderedDict()
+        self._sizes: Dict[ int, int ] = {}
+
+        # floors spilled to disk, by the directory holding each one
+        self._spilled: Dict[ int, str ] = {}
+
+        # in a fork, floors that are still only held by the cache it was forked from, by
+        # that cache. they are copied from it when taken, see fork()
+        self._inherited: Dict[ int, FloorCache ] = {}
+
+        # forks that may still inherit floors from this cache
+        self._forks: weakref.WeakSet[ FloorCache ] = weakref.WeakSet()
+
+        # the floors this cache holds as they go into a save, their scalar state and their
+        # columns without the floor's prefix. a floor doesn't change while it is stored, so
+        # it is encoded once when it is stored instead of by every save, see snapshot
+        self._encoded: Dict[ int, Tuple[ Dict[ str, Any ], save_format.Snapshot ] ] = {}
+
+    # the directory and memory maps can't be pickled, a copy keeps everything in memory
+    def __getstate__( self ) -> dict:
+
+        state = self.__dict__.copy()
+        state[ "_temporary_directory" ] = None
+        state[ "_floors" ] = OrderedDict( self._floors )
+        state[ "_spilled" ] = {}
+        state[ "_inherited" ] = {}
+        del state[ "_forks" ]
+
+        state[ "_encoded" ] = { floor: self._encoded_floor( floor ) for floor in self }
+
+        for floor in list( self._spilled ) + list( self._inherited ):
+
+            state[ "_floors" ][ floor ] = self._fork_floor( floor, None )
+
+        state[ "_sizes" ] = {
+            floor: estimate_size( game_map ) for floor, game_map in state[ "_floors" ].items()
+        }
+        return state
+
+    def __setstate__( self, state: dict ) -> None:
+
+        self.__dict__.update( state )
+        self._forks = weakref.WeakSet()
+
+    def __contains__( self, floor: int ) -> bool:
+
+        return floor in self._floors or floor in self._spilled or floor in self._inherited
+
+    def __iter__( self ) -> Iterator[ int ]:
+
+        yield from self._floors
+        yield from self._spilled
+        yield from self._inherited
+
+    def __len__( self ) -> int:
+
+        return len( self._floors ) + len( self._spilled ) + len( self._inherited )
+
+    # estimated bytes used by the floors in memory
+    @property
+    def memory_usage( self ) -> int:
+
+        return sum( self._sizes.values() )
+
+    # the floors currently held in memory and on disk
+    @property
+    def floors_in_memory( self ) -> List[ int ]:
+
+        return list( self._floors )
+
+    @property
+    def floors_on_disk( self ) -> List[ int ]:
+
+        return list( self._spilled )
+
+    # keep a floor the player has left, spilling the least recently used floors to disk
+    # until the ones in memory fit the budget. "encoded" is the floor's encoded form when
+    # the caller already has it, see _encoded
+    def store(
+        self,
+        floor: int,
+        game_map: GameMap,
+        encoded: Optional[ Tuple[ Dict[ str, Any ], save_format.Snapshot ] ] = None
+    ) -> None:
+
+        self._floors[ floor ] = game_map
+        self._sizes[ floor ] = estimate_size( game_map )
+
+        if encoded is None:
+
+            data: save_format.Snapshot = {}
+            map_state, _ = save_format.snapshot_map( game_map, data )
+
+            encoded = ( map_state, data )
+
+        self._encoded[ floor ] = encoded
+
+        while self.memory_usage > self.memory_budget and self._floors:
+
+            oldest, oldest_map = self._floors.popitem( last=False )
+            del self._sizes[ oldest ]
+
+            self._spill( oldest, oldest_map )
+
+    # remove a floor from the cache and return it, or None if it was never stored
+    def take( self, floor: int, engine: Engine ) -> Optional[ GameMap ]:
+
+        # the floor is about to change, forks still sharing it get a copy first
+        self._detach( floor )
+
+        if floor in self._inherited:
+
+            game_map = self._inherited.pop( floor )._fork_floor( floor, engine )
+
+        elif floor in self._floors:
+
+            del self._sizes[ floor ]
+
+            game_map = self._floors.pop( floor )
+
+        elif floor in self._spilled:
+
+            game_map = self._load( floor, engine )
+
+            # the files stay where they are, the floor's tiles and explored are mapped
+            # from them and they are reused if the floor is spilled again
+            del self._spilled[ floor ]
+
+        else:
+
+            return None
+
+        self._encoded.pop( floor, None )
+
+        game_map.engine = engine
+
+        return game_map
+
+    # a cache for a forked game, see fork.py. the fork starts out holding none of the
+    # floors itself, each one is copied from this cache only if the fork takes it, and
+    # if this cache is about to hand a floor out first, the forks get their copy then
+    def fork( self ) -> FloorCache:
+
+        clone = FloorCache( self.memory_budget )
+
+        clone._inherited = dict( self._inherited )
+        clone._inherited.update( { floor: self for floor in self._floors } )
+        clone._inherited.update( { floor: self for floor in self._spilled } )
+
+        self._forks.add( clone )
+
+        for source in set( self._inherited.values() ):
+
+            source._forks.add( clone )
+
+        return clone
+
+    # a copy of a stored floor, leaving the stored one as it is
+    def _fork_floor( self, floor: int, engine: Optional[ Engine ] ) -> GameMap:
+
+        import fork # type: ignore
+
+        if floor in self._floors:
+
+            return fork.fork_map( self._floors[ floor ], engine )
+
+        if floor in self._spilled:
+
+            game_map = self._load( floor, engine )
+
+            # explored would write through to this cache's file
+            game_map.explored = np.array( game_map.explored )
+
+            return game_map
+
+        return self._inherited[ floor ]._fork_floor( floor, engine )
+
+    # give every fork still inheriting a floor from this cache its own copy of it
+    def _detach( self, floor: int ) -> None:
+
+        for clone in list( self._forks ):
+
+            if clone._inherited.get( floor ) is self:
+
+                del clone._inherited[ floor ]
+                clone.store( floor, self._fork_floor( floor, None ) )
+
+    def _floor_directory( self, floor: int ) -> str:
+
+        if self.directory is None:
+
+            if self._temporary_directory is None:
+
+                self._temporary_directory = tempfile.TemporaryDirectory( prefix="floors-" )
+
+            directory = self._temporary_directory.name
+
+        else:
+
+            directory = self.directory
+
+        return os.path.join( directory, f"floor_{ floor }" )
+
+    # write a floor to its directory
+    def _spill( self, floor: int, game_map: GameMap ) -> None:
+
+        directory = self._floor_directory( floor )
+        os.makedirs( directory, exist_ok=True )
+
+        for name in ( "tiles", "explored" ):
+
+            array = getattr( game_map, name )
+            filename = os.path.join( directory, f"{ name }.npy" )
+
+            # a floor that was loaded from this directory already writes through to it
+            if isinstance( array, np.memmap ) and array.filename == os.path.abspath( filename ):
+
+                array.flush()
+
+            else:
+
+                np.save( filename, array )
+
+        map_state, columns = self._encoded[ floor ]
+
+        # tiles and explored are in their own files
+        data = {
+            name: array for name, array in columns.items()
+            if name not in ( "map.palette", "map.tiles", "map.explored" )
+        }
+        save_format.pack_json( data, "meta", { "map": map_state } )
+
+        save_format.write_snapshot( data, os.path.join( directory, "floor.sav" ) )
+
+        self._spilled[ floor ] = directory
+
+    # read a spilled floor back, with tiles and explored memory mapped
+    def _load( self, floor: int, engine: Optional[ Engine ] ) -> GameMap:
+
+        directory = self._spilled[ floor ]
+
+        with open( os.path.join( directory, "floor.sav" ), "rb" ) as f:
+
+            data = save_format.decode( f.read() )
+
+        meta = save_format.unpack_json( data, "meta" )
+        game_map, _ = save_format.restore_map( data, engine, meta[ "map" ] )
+
+        game_map.tiles = np.load( os.path.join( directory, "tiles.npy" ), mmap_mode="r+" )
+        game_map.explored = np.load( os.path.join( directory, "explored.npy" ), mmap_mode="r+" )
+
+        return game_map
+
+    # the encoded form of a stored floor, see _encoded
+    def _encoded_floor( self, floor: int ) -> Tuple[ Dict[ str, Any ], save_format.Snapshot ]:
+
+        if floor in self._encoded:
+
+            return self._encoded[ floor ]
+
+        return self._inherited[ floor ]._encoded_floor( floor )
+
+    # add every stored floor to a save snapshot, returning the scalar state of each one by
+    # floor number. the floors were encoded when they were stored, whether they are in
+    # memory or on disk, so this only adds references to their columns
+    def snapshot( self, data: save_format.Snapshot ) -> Dict[ str, Dict[ str, Any ] ]:
+
+        floors: Dict[ str, Dict[ str, Any ] ] = {}
+
+        for floor in self:
+
+            map_state, columns = self._encoded_floor( floor )
+
+            floors[ str( floor ) ] = map_state
+
+            for name, array in columns.items():
+
+                data[ f"floors.{ floor }.{ name }" ] = array
+
+        return floors
+
+    # fill the cache with the floors of a loaded save. the save's columns are what
+    # snapshot_map gave when it was written, so they are kept as the encoded form rather
+    # than encoding the restored floors again
+    def restore(
+        self, data: save_format.Snapshot, floors: Dict[ str, Dict[ str, Any ] ], engine: Engine
+    ) -> None:
+
+        for floor, map_state in sorted( floors.items(), key=lambda item: int( item[ 0 ] ) ):
+
+            prefix = f"floors.{ floor }."
+
+            game_map, _ = save_format.restore_map( data, engine, map_state, prefix )
+
+            columns = {
+                name[ len( prefix ): ]: array for name, array in data.items() if name.startswith( prefix )
+            }
+            self.store( int( floor ), game_map, ( map_state, columns ) )
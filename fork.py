@@ -0,0 +1,155 @@
+# cheap copies of a game in progress, for looking ahead and for undo.
+#
+# copy.deepcopy of an engine copies everything it can reach, every floor the player has
+# left, the whole message log and every tile array. a fork only copies what the game
+# changes as it is played, and only once it needs to:
+#   tiles are never written once a floor has been built, they are shared
+#   the entities on the current floor and their components are copied, one dict each,
+#   along with their lists and dicts
+#   the floors the player has left are copied when the fork enters one, see FloorCache.fork
+#   the message log is chained to the original's, the fork only holds what it adds
+#   visible, explored and the ai rng are copied, they are small and change every turn
+#
+# a fork doesn't write to the journal or pre-generate floors, otherwise it plays exactly
+# like the original from the same point:
+#   lookahead = engine.fork()
+#   actions.BumpAction( lookahead.player, 1, 0 ).perform()
+from __future__ import annotations
+
+import random
+from typing import Any, Dict, Iterable, Optional, TYPE_CHECKING
+
+import numpy as np
+
+from actions import Action # type: ignore
+from components.base_component import BaseComponent # type: ignore
+from entity import Entity # type: ignore
+from game_map import GameMap, GameWorld # type: ignore
+
+if TYPE_CHECKING:
+    from engine import Engine # type: ignore
+
+# the objects that belong to a floor and are copied with it, anything else they refer to
+# ( colors, render orders, the map they are on ) is shared or replaced through the memo
+OWNED = ( Entity, BaseComponent, Action )
+
+# values that may have to be copied or replaced
+REFERENCES = OWNED + ( GameMap, list, dict )
+
+# copies already made, by the id of the original
+Memo = Dict[ int, Any ]
+
+def _copy( obj: Any, memo: Memo ) -> Any:
+
+    clone = memo.get( id( obj ) )
+
+    if clone is None:
+
+        clone = memo[ id( obj ) ] = object.__new__( type( obj ) )
+
+        state = clone.__dict__
+        state.update( obj.__dict__ )
+
+        # most values are numbers and strings, which are left alone
+        for key, value in state.items():
+
+            if isinstance( value, REFERENCES ):
+
+                state[ key ] = _copy_value( value, memo )
+
+    return clone
+
+def _copy_value( value: Any, memo: Memo ) -> Any:
+
+    if id( value ) in memo:
+
+        return memo[ id( value ) ]
+
+    if isinstance( value, OWNED ):
+
+        return _copy( value, memo )
+
+    # inventories and ai paths
+    if isinstance( value, list ):
+
+        return [ _copy_value( item, memo ) for item in value ]
+
+    # fighters' modifiers, by the item or effect that added them. most monsters have none
+    if isinstance( value, dict ):
+
+        if not value:
+
+            return {}
+
+        return { _copy_value( key, memo ): _copy_value( item, memo ) for key, item in value.items() }
+
+    return value
+
+# a copy of an entity and its components, for spawning from the templates in
+# entity_factories. the same copy as copy.deepcopy gives for them, several times faster
+def copy_entity( entity: Entity ) -> Entity:
+
+    return _copy( entity, {} )
+
+# a copy of a floor and everything on it for "engine", or only the given entities on it
+def fork_map(
+    game_map: GameMap,
+    engine: Optional[ Engine ],
+    memo: Optional[ Memo ] = None,
+    entities: Optional[ Iterable[ Entity ] ] = None
+) -> GameMap:
+
+    if memo is None:
+
+        memo = {}
+
+    clone = memo[ id( game_map ) ] = object.__new__( type( game_map ) )
+    clone.__dict__.update( game_map.__dict__ )
+
+    clone.engine = engine # type: ignore
+
+    clone.visible = game_map.visible.copy()
+
+    # explored may be memory mapped from a floor cache file
+    clone.explored = np.array( game_map.explored )
+
+    # not seeded first, setstate replaces all of it
+    clone.ai_rng = random.Random.__new__( random.Random )
+    clone.ai_rng.setstate( game_map.ai_rng.getstate() )
+
+    clone.entities = {
+        _copy( entity, memo ) for entity in ( game_map.entities if entities is None else entities )
+    }
+
+    return clone
+
+# a fork of "engine", with only some of the current floor's entities when "entities" is
+# given, for simulations that only care about part of the floor. the player is included
+def fork_engine( engine: Engine, entities: Optional[ Iterable[ Entity ] ] = None ) -> Engine:
+
+    clone = object.__new__( type( engine ) )
+    clone.__dict__.update( engine.__dict__ )
+
+    clone.journal = None
+    clone.message_log = engine.message_log.fork()
+
+    memo: Memo = {}
+
+    if entities is not None:
+
+        entities = set( entities )
+        entities.add( engine.player )
+
+    clone.game_map = fork_map( engine.game_map, clone, memo, entities )
+    clone.player = _copy( engine.player, memo )
+
+    world = engine.game_world
+
+    clone.game_world = object.__new__( GameWorld )
+    clone.game_world.__dict__.update( world.__getstate__() )
+
+    clone.game_world.engine = clone
+    clone.game_world.floors = world.floors.fork()
+    clone.game_world.pregenerate = False
+
+    return clone
@@ -1,7 +1,11 @@
 # import dependencies
 from __future__ import annotations
 
-from typing import Iterable, Iterator, Optional, TYPE_CHECKING
+from concurrent.futures import Future, ThreadPoolExecutor
+import random
+import time
+import traceback
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, TYPE_CHECKING
 
 import numpy as np
 from tcod.console import Console
@@ -13,6 +17,17 @@ if TYPE_CHECKING:
     from engine import Engine
     from entity import Entities
 
+# return a width x height array of the given tile. np.full copies structured values one
+# field at a time, filling through a view of the raw bytes is several times faster
+def filled_tiles( width: int, height: int, tile: np.ndarray ) -> np.ndarray:
+
+    tiles = np.empty( ( width, height ), dtype=tile.dtype, order="F" )
+
+    raw = np.dtype( ( np.void, tile.dtype.itemsize ) )
+    tiles.view( raw )[ ... ] = tile.view( raw )
+
+    return tiles
+
 #
 class GameMap:
 
@@ -25,7 +40,7 @@ class GameMap:
 
         self.entities = set( entities )
 
-        self.tiles = np.full( ( width, height ), fill_value=tile_types.wall, order="F" )
+        self.tiles = filled_tiles( width, height, tile_types.wall )
 
         # tiles the player can currently see
         self.visible = np.full( 
@@ -39,6 +54,26 @@ class GameMap:
 
         self.downstairs_location = ( 0, 0 )
 
+        # stairs back to the floor above, the first floor has none
+        self.upstairs_location: Optional[ Tuple[ int, int ] ] = None
+
+        # where the player is placed when arriving on this floor
+        self.player_start_location = ( 0, 0 )
+
+        # random decisions made by monsters on this floor, replaced by GameWorld with
+        # a stream derived from the world seed
+        self.ai_rng = random.Random()
+
+    # maps pickled before the save format have no stairs up, start location or ai stream,
+    # they start out with the defaults
+    def __setstate__( self, state: dict ) -> None:
+
+        if "ai_rng" not in state:
+
+            self.__init__( state[ "engine" ], state[ "width" ], state[ "height" ] ) # type: ignore
+
+        self.__dict__.update( state )
+
     # return self
     @property
     def gamemap( self ) -> GameMap:
@@ -112,7 +147,10 @@ class GameMap:
                     x=entity.x, y=entity.y, string=entity.char, fg=entity.color
                 )
 
-# holds the settings for the GameMap, and generates new maps when moving down the stairs
+# holds the settings for the GameMap, and generates new maps when moving down the stairs.
+# the next floor is generated speculatively on a worker thread while the player explores
+# the current one, every floor is generated from its own seeded rng streams so the result
+# is the same no matter which thread builds it
 class GameWorld:
 
     def __init__(
@@ -124,8 +162,16 @@ class GameWorld:
             max_rooms: int,
             room_min_size: int,
             room_max_size: int,
-            current_floor: int = 0
+            current_floor: int = 0,
+            seed: Optional[ int ] = None,
+            reject_disconnected_floors: bool = False,
+            max_generation_attempts: int = 3,
+            min_region_size: int = 1,
+            generator_chances: Optional[ Dict[ int, List[ Tuple[ str, int ] ] ] ] = None,
+            floor_memory_budget: int = 32 * 1024 * 1024
     ):
+        from floor_cache import FloorCache
+
         self.engine = engine
 
         self.map_width = map_width
@@ -138,16 +184,232 @@ class GameWorld:
 
         self.current_floor = current_floor
 
+        # master seed, every floor and subsystem derives its own rng stream from it
+        self.seed = seed if seed is not None else random.getrandbits( 64 )
+
+        # how floors with unreachable areas are handled, see build_floor
+        self.reject_disconnected_floors = reject_disconnected_floors
+        self.max_generation_attempts = max_generation_attempts
+        self.min_region_size = min_region_size
+
+        # which generator builds each floor, see build_floor
+        self.generator_chances = generator_chances
+
+        # floors the player has left, kept so they can be revisited
+        self.floor_memory_budget = floor_memory_budget
+        self.floors = FloorCache( memory_budget=floor_memory_budget )
+
+        # build the next floor in the background while the player explores this one
+        self.pregenerate = True
+
+        # worker used for pre-generation, and the ( floor, future ) being built on it
+        self._executor: Optional[ ThreadPoolExecutor ] = None
+        self._pending: Optional[ Tuple[ int, Future ] ] = None
+
+    # the executor and pending future can't be pickled, a loaded world starts without them
+    def __getstate__( self ) -> dict:
+
+        state = self.__dict__.copy()
+        state[ "_executor" ] = None
+        state[ "_pending" ] = None
+
+        return state
+
+    # worlds pickled before the save format have no seed, floor cache or pre-generation,
+    # they start out with the defaults. the floors above weren't kept by those saves
+    def __setstate__( self, state: dict ) -> None:
+
+        if "seed" not in state:
+
+            self.__init__( # type: ignore
+                engine=state[ "engine" ],
+                map_width=state[ "map_width" ],
+                map_height=state[ "map_height" ],
+                max_rooms=state[ "max_rooms" ],
+                room_min_size=state[ "room_min_size" ],
+                room_max_size=state[ "room_max_size" ]
+            )
+
+        self.__dict__.update( state )
+
+    # return an independent random number generator for one subsystem of one floor.
+    # streams only depend on the master seed, the floor and the stream name, so any
+    # floor can be regenerated on any thread or process without replaying the others
+    def rng_for( self, floor: int, stream: str ) -> random.Random:
+
+        return random.Random( f"{ self.seed }/{ floor }/{ stream }" )
+
+    # generate the given floor, this is safe to call from the worker thread.
+    # the generator is picked from "generator_chances" ( proc_gen's table by default )
+    # with the floor's own stream. every floor is checked for tiles that can't be reached from the player's start,
+    # a disconnected floor is either thrown away and generated again from a fresh stream
+    # ( when "reject_disconnected_floors" is set, up to "max_generation_attempts" times )
+    # or repaired. "stats" is passed through to the generator and also receives the
+    # connectivity results
+    def build_floor(
+        self, floor: int, stats: Optional[ Dict[ str, float ] ] = None
+    ) -> GameMap:
+        import proc_gen
+
+        generator = proc_gen.choose_generator(
+            self.generator_chances or proc_gen.generator_chances,
+            floor,
+            self.rng_for( floor, "generator" )
+        )
+        generate = proc_gen.generators[ generator ]
+
+        for attempt in range( self.max_generation_attempts ):
+
+            suffix = f"/{ attempt }" if attempt else ""
+
+            game_map = generate(
+                max_rooms=self.max_rooms,
+                room_min_size=self.room_min_size,
+                room_max_size=self.room_max_size,
+                map_width=self.map_width,
+                map_height=self.map_height,
+                engine=self.engine,
+                floor_number=floor,
+                layout_rng=self.rng_for( floor, "layout" + suffix ),
+                spawn_rng=self.rng_for( floor, "spawn" + suffix ),
+                stats=stats
+            )
+            if (
+                not self.reject_disconnected_floors
+                or proc_gen.check_connectivity( game_map ).connected
+            ):
+
+                break
+
+        start = time.perf_counter()
+
+        report = proc_gen.repair_connectivity( game_map, min_region_size=self.min_region_size )
+
+        if stats is not None:
+
+            stats[ "generator" ] = generator # type: ignore
+            stats[ "attempts" ] = attempt + 1
+            stats[ "regions" ] = report.regions
+            stats[ "tunnels_added" ] = report.tunnels_added
+            stats[ "tiles_filled" ] = report.tiles_filled
+            stats[ "connectivity_time" ] = time.perf_counter() - start
+
+        game_map.ai_rng = self.rng_for( floor, "ai" )
+
+        # every floor below the first leads back up from where the player arrives
+        if floor > 1 and game_map.player_start_location != game_map.downstairs_location:
+
+            game_map.upstairs_location = game_map.player_start_location
+            game_map.tiles[ game_map.upstairs_location ] = tile_types.up_stairs
+
+        return game_map
+
+    # start building the floor below the current one in the background
+    def pregenerate_next_floor( self ) -> None:
+
+        if not self.pregenerate:
+
+            return
+
+        floor = self.current_floor + 1
+
+        if self._pending is not None and self._pending[ 0 ] == floor:
+
+            return # already in progress
+
+        self.cancel_pregeneration()
+
+        if floor in self.floors:
+
+            return # visited before
+
+        if self._executor is None:
+
+            self._executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="floor-pregen"
+            )
+
+        self._pending = ( floor, self._executor.submit( self.build_floor, floor ) )
+
+    # discard any pending pre-generated floor
+    def cancel_pregeneration( self ) -> None:
+
+        if self._pending is not None:
+
+            self._pending[ 1 ].cancel()
+            self._pending = None
+
+    # return the pre-generated map for the given floor, or None if it has to be built now
+    def take_pregenerated_floor( self, floor: int ) -> Optional[ GameMap ]:
+
+        if self._pending is None or self._pending[ 0 ] != floor:
+
+            self.cancel_pregeneration()
+
+            return None
+
+        future = self._pending[ 1 ]
+        self._pending = None
+
+        # the worker hasn't started on it yet, building it here is faster than waiting
+        if future.cancel():
+
+            return None
+
+        # otherwise it is finished or partway done, waiting is never slower than starting over
+        try:
+
+            return future.result()
+
+        except Exception:
+
+            traceback.print_exc() # fall back to building the floor synchronously
+
+            return None
+
+    # move the player down to the next floor, arriving on its up stairs
     def generate_floor( self ) -> None:
-        from proc_gen import generate_dungeon
-
-        self.current_floor += 1
-
-        self.engine.game_map = generate_dungeon(
-            max_rooms=self.max_rooms,
-            room_min_size=self.room_min_size,
-            room_max_size=self.room_max_size,
-            map_width=self.map_width,
-            map_height=self.map_height,
-            engine=self.engine
-        )
\ No newline at end of file
+
+        self.change_floor( self.current_floor + 1 )
+
+    # move the player up to the previous floor, arriving on its down stairs
+    def ascend( self ) -> None:
+
+        self.change_floor( self.current_floor - 1 )
+
+    # move the player to another floor, loading it if it was visited before and building
+    # it otherwise. the floor being left is kept in "floors"
+    def change_floor( self, floor: int ) -> None:
+
+        previous_floor = self.current_floor
+        previous_map = getattr( self.engine, "game_map", None )
+
+        self.current_floor = floor
+
+        game_map = self.floors.take( floor, self.engine )
+
+        if game_map is None:
+
+            game_map = self.take_pregenerated_floor( floor )
+
+        if game_map is None:
+
+            game_map = self.build_floor( floor )
+
+        if floor > previous_floor:
+
+            arrival = game_map.player_start_location
+
+        else:
+
+            arrival = game_map.downstairs_location
+
+        self.engine.player.place( *arrival, game_map )
+
+        self.engine.game_map = game_map
+
+        if previous_map is not None and previous_map is not game_map:
+
+            self.floors.store( previous_floor, previous_map )
+
+        self.pregenerate_next_floor()
@@ -0,0 +1,583 @@
+# run the game without a tcod window, for load testing the game logic.
+#
+# a game is built with setup_game.new_game and played by a "player", any callable that
+# takes the engine and returns the next Action to perform or None to stop. the Bot below
+# explores, fights, drinks potions and takes the stairs on its own, ScriptedPlayer
+# replays a fixed string of commands. every turn is timed by phase: the player choosing
+# its action, the action itself, the enemy turns, fov and, optionally, rendering into an
+# off-screen console.
+#
+# run from the repository root:
+#   python headless.py --turns 2000 --games 5 --render
+#   python headless.py --script "llllj>" --seed 3
+#
+# or as a library:
+#   report = headless.simulate( seed=3, turns=500 )
+from __future__ import annotations
+
+import argparse
+import json
+import time
+from typing import Callable, Dict, List, Optional, Sequence, TYPE_CHECKING
+
+import numpy as np
+import tcod
+import tcod.path
+
+import actions # type: ignore
+from components.consumable import HealingConsumable # type: ignore
+import exceptions # type: ignore
+import instrumentation # type: ignore
+from memory_tracker import MemoryTracker # type: ignore
+import metrics # type: ignore
+from setup_game import new_game # type: ignore
+import tracing # type: ignore
+
+if TYPE_CHECKING:
+    from engine import Engine # type: ignore
+
+# the phases of a turn, in the order they run
+PHASES = ( "think", "player", "enemies", "fov", "render" )
+
+# a player picks the next action, or returns None to end the simulation
+Player = Callable[ [ "Engine" ], Optional[ actions.Action ] ]
+
+# the level up menu, in the order the bot cycles through it
+LEVEL_UP_CHOICES = ( "increase_max_hp", "increase_power", "increase_defense" )
+
+# commands understood by ScriptedPlayer, vi keys for movement
+SCRIPT_MOVES = {
+    "h": ( -1, 0 ),
+    "j": ( 0, 1 ),
+    "k": ( 0, -1 ),
+    "l": ( 1, 0 ),
+    "y": ( -1, -1 ),
+    "u": ( 1, -1 ),
+    "b": ( -1, 1 ),
+    "n": ( 1, 1 )
+}
+
+# plays a fixed sequence of commands: vi keys to move or attack, "." to wait, "g" to
+# pick up, ">" and "<" to take the stairs. stops when the script runs out
+class ScriptedPlayer:
+
+    def __init__( self, script: str ):
+
+        self.script = script
+        self.position = 0
+
+    def __call__( self, engine: Engine ) -> Optional[ actions.Action ]:
+
+        if self.position >= len( self.script ):
+
+            return None
+
+        command = self.script[ self.position ]
+        self.position += 1
+
+        player = engine.player
+
+        if command in SCRIPT_MOVES:
+
+            return actions.BumpAction( player, *SCRIPT_MOVES[ command ] )
+
+        if command == "g":
+
+            return actions.PickupAction( player )
+
+        if command == ">":
+
+            return actions.TakeStairsAction( player )
+
+        if command == "<":
+
+            return actions.TakeUpStairsAction( player )
+
+        return actions.WaitAction( player )
+
+# a simple player that fights whatever it sees, heals when low, picks up items, explores
+# the floor and then takes the stairs down. it only uses what the player has seen
+class Bot:
+
+    def __init__( self, heal_below: float = 0.4 ):
+
+        # drink a healing potion when hp falls below this fraction of max hp
+        self.heal_below = heal_below
+
+    def __call__( self, engine: Engine ) -> Optional[ actions.Action ]:
+
+        player = engine.player
+        game_map = engine.game_map
+
+        fighter = player.fighter
+
+        if fighter.hp < fighter.max_hp * self.heal_below:
+
+            for item in player.inventory.items:
+
+                if isinstance( item.consumable, HealingConsumable ):
+
+                    return actions.ItemAction( player, item )
+
+        # actors is a set, sorted so that the same seed plays the same game
+        enemies = sorted(
+            ( actor for actor in game_map.actors
+              if actor is not player and game_map.visible[ actor.x, actor.y ] ),
+            key=lambda actor: ( actor.y, actor.x )
+        )
+
+        for enemy in enemies:
+
+            if max( abs( enemy.x - player.x ), abs( enemy.y - player.y ) ) <= 1:
+
+                return actions.BumpAction( player, enemy.x - player.x, enemy.y - player.y )
+
+        items = [ item for item in game_map.items if game_map.visible[ item.x, item.y ] ]
+
+        if len( player.inventory.items ) < player.inventory.capacity:
+
+            if any( ( item.x, item.y ) == ( player.x, player.y ) for item in items ):
+
+                return actions.PickupAction( player )
+
+        else:
+
+            items = []
+
+        if ( player.x, player.y ) == game_map.downstairs_location and not enemies:
+
+            if not self._frontier( engine ).any():
+
+                return actions.TakeStairsAction( player )
+
+        # head for the closest thing worth going to: an enemy, an item, the edge of the
+        # explored area, and once the floor is explored the stairs down
+        distance = self._distances( engine )
+
+        for targets in (
+            self._mask( engine, enemies ),
+            self._mask( engine, items ),
+            self._frontier( engine ),
+            self._mask_xy( engine, [ game_map.downstairs_location ] )
+        ):
+            reachable = targets & ( distance < np.iinfo( distance.dtype ).max )
+
+            if reachable.any():
+
+                step = self._step_towards( engine, distance, reachable )
+
+                if step is not None:
+
+                    return actions.BumpAction( player, step[ 0 ] - player.x, step[ 1 ] - player.y )
+
+        return actions.WaitAction( player )
+
+    # the cost of walking from the player to every tile the player has seen
+    def _distances( self, engine: Engine ) -> np.ndarray:
+
+        game_map = engine.game_map
+
+        cost = ( game_map.tiles[ "walkable" ] & game_map.explored ).astype( np.int8 )
+
+        distance = tcod.path.maxarray( cost.shape, dtype=np.int32 )
+        distance[ engine.player.x, engine.player.y ] = 0
+
+        tcod.path.dijkstra2d( distance, cost, 2, 3, out=distance )
+
+        return distance
+
+    def _mask( self, engine: Engine, entities: Sequence ) -> np.ndarray:
+
+        return self._mask_xy( engine, [ ( entity.x, entity.y ) for entity in entities ] )
+
+    def _mask_xy( self, engine: Engine, locations: Sequence ) -> np.ndarray:
+
+        mask = np.zeros( engine.game_map.explored.shape, dtype=bool )
+
+        for x, y in locations:
+
+            mask[ x, y ] = engine.game_map.explored[ x, y ]
+
+        mask[ engine.player.x, engine.player.y ] = False
+
+        return mask
+
+    # walkable tiles the player has seen that are next to tiles it hasn't
+    def _frontier( self, engine: Engine ) -> np.ndarray:
+
+        game_map = engine.game_map
+        unexplored = np.pad( ~game_map.explored, 1 )
+
+        near_unexplored = np.zeros_like( game_map.explored )
+
+        for dx in ( -1, 0, 1 ):
+
+            for dy in ( -1, 0, 1 ):
+
+                near_unexplored |= unexplored[
+                    1 + dx : unexplored.shape[ 0 ] - 1 + dx, 1 + dy : unexplored.shape[ 1 ] - 1 + dy
+                ]
+
+        frontier = game_map.tiles[ "walkable" ] & game_map.explored & near_unexplored
+        frontier[ engine.player.x, engine.player.y ] = False
+
+        return frontier
+
+    # the first step along the shortest path to the closest of "targets"
+    def _step_towards(
+        self, engine: Engine, distance: np.ndarray, targets: np.ndarray
+    ) -> Optional[ tuple ]:
+
+        target_distance = np.where( targets, distance, np.iinfo( distance.dtype ).max )
+        target = np.unravel_index( np.argmin( target_distance ), distance.shape )
+
+        path = tcod.path.hillclimb2d( distance, target, True, True )
+
+        if len( path ) < 2:
+
+            return None
+
+        # the path runs from the target back to the player
+        return int( path[ -2 ][ 0 ] ), int( path[ -2 ][ 1 ] )
+
+# plays one game and keeps timings for every phase of every turn
+class HeadlessGame:
+
+    def __init__(
+        self,
+        engine: Engine,
+        player: Player,
+        console: Optional[ tcod.console.Console ] = None,
+        memory_tracker: Optional[ MemoryTracker ] = None
+    ):
+        self.engine = engine
+        self.player = player
+
+        # rendered into after every turn when set, nothing is ever presented
+        self.console = console
+
+        # given every turn when set, outside the timed phases
+        self.memory_tracker = memory_tracker
+
+        # seconds spent in each phase, summed over all turns
+        self.timings: Dict[ str, float ] = { phase: 0.0 for phase in PHASES }
+
+        # actions that raised Impossible, they don't use up a turn
+        self.impossible = 0
+
+        # a player that keeps trying impossible actions is stuck, the game ends after this
+        # many in a row
+        self.max_impossible = 100
+        self._impossible_in_a_row = 0
+
+        self.level_ups = 0
+
+        # enemies that died during the game, and the xp spent on level ups
+        self.kills = 0
+        self.xp_spent = 0
+
+        self.finished = False
+
+    def _level_up( self ) -> None:
+
+        level = self.engine.player.level
+
+        while level.requires_level_up:
+
+            self.xp_spent += level.experience_to_next_level
+
+            getattr( level, LEVEL_UP_CHOICES[ self.level_ups % len( LEVEL_UP_CHOICES ) ] )()
+
+            self.level_ups += 1
+
+    def _living_enemies( self ) -> int:
+
+        return sum( actor is not self.engine.player for actor in self.engine.game_map.actors )
+
+    # play one turn, returns False once the game is over
+    def step( self ) -> bool:
+
+        if self.finished:
+
+            return False
+
+        engine = self.engine
+        timings = self.timings
+
+        game_map = engine.game_map
+        enemies = self._living_enemies()
+
+        start = time.perf_counter()
+        action = self.player( engine )
+        after_think = time.perf_counter()
+
+        timings[ "think" ] += after_think - start
+
+        if action is None:
+
+            self.finished = True
+
+            return False
+
+        try:
+            action.perform()
+        except exceptions.Impossible:
+            # a turn that isn't used up, like a bump into a wall in the game
+            self.impossible += 1
+            self._impossible_in_a_row += 1
+            timings[ "player" ] += time.perf_counter() - after_think
+            self.finished = self._impossible_in_a_row >= self.max_impossible
+            return not self.finished
+
+        self._impossible_in_a_row = 0
+
+        after_player = time.perf_counter()
+
+        # the enemies and fov phases come from Engine.end_turn's own timers
+        instrumentation.add_sink( self._time_phase )
+
+        try:
+            engine.end_turn()
+        finally:
+            instrumentation.remove_sink( self._time_phase )
+
+        after_fov = time.perf_counter()
+
+        timings[ "player" ] += after_player - after_think
+
+        # kills are only counted on the floor the turn started on
+        if engine.game_map is game_map:
+
+            self.kills += enemies - self._living_enemies()
+
+        if self.console is not None:
+
+            self.console.clear()
+            engine.render( self.console )
+
+            timings[ "render" ] += time.perf_counter() - after_fov
+
+        if not engine.player.is_alive:
+
+            self.finished = True
+
+            return False
+
+        # what the level up menu would ask for
+        self._level_up()
+
+        return True
+
+    # an instrumentation sink, adds the end of turn timers to their phases
+    def _time_phase(
+        self, name: str, start: float, end: float, args: Optional[ dict ] = None
+    ) -> None:
+
+        if name in ( "enemies", "fov" ):
+
+            self.timings[ name ] += end - start
+
+    # play until the game is over or "turns" turns have been played
+    def run( self, turns: int ) -> "HeadlessGame":
+
+        end = self.engine.turn + turns
+
+        if self.memory_tracker is not None:
+
+            self.memory_tracker.on_turn( self.engine )
+
+        while self.engine.turn < end and self.step():
+
+            # between turns, outside the timed phases
+            tracing.flush_if_due()
+
+            if self.memory_tracker is not None:
+
+                self.memory_tracker.on_turn( self.engine )
+
+        return self
+
+    def report( self ) -> Dict[ str, object ]:
+
+        engine = self.engine
+        seconds = sum( self.timings.values() )
+
+        return {
+            "seed": engine.game_world.seed,
+            "turns": engine.turn,
+            "seconds": seconds,
+            "turns_per_second": engine.turn / seconds if seconds else 0.0,
+            "phases": dict( self.timings ),
+            "impossible": self.impossible,
+            "alive": engine.player.is_alive,
+            "floor": engine.game_world.current_floor,
+            "character_level": engine.player.level.current_level,
+            "kills": self.kills,
+            "xp": self.xp_spent + engine.player.level.current_xp,
+            "hp": engine.player.fighter.hp
+        }
+
+# play one game headless and return its report
+def simulate(
+    seed: Optional[ int ] = None,
+    turns: int = 1000,
+    player: Optional[ Player ] = None,
+    render: bool = False,
+    memory_tracker: Optional[ MemoryTracker ] = None,
+    ai_budget: Optional[ int ] = None
+) -> Dict[ str, object ]:
+
+    # traced from before the game exists, so the samples count all of it
+    if memory_tracker is not None:
+
+        memory_tracker.start()
+
+    engine = new_game( seed )
+
+    # unlimited unless asked for, see engine.AI_BUDGET
+    engine.ai_budget = ai_budget
+
+    console = tcod.console.Console( 80, 50, order="F" ) if render else None
+
+    game = HeadlessGame( engine, player or Bot(), console, memory_tracker ).run( turns )
+
+    engine.game_world.cancel_pregeneration()
+
+    report = game.report()
+
+    if memory_tracker is not None:
+
+        # the state at the end, whenever the last snapshot was
+        memory_tracker.take( engine, "end" )
+        memory_tracker.stop()
+
+        report[ "memory" ] = memory_tracker.report()
+
+    return report
+
+def print_report( reports: List[ Dict[ str, object ] ] ) -> None:
+
+    turns = sum( report[ "turns" ] for report in reports ) # type: ignore
+    seconds = sum( report[ "seconds" ] for report in reports ) # type: ignore
+
+    for report in reports:
+
+        print(
+            f"seed { report[ 'seed' ] }: { report[ 'turns' ] } turns, "
+            f"floor { report[ 'floor' ] }, level { report[ 'character_level' ] }, "
+            f"{ 'alive' if report[ 'alive' ] else 'dead' }, "
+            f"{ report[ 'turns_per_second' ]:.0f} turns/s"
+        )
+
+    print( f"{ turns } turns in { seconds:.2f}s, { turns / max( seconds, 1e-9 ):.0f} turns/s" )
+
+    for phase in PHASES:
+
+        total = sum( report[ "phases" ][ phase ] for report in reports ) # type: ignore
+
+        print(
+            f"  { phase:<8} { total:8.3f}s { total / max( turns, 1 ) * 1e6:10.1f}us/turn "
+            f"{ total / max( seconds, 1e-9 ):6.1%}"
+        )
+
+def main( argv: Optional[ List[ str ] ] = None ) -> None:
+
+    parser = argparse.ArgumentParser( description="Play the game without a window." )
+    parser.add_argument( "--turns", type=int, default=1000, help="turns per game" )
+    parser.add_argument( "--games", type=int, default=1 )
+    parser.add_argument( "--seed", type=int, default=0, help="seed of the first game" )
+    parser.add_argument(
+        "--script", help="play these commands instead of the bot, see ScriptedPlayer"
+    )
+    parser.add_argument(
+        "--render", action="store_true", help="render every turn into an off-screen console"
+    )
+    parser.add_argument( "--json", action="store_true", help="print the reports as json" )
+    parser.add_argument( "--trace", metavar="FILE", help="write a trace to FILE, see tracing.py" )
+    parser.add_argument(
+        "--memory-every",
+        type=int,
+        metavar="TURNS",
+        help="track memory with tracemalloc, a snapshot every TURNS turns and on every floor"
+    )
+    parser.add_argument(
+        "--memory-budget",
+        type=float,
+        metavar="MB",
+        help="exit with status 1 if traced memory grows by more than MB in any game"
+    )
+    parser.add_argument(
+        "--ai-budget",
+        type=int,
+        metavar="TILES",
+        help="limit the monsters' pathfinding to TILES map tiles a turn, the game uses "
+        "engine.AI_BUDGET"
+    )
+    parser.add_argument(
+        "--metrics-file", metavar="FILE", help="export metrics to FILE, see metrics.py"
+    )
+    parser.add_argument(
+        "--metrics-port", type=int, metavar="PORT", help="serve metrics on localhost:PORT/metrics"
+    )
+    parser.add_argument(
+        "--metrics-interval", type=float, default=10.0, help="seconds between metrics file writes"
+    )
+    args = parser.parse_args( argv )
+
+    tracking = args.memory_every is not None or args.memory_budget is not None
+
+    budget = int( args.memory_budget * 2**20 ) if args.memory_budget is not None else None
+
+    trackers: List[ MemoryTracker ] = []
+
+    if args.trace:
+
+        tracing.start( args.trace )
+
+    if args.metrics_file or args.metrics_port is not None:
+
+        metrics.start( args.metrics_file, args.metrics_port, args.metrics_interval )
+
+    try:
+        reports = []
+
+        for i in range( args.games ):
+
+            tracker = MemoryTracker( args.memory_every or 1000, budget ) if tracking else None
+
+            if tracker is not None:
+
+                trackers.append( tracker )
+
+            reports.append( simulate(
+                args.seed + i,
+                args.turns,
+                ScriptedPlayer( args.script ) if args.script is not None else Bot(),
+                args.render,
+                tracker,
+                args.ai_budget
+            ) )
+    finally:
+        metrics.stop()
+        tracing.stop()
+
+    if args.json:
+
+        print( json.dumps( reports, indent=2 ) )
+
+    else:
+
+        print_report( reports )
+
+        for report, tracker in zip( reports, trackers ):
+
+            print( f"memory, seed { report[ 'seed' ] }:" )
+            tracker.print_report()
+
+    if any( tracker.exceeded for tracker in trackers ):
+
+        raise SystemExit( 1 )
+
+if __name__ == "__main__":
+
+    main()
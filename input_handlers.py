@@ -10,6 +10,7 @@ import actions # type: ignore
 from actions import Action, PickupAction, BumpAction, WaitAction  # type: ignore
 import color # type: ignore
 import exceptions # type: ignore
+import instrumentation # type: ignore
 
 if TYPE_CHECKING:
     from engine import Engine # type: ignore
@@ -148,22 +149,38 @@ class EventHandler( BaseEventHandler ):
         if action is None:
 
             return False
+
+        with instrumentation.timer( "turn" ):
+
+            journal = self.engine.journal
+
+            if journal is not None:
+
+                journal.begin_turn( action )
         
-        try:
+            try:
+
+                with instrumentation.timer( "player", action=type( action ).__name__ ):
+
+                    action.perform()
+
+            except exceptions.Impossible as exc:
 
-            action.perform()
+                self.engine.message_log.add_message( exc.args[0], color.impossible )
 
-        except exceptions.Impossible as exc:
+                if journal is not None:
 
-            self.engine.message_log.add_message( exc.args[0], color.impossible )
+                    journal.cancel_turn()
 
-            return False # skip enemy turn on exception
+                return False # skip enemy turn on exception
         
-        self.engine.handle_enemy_turns()
+            self.engine.end_turn()
 
-        self.engine.update_fov()
+            if journal is not None:
 
-        return True
+                journal.end_turn( self.engine )
+
+            return True
 
     def ev_mousemotion( self, event: tcod.event.MouseMotion ) -> None:
 
@@ -307,6 +324,8 @@ class LevelUpEventHandler( AskUserEventHandler ):
                 player.level.increase_power()
             else:
                 player.level.increase_defense()
+            if self.engine.journal is not None:
+                self.engine.journal.record_level_up( index )
         else:
             self.engine.message_log.add_message("Invalid Entry", color.invalid )
 
@@ -567,6 +586,11 @@ class MainGameEventHandler( EventHandler ):
         ):
             return actions.TakeStairsAction( player )
 
+        if key == tcod.event.KeySym.COMMA and modifier & (
+            tcod.event.KMOD_LSHIFT | tcod.event.KMOD_RSHIFT
+        ):
+            return actions.TakeUpStairsAction( player )
+
         # user attempts to move
         if key in MOVE_KEYS:
 
@@ -622,9 +646,15 @@ class GameOverEventHandler( EventHandler ):
     # handle exiting out of a finished game
     def on_quit( self ) -> None:
 
-        if os.path.exists( "savegame.sav" ):
+        save_filename = self.engine.save_filename
+
+        if save_filename is not None and os.path.exists( save_filename ):
+
+            os.remove( save_filename ) # deletes the active save file
+
+        if self.engine.journal is not None:
 
-            os.remove( "savegame.sav" ) # deletes the active save file
+            self.engine.journal.delete()
 
         raise exceptions.QuitWithoutSaving() # avoid saving a finished game
     
@@ -0,0 +1,194 @@
+# lightweight timers and counters for finding where a slow turn or frame went.
+#
+# nothing is recorded until instrumentation is enabled, and while it is disabled a timer
+# costs one function call and a flag check. timings are kept over a rolling window of
+# the most recent samples, per name. every timer is also passed to the sinks added with
+# add_sink, whether instrumentation is enabled or not, which is how tracing.py and
+# metrics.py see them:
+#   frame    drawing one frame in the main loop, made of
+#   render   Engine.render
+#   present  presenting the frame
+#   events   handling a frame's events, including any
+#   turn     player turn, made of
+#   player   the player's action
+#   enemies  the enemy turns
+#   fov      recomputing the field of view
+from __future__ import annotations
+
+import contextlib
+import functools
+from collections import deque
+import time
+from typing import Any, Callable, ContextManager, Deque, Dict, Iterator, List, Optional, Tuple, TypeVar
+
+F = TypeVar( "F", bound=Callable[ ..., Any ] )
+
+# called with a timer's name, its start and end time.perf_counter() values and its
+# keyword arguments, on whichever thread the timer ran
+Sink = Callable[ [ str, float, float, Optional[ Dict[ str, Any ] ] ], None ]
+
+# samples kept per timer
+WINDOW = 120
+
+# timers that contain other timers, left out when ranking phases
+TOTALS = ( "frame", "events", "turn" )
+
+enabled = False
+
+_sinks: List[ Sink ] = []
+
+# enabled, or there are sinks, checked by every timer
+_active = False
+
+_timings: Dict[ str, Deque[ float ] ] = {}
+_counters: Dict[ str, int ] = {}
+
+# shared by every timer while disabled
+_null_timer = contextlib.nullcontext()
+
+def _update() -> None:
+
+    global _active
+    _active = enabled or bool( _sinks )
+
+def enable() -> None:
+
+    global enabled
+    enabled = True
+    _update()
+
+def disable() -> None:
+
+    global enabled
+    enabled = False
+    _update()
+
+def add_sink( sink: Sink ) -> None:
+
+    _sinks.append( sink )
+    _update()
+
+def remove_sink( sink: Sink ) -> None:
+
+    if sink in _sinks:
+
+        _sinks.remove( sink )
+
+    _update()
+
+# switch instrumentation on or off, samples from before it was last off are dropped
+def toggle() -> bool:
+
+    if enabled:
+
+        disable()
+
+    else:
+
+        reset()
+        enable()
+
+    return enabled
+
+def reset() -> None:
+
+    _timings.clear()
+    _counters.clear()
+
+# add a sample, in seconds. timers may finish on other threads ( the autosave's write ),
+# so readers copy a window or the names before going through them
+def record( name: str, seconds: float ) -> None:
+
+    if not enabled:
+
+        return
+
+    samples = _timings.get( name )
+
+    if samples is None:
+
+        samples = _timings[ name ] = deque( maxlen=WINDOW )
+
+    samples.append( seconds )
+
+def count( name: str, amount: int = 1 ) -> None:
+
+    if enabled:
+
+        _counters[ name ] = _counters.get( name, 0 ) + amount
+
+# a finished timer, recorded and passed to the sinks
+def _finish( name: str, start: float, args: Dict[ str, Any ] ) -> None:
+
+    end = time.perf_counter()
+
+    record( name, end - start )
+
+    for sink in _sinks:
+
+        sink( name, start, end, args or None )
+
+@contextlib.contextmanager
+def _timer( name: str, args: Dict[ str, Any ] ) -> Iterator[ None ]:
+
+    start = time.perf_counter()
+
+    try:
+        yield
+    finally:
+        _finish( name, start, args )
+
+# time a block of code, keyword arguments only go to the sinks:
+#   with instrumentation.timer( "player", action="BumpAction" ):
+def timer( name: str, **args: Any ) -> ContextManager[ None ]:
+
+    if not _active:
+
+        return _null_timer
+
+    return _timer( name, args )
+
+# time every call of a function
+def timed( name: str ) -> Callable[ [ F ], F ]:
+
+    def decorator( function: F ) -> F:
+
+        @functools.wraps( function )
+        def wrapper( *args: Any, **kwargs: Any ) -> Any:
+
+            if not _active:
+
+                return function( *args, **kwargs )
+
+            start = time.perf_counter()
+
+            try:
+                return function( *args, **kwargs )
+            finally:
+                _finish( name, start, {} )
+
+        return wrapper # type: ignore
+
+    return decorator
+
+# ( mean, max, last ) of a timer's window in seconds, zeros if it has no samples
+def stats( name: str ) -> Tuple[ float, float, float ]:
+
+    samples = list( _timings.get( name, () ) )
+
+    if not samples:
+
+        return 0.0, 0.0, 0.0
+
+    return sum( samples ) / len( samples ), max( samples ), samples[ -1 ]
+
+def counter( name: str ) -> int:
+
+    return _counters.get( name, 0 )
+
+# the "n" phases with the highest mean time, as ( name, mean ) pairs
+def top_phases( n: int = 3 ) -> List[ Tuple[ str, float ] ]:
+
+    phases = [ ( name, stats( name )[ 0 ] ) for name in list( _timings ) if name not in TOTALS ]
+
+    return sorted( phases, key=lambda phase: phase[ 1 ], reverse=True )[ :n ]
@@ -0,0 +1,400 @@
+# an append-only journal of everything that happens between full saves.
+#
+# every turn the player completes is appended as one block holding the player's action,
+# where each monster moved from and to, and a checkpoint of the ai rng and the player's
+# state. level up choices get a block of their own. a turn costs a few dozen bytes, and
+# loading a save replays the journal written after it, so a crash loses at most the turn
+# in progress instead of everything since the last full save.
+#
+# a journal is split into segments, one started whenever the game is saved, each named
+# after the sequence number of its first block. a save records the sequence number it
+# was taken at, replay starts there, and segments that end before the last save written
+# to disk are deleted.
+#
+# segment: magic ( 8 bytes ) | world seed ( u64 ) | blocks ...
+# block: type ( u8 ) | sequence number ( u32 ) | payload length ( u16 ) | payload
+from __future__ import annotations
+
+import glob
+import os
+import struct
+import zlib
+from typing import Iterator, List, Optional, Tuple, TYPE_CHECKING
+
+import numpy as np
+
+import actions # type: ignore
+import exceptions # type: ignore
+import save_format # type: ignore
+
+if TYPE_CHECKING:
+    from engine import Engine # type: ignore
+
+MAGIC = b"RLDJRNL\x00"
+
+# magic, world seed, segments of another game are ignored
+SEGMENT_HEADER = struct.Struct( "<8sQ" )
+
+BLOCK = struct.Struct( "<BIH" )
+
+BLOCK_TURN = 1
+BLOCK_LEVEL_UP = 2
+
+# action kind, dx, dy, inventory index of the item, target x, target y
+ACTION_RECORD = struct.Struct( "<Bbbhhh" )
+
+# a monster moving from one tile to another
+MOVE_RECORD = struct.Struct( "<hhhh" )
+
+# turn, crc of the ai rng state, player x, y and hp
+CHECKPOINT_RECORD = struct.Struct( "<IIhhh" )
+
+# the level.increase_* method for each stat in the level up menu
+LEVEL_UP_CHOICES = ( "increase_max_hp", "increase_power", "increase_defense" )
+
+# every action the player can take, the index is the action kind stored in the journal
+ACTION_KINDS = (
+    actions.WaitAction,
+    actions.BumpAction,
+    actions.MovementAction,
+    actions.MeleeAction,
+    actions.PickupAction,
+    actions.ItemAction,
+    actions.DropItem,
+    actions.EquipAction,
+    actions.TakeStairsAction,
+    actions.TakeUpStairsAction
+)
+
+# encode an action about to be performed by the player
+def encode_action( action: actions.Action ) -> bytes:
+
+    kind = ACTION_KINDS.index( type( action ) )
+
+    dx = getattr( action, "dx", 0 )
+    dy = getattr( action, "dy", 0 )
+
+    item = getattr( action, "item", None )
+    item_index = action.entity.inventory.items.index( item ) if item is not None else -1
+
+    target_x, target_y = getattr( action, "target_xy", ( 0, 0 ) )
+
+    return ACTION_RECORD.pack( kind, dx, dy, item_index, target_x, target_y )
+
+def decode_action( record: bytes, engine: Engine ) -> actions.Action:
+
+    kind, dx, dy, item_index, target_x, target_y = ACTION_RECORD.unpack( record )
+
+    action_type = ACTION_KINDS[ kind ]
+    player = engine.player
+
+    if issubclass( action_type, actions.ActionWithDirection ):
+
+        return action_type( player, dx, dy )
+
+    if issubclass( action_type, actions.ItemAction ):
+
+        return action_type( player, player.inventory.items[ item_index ], ( target_x, target_y ) )
+
+    if action_type is actions.EquipAction:
+
+        return action_type( player, player.inventory.items[ item_index ] )
+
+    return action_type( player )
+
+# the state compared after every replayed turn
+def checkpoint( engine: Engine ) -> bytes:
+
+    rng_state = np.array( engine.game_map.ai_rng.getstate()[ 1 ], dtype=np.uint32 )
+
+    return CHECKPOINT_RECORD.pack(
+        engine.turn,
+        zlib.crc32( rng_state.tobytes() ),
+        engine.player.x,
+        engine.player.y,
+        engine.player.fighter.hp
+    )
+
+class Journal:
+
+    def __init__( self, save_filename: str, seed: int, sync: bool = False ):
+
+        # segments are named after the save they follow
+        self.save_filename = save_filename
+
+        # the world seed of the game being journaled
+        self.seed = seed
+
+        # fsync after every block, survives power loss rather than just a crash
+        self.sync = sync
+
+        # sequence number of the next block
+        self.sequence = 0
+
+        self._file = None
+
+        # the turn being recorded, sent to the file when it completes
+        self._turn: Optional[ bytearray ] = None
+
+    def segment_filename( self, start: int ) -> str:
+
+        return f"{ self.save_filename }.journal-{ start:010d}"
+
+    # the segments on disk, oldest first, as ( first sequence number, filename )
+    def segments( self ) -> List[ Tuple[ int, str ] ]:
+
+        found = []
+
+        for filename in glob.glob( glob.escape( self.save_filename ) + ".journal-*" ):
+
+            start = filename.rsplit( "-", 1 )[ 1 ]
+
+            if start.isdigit():
+
+                found.append( ( int( start ), filename ) )
+
+        return sorted( found )
+
+    # begin writing a new segment at the current sequence number, called whenever the
+    # engine is saved. segments made unnecessary by the save already on disk are removed
+    def rotate( self ) -> None:
+
+        if self._file is not None:
+
+            self._file.close()
+
+        self.remove_obsolete_segments()
+
+        self._open_segment()
+
+    def _open_segment( self ) -> None:
+
+        self._file = open( self.segment_filename( self.sequence ), "ab", buffering=0 )
+
+        if self._file.tell() == 0:
+
+            self._file.write( SEGMENT_HEADER.pack( MAGIC, self.seed ) )
+
+    # remove the segments that end before the sequence number of the save on disk
+    def remove_obsolete_segments( self ) -> None:
+
+        try:
+            saved = save_format.read_header( self.save_filename )[ "summary" ][ "journal_sequence" ]
+        except ( OSError, KeyError, TypeError, ValueError, exceptions.SaveFormatError ):
+            return
+
+        if saved is None:
+
+            return
+
+        segments = self.segments()
+
+        for ( start, filename ), ( end, _ ) in zip( segments, segments[ 1: ] ):
+
+            if end <= saved:
+
+                os.remove( filename )
+
+    def _write_block( self, block_type: int, payload: bytes ) -> None:
+
+        if self._file is None:
+
+            self.rotate()
+
+        self._file.write( BLOCK.pack( block_type, self.sequence, len( payload ) ) + payload )
+
+        if self.sync:
+
+            os.fsync( self._file.fileno() )
+
+        self.sequence += 1
+
+    # start recording a turn, called with the player's action before it is performed
+    def begin_turn( self, action: actions.Action ) -> None:
+
+        self._turn = bytearray( encode_action( action ) )
+
+    # the action turned out to be impossible, nothing happened
+    def cancel_turn( self ) -> None:
+
+        self._turn = None
+
+    def record_move( self, x: int, y: int, new_x: int, new_y: int ) -> None:
+
+        if self._turn is not None:
+
+            self._turn += MOVE_RECORD.pack( x, y, new_x, new_y )
+
+    # finish the turn and append it to the journal
+    def end_turn( self, engine: Engine ) -> None:
+
+        if self._turn is None:
+
+            return
+
+        self._turn += checkpoint( engine )
+
+        self._write_block( BLOCK_TURN, bytes( self._turn ) )
+        self._turn = None
+
+    # "choice" is the index of the stat picked in the level up menu
+    def record_level_up( self, choice: int ) -> None:
+
+        self._write_block( BLOCK_LEVEL_UP, bytes( [ choice ] ) )
+
+    # remove every segment, for a game that is over
+    def delete( self ) -> None:
+
+        self.close()
+
+        for _, filename in self.segments():
+
+            os.remove( filename )
+
+    def close( self ) -> None:
+
+        if self._file is not None:
+
+            self._file.close()
+            self._file = None
+
+        self.remove_obsolete_segments()
+
+    # read the blocks of this game's segments in order, up to a block cut short by a crash.
+    # each block comes with the segment's filename and the block's offset in it
+    def read_blocks( self ) -> Iterator[ Tuple[ int, int, bytes, str, int ] ]:
+
+        for _, filename in self.segments():
+
+            with open( filename, "rb" ) as f:
+
+                data = f.read()
+
+            if data[ : SEGMENT_HEADER.size ] != SEGMENT_HEADER.pack( MAGIC, self.seed ):
+
+                continue
+
+            position = SEGMENT_HEADER.size
+
+            while position < len( data ):
+
+                if position + BLOCK.size > len( data ):
+
+                    break
+
+                block_type, sequence, length = BLOCK.unpack_from( data, position )
+                start = position + BLOCK.size
+
+                if start + length > len( data ):
+
+                    break
+
+                yield block_type, sequence, data[ start : start + length ], filename, position
+
+                position = start + length
+
+            if position < len( data ):
+
+                # the last block was cut short, drop it so new blocks don't follow it
+                with open( filename, "r+b" ) as f:
+
+                    f.truncate( position )
+
+                return
+
+    # replay every block recorded after the engine's save, and carry on journaling from
+    # there. each replayed turn is recorded again and compared with the original, replay
+    # stops at the first turn that comes out differently and goes back to the game as it
+    # was before that turn. returns the engine to carry on with, which is "engine" unless
+    # a turn had to be undone, and the turns replayed, level ups not counted
+    def replay( self, engine: Engine, first_sequence: int ) -> Tuple[ Engine, int ]:
+
+        replayed = 0
+        self.sequence = first_sequence
+
+        # where the blocks that weren't replayed start
+        stopped_at: Optional[ Tuple[ str, int ] ] = None
+
+        engine.journal = self
+
+        for block_type, sequence, payload, filename, offset in self.read_blocks():
+
+            if sequence < first_sequence:
+
+                continue
+
+            if sequence != self.sequence:
+
+                stopped_at = ( filename, offset )
+
+                break # a gap, the journal doesn't follow on from this save
+
+            if block_type == BLOCK_LEVEL_UP:
+
+                getattr( engine.player.level, LEVEL_UP_CHOICES[ payload[ 0 ] ] )()
+
+            elif block_type == BLOCK_TURN:
+
+                action = decode_action( payload[ : ACTION_RECORD.size ], engine )
+
+                # whether the turn comes out the same is only known once it has been
+                # played, so the game as it was is kept to go back to
+                before = engine.fork()
+
+                self.begin_turn( action )
+
+                try:
+                    action.perform()
+                except exceptions.Impossible:
+                    self.cancel_turn()
+                    engine = _undo_turn( engine, before, self )
+                    stopped_at = ( filename, offset )
+                    break
+
+                engine.end_turn()
+
+                replayed_turn = bytes( self._turn or b"" ) + checkpoint( engine )
+                self._turn = None
+
+                if replayed_turn != payload:
+
+                    engine = _undo_turn( engine, before, self )
+                    stopped_at = ( filename, offset )
+
+                    break
+
+                replayed += 1
+
+            self.sequence += 1
+
+        # the blocks that weren't replayed no longer apply, new ones are written after the
+        # last one that was
+        if stopped_at is not None:
+
+            filename, offset = stopped_at
+
+            for start, later in self.segments():
+
+                if later > filename:
+
+                    os.remove( later )
+
+            with open( filename, "r+b" ) as f:
+
+                f.truncate( offset )
+
+        self._open_segment()
+
+        return engine, replayed
+
+# carry on with "before", a fork of "engine" taken before the turn being undone. a fork
+# doesn't journal or pre-generate floors, it takes both over from "engine"
+def _undo_turn( engine: Engine, before: Engine, journal: Journal ) -> Engine:
+
+    engine.game_world.cancel_pregeneration()
+
+    before.journal = journal
+    before.game_world.pregenerate = engine.game_world.pregenerate
+    before.game_world._executor = engine.game_world._executor
+
+    return before
@@ -1,12 +1,28 @@
 # import dependencies
+import argparse
+import contextlib
+import random
+import tempfile
+import time
 import traceback
+from typing import Iterable, List, Optional
 import tcod
 
+from autosave import Autosaver
 import color
 import exceptions
 import input_handlers
+import instrumentation
+import metrics
+import render_functions
+import replay
+import tracing
 import setup_game
 
+# screen dimensions (in tiles)
+SCREEN_WIDTH = 80
+SCREEN_HEIGHT = 50
+
 # if the current event handler has an active engine then save it
 def save_game( handler: input_handlers.BaseEventHandler, filename: str ) -> None:
 
@@ -14,64 +30,258 @@ def save_game( handler: input_handlers.BaseEventHandler, filename: str ) -> None
 
         handler.engine.save_as( filename )
 
+        if handler.engine.journal is not None:
+
+            handler.engine.journal.close()
+
         print( "Game saved." )
 
-# define main
-def main() -> None:
+# autosave in the background while a game is in progress, once the player dies any
+# save still being written is finished so that the finished game can delete it
+def autosave_game( handler: input_handlers.BaseEventHandler, autosaver: Autosaver ) -> None:
+
+    if isinstance( handler, input_handlers.EventHandler ) and handler.engine.player.is_alive:
 
-    # screen dimensions (in tiles)
-    screen_width = 80
-    screen_height = 50
+        autosaver.update( handler.engine )
+
+    else:
+
+        autosaver.wait()
+
+# open the game window
+def new_context() -> tcod.context.Context:
 
     # initialize tileset
     # (path, columns, rows, charmap)
     tileset = tcod.tileset.load_tilesheet(
         "dejavu10x10_gs_tc.png", 32, 8, tcod.tileset.CHARMAP_TCOD )
 
-    # initialize event handler
-    handler: input_handlers.BaseEventHandler = setup_game.MainMenu()
-    
     # initialize tcod context
     # (columns, rows, tileset, title, vsync)
-    with tcod.context.new_terminal(
-        screen_width,
-        screen_height,
+    return tcod.context.new_terminal(
+        SCREEN_WIDTH,
+        SCREEN_HEIGHT,
         tileset=tileset,
         title="roguelike-dev-demo",
         vsync = True
+    )
+
+# render and present a frame, with the performance overlay on top while it is enabled
+def present_frame(
+    handler: input_handlers.BaseEventHandler,
+    console: tcod.console.Console,
+    context: tcod.context.Context
+) -> None:
+
+    with instrumentation.timer( "frame" ):
+
+        console.clear()
+        handler.on_render( console=console )
+
+        if instrumentation.enabled:
+
+            render_functions.render_performance_overlay( console )
+
+        with instrumentation.timer( "present" ):
+
+            context.present( console )
+
+# handle one frame's events and return the next active event handler. an exception in
+# the game drops the rest of the frame's events and is shown in the message log
+def handle_events(
+    handler: input_handlers.BaseEventHandler, events: Iterable[ tcod.event.Event ]
+) -> input_handlers.BaseEventHandler:
+
+    try:
+        for event in events:
+            # F3 toggles the performance overlay, the game never sees it
+            if isinstance( event, tcod.event.KeyDown ) and event.sym == tcod.event.KeySym.F3:
+                instrumentation.toggle()
+                continue
+            with tracing.span(
+                "dispatch", event=type( event ).__name__, handler=type( handler ).__name__
+            ):
+                handler = handler.handle_events( event )
+    except Exception: # handle exceptions in game
+        traceback.print_exc() # print the error to stderr
+        # then print the error to the message log
+        if isinstance( handler, input_handlers.EventHandler ):
+            handler.engine.message_log.add_message(
+                traceback.format_exc(), color.error
+            )
+
+    return handler
+
+# play a recording back, as fast as possible without rendering, or rendered to a window
+# at "fps" frames per second. nothing is saved, and the time taken by every frame is
+# reported next to the time it took when it was recorded
+def play_back( filename: str, fps: Optional[ float ] = None ) -> None:
+
+    recording = replay.Recording.load( filename )
+
+    timings: List[ float ] = []
+
+    # the recorded save and journal are copied so the real ones aren't touched
+    with tempfile.TemporaryDirectory( prefix="replay-" ) as directory, (
+        new_context() if fps else contextlib.nullcontext()
     ) as context:
+
+        handler: input_handlers.BaseEventHandler = setup_game.MainMenu(
+            recording.extract( directory ), recording.seed
+        )
+        root_console = tcod.console.Console( SCREEN_WIDTH, SCREEN_HEIGHT, order="F" )
+
+        next_frame = time.perf_counter()
+
+        try:
+            for _, events in recording.frames:
+
+                if context is not None:
+
+                    present_frame( handler, root_console, context )
+
+                    # keep the window responsive, its own input is ignored
+                    for _ in tcod.event.get():
+                        pass
+
+                    next_frame += 1 / fps # type: ignore
+                    time.sleep( max( 0.0, next_frame - time.perf_counter() ) )
+
+                tracing.flush_if_due()
+
+                with tracing.span( "main_loop" ):
+
+                    start = time.perf_counter()
+                    handler = handle_events( handler, events )
+                    timings.append( time.perf_counter() - start )
+        except SystemExit: # the session quit here
+            pass
+
+    total = sum( timings )
+
+    print(
+        f"{ len( timings ) } frames, { recording.events } events, "
+        f"{ total * 1000:.1f}ms handling events, { total / max( len( timings ), 1 ) * 1000:.3f}ms per frame"
+    )
+    print( "slowest frames:" )
+
+    for index, seconds in replay.slowest_frames( timings ):
+
+        recorded = recording.frames[ index ][ 0 ] / 1000
+
+        print( f"  frame { index:>6} { seconds * 1000:9.3f}ms ( recorded { recorded:.3f}ms )" )
+
+# define main
+def main( argv: Optional[ List[ str ] ] = None ) -> None:
+
+    parser = argparse.ArgumentParser( description="Tombs of the Ancient Kings" )
+    parser.add_argument( "--seed", type=int, help="the seed for new games" )
+    parser.add_argument( "--record", metavar="FILE", help="record the session's input to FILE" )
+    parser.add_argument( "--replay", metavar="FILE", help="play back a recorded session" )
+    parser.add_argument(
+        "--fps",
+        type=float,
+        help="render the playback at this frame rate, by default it runs without rendering"
+    )
+    parser.add_argument(
+        "--trace", metavar="FILE", help="write a trace of the session to FILE, see tracing.py"
+    )
+    parser.add_argument(
+        "--metrics-file", metavar="FILE", help="export metrics to FILE, see metrics.py"
+    )
+    parser.add_argument(
+        "--metrics-port", type=int, metavar="PORT", help="serve metrics on localhost:PORT/metrics"
+    )
+    args = parser.parse_args( argv )
+
+    if args.trace:
+
+        tracing.start( args.trace )
+
+    if args.metrics_file or args.metrics_port is not None:
+
+        metrics.start( args.metrics_file, args.metrics_port )
+
+    try:
+        run( args )
+    finally:
+        metrics.stop()
+        tracing.stop()
+
+def run( args: argparse.Namespace ) -> None:
+
+    if args.replay:
+
+        play_back( args.replay, args.fps )
+
+        return
+
+    seed = args.seed
+
+    # a recording needs to know the seed of any new game it starts
+    if args.record and seed is None:
+
+        seed = random.getrandbits( 64 )
+
+    recorder = replay.Recorder( args.record, seed, "savegame.sav" ) if args.record else None
+
+    # initialize event handler
+    handler: input_handlers.BaseEventHandler = setup_game.MainMenu( seed=seed )
+
+    # saves the game every minute without blocking input
+    autosaver = Autosaver( "savegame.sav", interval=60.0 )
+    
+    with new_context() as context:
         
         # initialize root console
         # (width, height, order)
-        root_console = tcod.console.Console( screen_width, screen_height, order="F" )
+        root_console = tcod.console.Console( SCREEN_WIDTH, SCREEN_HEIGHT, order="F" )
 
         # initialize main loop
         try:
             while True:
 
-                root_console.clear()
-                handler.on_render( console=root_console )
-                context.present( root_console )
+                with tracing.span( "main_loop" ):
+
+                    present_frame( handler, root_console, context )
+
+                    # a good moment to write out the trace, nothing is being timed
+                    tracing.flush_if_due()
 
-                try:
-                    for event in tcod.event.wait():
+                    with tracing.span( "wait" ):
+
+                        events = list( tcod.event.wait() )
+
+                    for event in events:
                         context.convert_event( event )
-                        handler = handler.handle_events( event )
-                except Exception: # handle exceptions in game
-                    traceback.print_exc() # print the error to stderr
-                    # then print the error to the message log
-                    if isinstance( handler, input_handlers.EventHandler ):
-                        handler.engine.message_log.add_message(
-                            traceback.format_exc(), color.error
-                        )
+                        if recorder is not None:
+                            recorder.record( event )
+
+                    start = time.perf_counter()
+
+                    with instrumentation.timer( "events" ):
+
+                        handler = handle_events( handler, events )
+
+                    if recorder is not None:
+
+                        recorder.end_frame( time.perf_counter() - start )
+
+                    autosave_game( handler, autosaver )
         except exceptions.QuitWithoutSaving:
             raise
         except SystemExit: # save and quit
+            autosaver.wait()
             save_game( handler, "savegame.sav" )
             raise
         except BaseException: # save on any other unexpected exception
+            autosaver.wait()
             save_game( handler, "savegame.sav" )
             raise
+        finally:
+            autosaver.close()
+            if recorder is not None:
+                recorder.close()
 
 # execute main
 if __name__ == "__main__":
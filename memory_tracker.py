@@ -0,0 +1,248 @@
+# track memory growth over a long session with tracemalloc, to find leaks.
+#
+# a snapshot is taken whenever the player reaches a new floor and every "every_turns"
+# turns. each one records the memory traced by python, a census of what the game is
+# holding on to ( entities, corpses, messages, map arrays, cached floors ) and, against
+# the first snapshot, which of the game's modules the growth was allocated from. growth
+# is attributed to the innermost frame inside the repository, so a monster copied by
+# Entity.spawn counts against entity.py rather than the standard library's copy.py.
+#
+# tracemalloc slows the game down several times over, this is for soak runs such as
+#   python headless.py --turns 20000 --memory-every 1000 --memory-budget 64
+from __future__ import annotations
+
+import os
+import time
+import tracemalloc
+from typing import Dict, List, Optional, Tuple, TYPE_CHECKING
+
+from entity import Actor # type: ignore
+from floor_cache import estimate_size # type: ignore
+
+if TYPE_CHECKING:
+    from engine import Engine # type: ignore
+
+# allocations are attributed to files under this directory
+ROOT = os.path.dirname( os.path.abspath( __file__ ) )
+
+# what the game is holding on to, counted from the engine without tracemalloc
+def census( engine: Engine ) -> Dict[ str, int ]:
+
+    game_map = engine.game_map
+    floors = engine.game_world.floors
+
+    actors = [ entity for entity in game_map.entities if isinstance( entity, Actor ) ]
+
+    return {
+        "entities": len( game_map.entities ) + sum( len( actor.inventory.items ) for actor in actors ),
+        "corpses": sum( not actor.is_alive for actor in actors ),
+        "messages": len( engine.message_log.messages ),
+        "message_chars": sum( len( message.plain_text ) for message in engine.message_log.messages ),
+        "map_bytes": estimate_size( game_map ),
+        "floors_in_memory": len( floors.floors_in_memory ),
+        "floors_on_disk": len( floors.floors_on_disk ),
+        "floor_cache_bytes": floors.memory_usage
+    }
+
+# the module an allocation belongs to, the innermost frame under ROOT
+def _module( traceback: tracemalloc.Traceback ) -> str:
+
+    for frame in reversed( traceback ):
+
+        if frame.filename.startswith( ROOT ):
+
+            return os.path.relpath( frame.filename, ROOT )
+
+    return "<other>"
+
+class MemorySample:
+
+    def __init__(
+        self,
+        label: str,
+        turn: int,
+        floor: int,
+        traced: int,
+        peak: int,
+        counts: Dict[ str, int ],
+        growth_by_module: List[ Tuple[ str, int ] ]
+    ):
+        self.label = label
+        self.turn = turn
+        self.floor = floor
+
+        # bytes traced by tracemalloc now and at its peak
+        self.traced = traced
+        self.peak = peak
+
+        # see census()
+        self.counts = counts
+
+        # bytes allocated since the first sample, by module, largest first
+        self.growth_by_module = growth_by_module
+
+        self.time = time.time()
+
+    def as_dict( self ) -> dict:
+
+        return {
+            "label": self.label,
+            "turn": self.turn,
+            "floor": self.floor,
+            "traced": self.traced,
+            "peak": self.peak,
+            "counts": self.counts,
+            "growth_by_module": self.growth_by_module,
+            "time": self.time
+        }
+
+class MemoryTracker:
+
+    def __init__(
+        self,
+        every_turns: int = 1000,
+        budget: Optional[ int ] = None,
+        top: int = 10,
+        frames: int = 16
+    ):
+        # turns between snapshots, on top of one for every new floor
+        self.every_turns = every_turns
+
+        # bytes the traced memory may grow past the first sample
+        self.budget = budget
+
+        # modules kept in each sample's growth list
+        self.top = top
+
+        # stack depth tracemalloc records, enough to get past copy.deepcopy and numpy
+        self.frames = frames
+
+        self.samples: List[ MemorySample ] = []
+
+        self._baseline: Optional[ tracemalloc.Snapshot ] = None
+        self._started = False
+
+        self._floor: Optional[ int ] = None
+        self._last_turn = 0
+
+    def start( self ) -> None:
+
+        if not tracemalloc.is_tracing():
+
+            tracemalloc.start( self.frames )
+            self._started = True
+
+    # stop tracing, if it was started here
+    def stop( self ) -> None:
+
+        if self._started:
+
+            tracemalloc.stop()
+            self._started = False
+
+        self._baseline = None
+
+    # call after every turn, takes a snapshot on a new floor or every "every_turns" turns
+    def on_turn( self, engine: Engine ) -> None:
+
+        floor = engine.game_world.current_floor
+
+        if floor != self._floor:
+
+            self._floor = floor
+            self.take( engine, f"floor { floor }" )
+
+        elif engine.turn - self._last_turn >= self.every_turns:
+
+            self.take( engine, f"turn { engine.turn }" )
+
+    def take( self, engine: Engine, label: str ) -> MemorySample:
+
+        self.start()
+
+        self._last_turn = engine.turn
+
+        snapshot = tracemalloc.take_snapshot().filter_traces( (
+            tracemalloc.Filter( False, tracemalloc.__file__ ),
+            tracemalloc.Filter( False, "<frozen importlib._bootstrap>" ),
+            tracemalloc.Filter( False, "<frozen importlib._bootstrap_external>" )
+        ) )
+
+        growth: Dict[ str, int ] = {}
+
+        if self._baseline is None:
+
+            self._baseline = snapshot
+
+        else:
+
+            for stat in snapshot.compare_to( self._baseline, "traceback" ):
+
+                module = _module( stat.traceback )
+                growth[ module ] = growth.get( module, 0 ) + stat.size_diff
+
+        traced, peak = tracemalloc.get_traced_memory()
+
+        sample = MemorySample(
+            label,
+            engine.turn,
+            engine.game_world.current_floor,
+            traced,
+            peak,
+            census( engine ),
+            sorted( growth.items(), key=lambda item: item[ 1 ], reverse=True )[ :self.top ]
+        )
+        self.samples.append( sample )
+
+        return sample
+
+    # bytes the traced memory grew from the first sample to the last
+    @property
+    def growth( self ) -> int:
+
+        if len( self.samples ) < 2:
+
+            return 0
+
+        return self.samples[ -1 ].traced - self.samples[ 0 ].traced
+
+    @property
+    def exceeded( self ) -> bool:
+
+        return self.budget is not None and self.growth > self.budget
+
+    def report( self ) -> dict:
+
+        return {
+            "budget": self.budget,
+            "growth": self.growth,
+            "exceeded": self.exceeded,
+            "samples": [ sample.as_dict() for sample in self.samples ]
+        }
+
+    def print_report( self ) -> None:
+
+        print( f"  { 'sample':<12} { 'turn':>6} { 'traced':>9} { 'entities':>8} { 'corpses':>7} { 'messages':>8}" )
+
+        for sample in self.samples:
+
+            print(
+                f"  { sample.label:<12} { sample.turn:>6} { sample.traced / 2**20:7.2f}MB "
+                f"{ sample.counts[ 'entities' ]:>8} { sample.counts[ 'corpses' ]:>7} "
+                f"{ sample.counts[ 'messages' ]:>8}"
+            )
+
+        if self.samples:
+
+            print( "  growth by module since the first sample:" )
+
+            for module, size in self.samples[ -1 ].growth_by_module:
+
+                print( f"    { module:<30} { size / 1024:+10.1f}KB" )
+
+        budget = f" of a { self.budget / 2**20:.1f}MB budget" if self.budget is not None else ""
+
+        print(
+            f"  grew { self.growth / 2**20:.2f}MB{ budget }"
+            + ( ", over budget" if self.exceeded else "" )
+        )
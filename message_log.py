@@ -1,5 +1,6 @@
 # import dependencies
-from typing import Iterable, List, Reversible, Tuple
+import copy
+from typing import Iterable, List, Optional, Reversible, Tuple
 import textwrap
 import tcod
 
@@ -29,21 +30,83 @@ class MessageLog:
 
     def __init__( self ) -> None:
 
-        self.messages: List[ Message ] = []
+        # a forked log is chained to the log it was forked from: its first "_inherited"
+        # messages are read from "_parent", and only the ones after them are its own
+        self._parent: Optional[ MessageLog ] = None
+        self._inherited = 0
+
+        self._messages: List[ Message ] = []
+
+    # logs pickled before the save format hold their messages in "messages"
+    def __setstate__( self, state: dict ) -> None:
+
+        self.__init__() # type: ignore
+
+        if "messages" in state:
+
+            state = dict( state )
+            state[ "_messages" ] = state.pop( "messages" )
+            state.pop( "_shared", None )
+
+        self.__dict__.update( state )
+
+    def __len__( self ) -> int:
+
+        return self._inherited + len( self._messages )
+
+    # every message, oldest first. a forked log is flattened into a list of its own the
+    # first time they are all needed
+    @property
+    def messages( self ) -> List[ Message ]:
+
+        if self._parent is not None:
+
+            self._messages = self._parent._head( self._inherited ) + self._messages
+            self._parent = None
+            self._inherited = 0
+
+        return self._messages
+
+    # the first "count" messages, without flattening the log
+    def _head( self, count: int ) -> List[ Message ]:
+
+        if self._parent is not None and count <= self._inherited:
+
+            return self._parent._head( count )
+
+        head = self._parent._head( self._inherited ) if self._parent is not None else []
+
+        return head + self._messages[ : count - self._inherited ]
+
+    # a copy of this log, in constant time however long the log is. messages are only
+    # ever appended or stacked onto the last one, so everything before the last message
+    # is read from this log and the fork keeps a copy of the last message of its own
+    def fork( self ) -> "MessageLog":
+
+        clone = MessageLog()
+
+        if self._messages:
+
+            clone._parent = self
+            clone._inherited = len( self ) - 1
+            clone._messages = [ copy.copy( self._messages[ -1 ] ) ]
+
+        return clone
 
     # add a message to this log, if "stack" is true, then the message can
     # stack with a previous message of the same text
     def add_message(
         self, text: str, fg: Tuple[ int, int, int ] = color.white, *, stack: bool = True
     ) -> None:
-        
-        if stack and self.messages and text == self.messages[ -1 ].plain_text:
 
-            self.messages[ -1 ].count += 1
+        # a log with any messages always has the last one of its own, see fork
+        if stack and self._messages and text == self._messages[ -1 ].plain_text:
+
+            self._messages[ -1 ].count += 1
 
         else:
 
-            self.messages.append( Message( text, fg ) )
+            self._messages.append( Message( text, fg ) )
 
     # render this log over the given area
     def render(
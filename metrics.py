@@ -0,0 +1,359 @@
+# counters, gauges and histograms for watching a long running game or simulation from
+# outside, exported in the prometheus text format to a file, for node_exporter's
+# textfile collector for instance, and/or over http on localhost.
+#
+# collected:
+#   roguelike_turns_total, roguelike_turns_per_second
+#   roguelike_floors_total, roguelike_floor, and the entities on each floor entered
+#   roguelike_entities, roguelike_messages on the current floor and in the log
+#   roguelike_phase_seconds{phase=...} for every instrumentation timer, which includes
+#     enemies ( the ai ), get_path_to ( its _count is the pathfinding calls ), fov,
+#     render, save and the autosave's snapshot and write
+#
+# nothing is locked. every metric has a single writer, the game thread for everything
+# but the autosave's write which is only timed on the autosave thread, and the exporters
+# only read, so at worst an export sees a histogram halfway through an update. the
+# autosave thread can still add a phase, so the exporters copy the table first.
+#
+#   metrics.start( filename="sim.prom", port=9464 )
+from __future__ import annotations
+
+import bisect
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, TYPE_CHECKING
+
+import instrumentation # type: ignore
+
+if TYPE_CHECKING:
+    from engine import Engine # type: ignore
+
+# upper bounds in seconds for the phase histograms
+SECONDS_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5
+)
+
+ENTITY_BUCKETS = ( 5, 10, 20, 40, 80, 160, 320, 640 )
+
+class Counter:
+
+    def __init__( self, name: str, help: str ):
+
+        self.name = name
+        self.help = help
+        self.value = 0
+
+    def inc( self, amount: int = 1 ) -> None:
+
+        self.value += amount
+
+    def render( self ) -> List[ str ]:
+
+        return [
+            f"# HELP { self.name } { self.help }",
+            f"# TYPE { self.name } counter",
+            f"{ self.name } { self.value }"
+        ]
+
+class Gauge:
+
+    def __init__( self, name: str, help: str ):
+
+        self.name = name
+        self.help = help
+        self.value: float = 0
+
+    def set( self, value: float ) -> None:
+
+        self.value = value
+
+    def render( self ) -> List[ str ]:
+
+        return [
+            f"# HELP { self.name } { self.help }",
+            f"# TYPE { self.name } gauge",
+            f"{ self.name } { self.value }"
+        ]
+
+class Histogram:
+
+    def __init__( self, buckets: Sequence[ float ] ):
+
+        self.buckets = tuple( buckets )
+
+        # observations per bucket, not cumulative, the last one is +Inf
+        self.counts = [ 0 ] * ( len( self.buckets ) + 1 )
+        self.sum = 0.0
+        self.count = 0
+
+    def observe( self, value: float ) -> None:
+
+        self.counts[ bisect.bisect_left( self.buckets, value ) ] += 1
+        self.sum += value
+        self.count += 1
+
+    # the sample lines, "labels" such as 'phase="fov"' are added to each one
+    def render_samples( self, name: str, labels: str = "" ) -> List[ str ]:
+
+        prefix = labels + "," if labels else ""
+
+        lines = []
+        total = 0
+
+        for bound, count in zip( self.buckets + ( float( "inf" ), ), list( self.counts ) ):
+
+            total += count
+            le = "+Inf" if bound == float( "inf" ) else repr( bound )
+
+            lines.append( f'{ name }_bucket{{{ prefix }le="{ le }"}} { total }' )
+
+        suffix = f"{{{ labels }}}" if labels else ""
+
+        lines.append( f"{ name }_sum{ suffix } { self.sum }" )
+        lines.append( f"{ name }_count{ suffix } { total }" )
+
+        return lines
+
+class Registry:
+
+    def __init__( self ) -> None:
+
+        self.started = time.perf_counter()
+
+        self.turns = Counter( "roguelike_turns_total", "Turns played." )
+        self.turns_per_second = Gauge(
+            "roguelike_turns_per_second", "Turns per second over roughly the last second."
+        )
+        self.floors = Counter( "roguelike_floors_total", "Floors entered." )
+        self.floor = Gauge( "roguelike_floor", "The current floor." )
+        self.entities = Gauge( "roguelike_entities", "Entities on the current floor." )
+        self.messages = Gauge( "roguelike_messages", "Messages in the message log." )
+
+        # entities on each floor, when it was entered
+        self.floor_entities = Histogram( ENTITY_BUCKETS )
+
+        # by instrumentation timer name
+        self.phases: Dict[ str, Histogram ] = {}
+
+        self._floor: Optional[ int ] = None
+
+        # turns counted since the start of the current rate window
+        self._window_start = self.started
+        self._window_turns = 0
+
+    # an instrumentation sink
+    def observe_timer(
+        self, name: str, start: float, end: float, args: Optional[ Dict[ str, Any ] ] = None
+    ) -> None:
+
+        histogram = self.phases.get( name )
+
+        if histogram is None:
+
+            histogram = self.phases[ name ] = Histogram( SECONDS_BUCKETS )
+
+        histogram.observe( end - start )
+
+    def turn_ended( self, engine: Engine ) -> None:
+
+        self.turns.inc()
+
+        game_map = engine.game_map
+        floor = engine.game_world.current_floor
+
+        if floor != self._floor:
+
+            self._floor = floor
+            self.floors.inc()
+            self.floor.set( floor )
+            self.floor_entities.observe( len( game_map.entities ) )
+
+        self.entities.set( len( game_map.entities ) )
+        self.messages.set( len( engine.message_log.messages ) )
+
+        now = time.perf_counter()
+        self._window_turns += 1
+
+        if now - self._window_start >= 1.0:
+
+            self.turns_per_second.set( self._window_turns / ( now - self._window_start ) )
+
+            self._window_start = now
+            self._window_turns = 0
+
+    # every metric in the prometheus text format
+    def render( self ) -> str:
+
+        lines: List[ str ] = []
+
+        for metric in (
+            self.turns, self.turns_per_second, self.floors, self.floor, self.entities, self.messages
+        ):
+            lines += metric.render()
+
+        lines += [
+            "# HELP roguelike_floor_entities Entities on each floor when it was entered.",
+            "# TYPE roguelike_floor_entities histogram"
+        ]
+        lines += self.floor_entities.render_samples( "roguelike_floor_entities" )
+
+        lines += [
+            "# HELP roguelike_phase_seconds Time spent in each instrumented phase.",
+            "# TYPE roguelike_phase_seconds histogram"
+        ]
+
+        for name, histogram in sorted( list( self.phases.items() ) ):
+
+            lines += histogram.render_samples( "roguelike_phase_seconds", f'phase="{ name }"' )
+
+        lines += [
+            "# HELP roguelike_uptime_seconds Seconds since metrics were started.",
+            "# TYPE roguelike_uptime_seconds gauge",
+            f"roguelike_uptime_seconds { time.perf_counter() - self.started }"
+        ]
+
+        return "\n".join( lines ) + "\n"
+
+    # write the metrics to a file, through a temporary file so readers never see half
+    def write( self, filename: str ) -> None:
+
+        temporary = filename + ".tmp"
+
+        with open( temporary, "w" ) as f:
+
+            f.write( self.render() )
+
+        os.replace( temporary, filename )
+
+class _Handler( BaseHTTPRequestHandler ):
+
+    registry: Registry
+
+    def do_GET( self ) -> None:
+
+        if self.path not in ( "/", "/metrics" ):
+
+            self.send_error( 404 )
+
+            return
+
+        body = self.registry.render().encode()
+
+        self.send_response( 200 )
+        self.send_header( "Content-Type", "text/plain; version=0.0.4" )
+        self.send_header( "Content-Length", str( len( body ) ) )
+        self.end_headers()
+        self.wfile.write( body )
+
+    # scrapes aren't worth a line on stderr each
+    def log_message( self, format: str, *args: Any ) -> None:
+
+        pass
+
+class Exporter:
+
+    def __init__(
+        self,
+        registry: Registry,
+        filename: Optional[ str ] = None,
+        port: Optional[ int ] = None,
+        interval: float = 10.0
+    ):
+        self.registry = registry
+
+        # rewritten every "interval" seconds when set
+        self.filename = filename
+        self.interval = interval
+
+        self._stop = threading.Event()
+        self._writer: Optional[ threading.Thread ] = None
+        self._server: Optional[ ThreadingHTTPServer ] = None
+
+        if filename is not None:
+
+            self._writer = threading.Thread(
+                target=self._write_periodically, name="metrics-file", daemon=True
+            )
+            self._writer.start()
+
+        if port is not None:
+
+            handler = type( "Handler", ( _Handler, ), { "registry": registry } )
+
+            # only ever bound to localhost
+            self._server = ThreadingHTTPServer( ( "127.0.0.1", port ), handler )
+            self._server.daemon_threads = True
+
+            threading.Thread(
+                target=self._server.serve_forever, name="metrics-http", daemon=True
+            ).start()
+
+    # the port the http endpoint is listening on, useful when it was started on port 0
+    @property
+    def port( self ) -> Optional[ int ]:
+
+        return self._server.server_address[ 1 ] if self._server is not None else None
+
+    def _write_periodically( self ) -> None:
+
+        while not self._stop.wait( self.interval ):
+
+            self.registry.write( self.filename ) # type: ignore
+
+    # stop exporting, the file is written one last time
+    def close( self ) -> None:
+
+        self._stop.set()
+
+        if self._writer is not None:
+
+            self._writer.join()
+            self.registry.write( self.filename ) # type: ignore
+
+        if self._server is not None:
+
+            self._server.shutdown()
+            self._server.server_close()
+
+# the active registry and exporter, None while metrics are off
+registry: Optional[ Registry ] = None
+exporter: Optional[ Exporter ] = None
+
+def start(
+    filename: Optional[ str ] = None, port: Optional[ int ] = None, interval: float = 10.0
+) -> Registry:
+
+    global registry, exporter
+
+    stop()
+
+    registry = Registry()
+
+    instrumentation.add_sink( registry.observe_timer )
+
+    exporter = Exporter( registry, filename, port, interval )
+
+    return registry
+
+def stop() -> None:
+
+    global registry, exporter
+
+    if exporter is not None:
+
+        exporter.close()
+        exporter = None
+
+    if registry is not None:
+
+        instrumentation.remove_sink( registry.observe_timer )
+        registry = None
+
+# called by Engine.end_turn
+def turn_ended( engine: Engine ) -> None:
+
+    if registry is not None:
+
+        registry.turn_ended( engine )
@@ -1,7 +1,10 @@
 # import dependencies
 from __future__ import annotations
 import random
-from typing import Dict, Iterator, List, Tuple, TYPE_CHECKING
+import time
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple, TYPE_CHECKING
+
+import numpy as np
 import tcod
 
 import entity_factories
@@ -60,7 +63,8 @@ def get_max_value_for_floor(
 def get_entities_at_random(
     weighted_chances_by_floor: Dict[int, List[Tuple[Entity, int]]],
     number_of_entities: int,
-    floor: int
+    floor: int,
+    rng: random.Random
 ) -> List[Entity]:
     
     entity_weighted_chances = {}
@@ -83,7 +87,7 @@ def get_entities_at_random(
     entities = list( entity_weighted_chances.keys() )
     entity_weighted_chance_values = list( entity_weighted_chances.values() )
 
-    chosen_entities = random.choices(
+    chosen_entities = rng.choices(
         entities, weights=entity_weighted_chance_values, k=number_of_entities
     )
     return chosen_entities
@@ -125,39 +129,65 @@ class RectangularRoom:
             and self.y2 >= other.y1
         )
     
-# populate a room with enemies
-def place_entities( room: RectangularRoom, dungeon: GameMap, floor_number: int ) -> None:
-
-    number_of_monsters = random.randint(
+# spawn one group of monsters and items for the given floor. positions come from
+# "random_position", anything landing on the player's start or on a position in
+# "occupied" is skipped, and every position used is added to "occupied"
+def spawn_group(
+    dungeon: GameMap,
+    floor_number: int,
+    rng: random.Random,
+    random_position: Callable[ [], Tuple[ int, int ] ],
+    occupied: Set[ Tuple[ int, int ] ]
+) -> None:
+
+    number_of_monsters = rng.randint(
         0, get_max_value_for_floor( max_monsters_by_floor, floor_number )
     )
-    number_of_items = random.randint(
+    number_of_items = rng.randint(
         0, get_max_value_for_floor( max_items_by_floor, floor_number )
     )
 
     monsters: List[Entity] = get_entities_at_random(
-        enemy_chances, number_of_monsters, floor_number
+        enemy_chances, number_of_monsters, floor_number, rng
     )
     items: List[Entity] = get_entities_at_random(
-        item_chances, number_of_items, floor_number
+        item_chances, number_of_items, floor_number, rng
     )
 
     for entity in monsters + items:
-            x = random.randint( room.x1 + 1, room.x2 - 1 )
-            y = random.randint( room.y1 + 1, room.y2 - 1 )
-
-            if not any( entity.x == x and entity.y == y for entity in dungeon.entities ):
-                entity.spawn( dungeon, x, y )
-    
-# builds an L-shaped tunnel between two points
-def tunnel_between( 
-    start: Tuple[ int, int ], end: Tuple[ int, int ]
-) -> Iterator[ Tuple[ int, int ] ]:
+            position = random_position()
+
+            if position == dungeon.player_start_location or position in occupied:
+                continue
+
+            entity.spawn( dungeon, *position )
+            occupied.add( position )
+
+# populate a room with enemies, the player's starting location is kept clear. rooms never
+# overlap, so only entities placed in this room can be in the way
+def place_entities(
+    room: RectangularRoom, dungeon: GameMap, floor_number: int, rng: random.Random
+) -> None:
+
+    spawn_group(
+        dungeon,
+        floor_number,
+        rng,
+        lambda: ( rng.randint( room.x1 + 1, room.x2 - 1 ), rng.randint( room.y1 + 1, room.y2 - 1 ) ),
+        set()
+    )
     
+# return the coordinates of an L-shaped tunnel between two points as a ( 2, length ) array
+# of x and y indices, both bresenham legs are concatenated so the whole tunnel can be
+# carved with a single fancy-index assignment
+def tunnel_coordinates(
+    start: Tuple[ int, int ], end: Tuple[ int, int ], rng: random.Random
+) -> np.ndarray:
+
     x1, y1 = start
     x2, y2 = end
 
-    if random.random() < 0.5: # 50% chance
+    if rng.random() < 0.5: # 50% chance
 
         # move horizontally, then vertically
         corner_x, corner_y = x2, y1
@@ -167,45 +197,89 @@ def tunnel_between(
         # move vertically, then horizontally
         corner_x, corner_y = x1, y2
 
-    # generate the coordinates for this tunnel
-    for x, y in tcod.los.bresenham( ( x1, y1 ), ( corner_x, corner_y ) ).tolist():
-        yield x, y
-        
-    for x, y in tcod.los.bresenham( ( corner_x, corner_y ), ( x2, y2 ) ).tolist():
+    # the second leg starts on the corner, which the first leg already covers
+    first_leg = tcod.los.bresenham( ( x1, y1 ), ( corner_x, corner_y ) )
+    second_leg = tcod.los.bresenham( ( corner_x, corner_y ), ( x2, y2 ) )[ 1: ]
+
+    return np.concatenate( ( first_leg, second_leg ) ).T
+
+# builds an L-shaped tunnel between two points
+def tunnel_between( 
+    start: Tuple[ int, int ], end: Tuple[ int, int ], rng: random.Random
+) -> Iterator[ Tuple[ int, int ] ]:
+    
+    for x, y in tunnel_coordinates( start, end, rng ).T.tolist():
         yield x, y
 
-# procedural generation for dungeon maps
+# dig out any number of tunnels in one assignment. the coordinates are scattered into a
+# boolean mask first, writing the tile struct through a mask is several times faster than
+# writing it through the fancy index itself, and overlapping tunnels are only written once
+def carve_tunnels( dungeon: GameMap, tunnels: List[ np.ndarray ] ) -> None:
+
+    if not tunnels:
+
+        return
+
+    x, y = np.concatenate( tunnels, axis=1 )
+
+    carved = np.zeros( dungeon.tiles.shape, dtype=bool, order="F" )
+    carved[ x, y ] = True
+
+    # only dig through walls, so stairs and other walkable tiles are left alone
+    carved &= ~dungeon.tiles[ "walkable" ]
+
+    dungeon.tiles[ carved ] = tile_types.floor
+
+# procedural generation for dungeon maps. the player is not placed here, instead the
+# starting location is recorded on the map so that a floor can be generated ahead of time
+# (possibly on another thread) and handed over by GameWorld when the stairs are taken.
+# rooms and tunnels are drawn from "layout_rng" and monsters and items from "spawn_rng",
+# so the same seeds always produce the same floor and changing the spawn tables
+# never changes the layout. if "stats" is given it receives the number of rooms and the
+# seconds spent in each stage ( "rooms_time", "tunnels_time", "entities_time" ).
+# with "batch_corridors" every tunnel on the floor is carved in one assignment at the end,
+# otherwise each tunnel is carved as soon as its room is accepted
 def generate_dungeon(
     max_rooms: int,
     room_min_size: int,
     room_max_size: int,
     map_width: int,
     map_height: int,
-    engine: Engine
+    engine: Engine,
+    floor_number: int,
+    layout_rng: random.Random,
+    spawn_rng: random.Random,
+    stats: Optional[ Dict[ str, float ] ] = None,
+    batch_corridors: bool = True
 ) -> GameMap:
     
-    # grab the player from the engine
-    player = engine.player
-    
+    # time spent in each stage of generation
+    rooms_time = tunnels_time = entities_time = 0.0
+
     # initialize empty game map
-    dungeon = GameMap( engine, map_width, map_height, entities=[ player ] )
+    dungeon = GameMap( engine, map_width, map_height )
 
     # initialize a container for generated rooms
     rooms: List[ RectangularRoom ] = []
 
+    # tunnel coordinates waiting to be carved
+    tunnels: List[ np.ndarray ] = []
+
     #
     center_of_last_room = (0, 0)
 
     # step through each possible room
     for r in range( max_rooms ):
 
+        stage_start = time.perf_counter()
+
         # generate room dimensions
-        room_width = random.randint( room_min_size, room_max_size )
-        room_height = random.randint( room_min_size, room_max_size )
+        room_width = layout_rng.randint( room_min_size, room_max_size )
+        room_height = layout_rng.randint( room_min_size, room_max_size )
 
         # generate room location
-        x = random.randint( 0, dungeon.width - room_width - 1 )
-        y = random.randint( 0, dungeon.height - room_height - 1 )
+        x = layout_rng.randint( 0, dungeon.width - room_width - 1 )
+        y = layout_rng.randint( 0, dungeon.height - room_height - 1 )
 
         # RectangularRoom class makes rectangles easier to work with
         new_room = RectangularRoom( x, y, room_width, room_height )
@@ -213,36 +287,526 @@ def generate_dungeon(
         # run through the other rooms and see if they intersect with this one
         if any( new_room.intersects( other_room ) for other_room in rooms ):
 
+            rooms_time += time.perf_counter() - stage_start
+
             continue # if this room intersects, go to the next attempt
 
         # if there are no intersections then this room is valid
         # dig out the inner area of the current room
         dungeon.tiles[ new_room.inner ] = tile_types.floor
 
+        stage_end = time.perf_counter()
+        rooms_time += stage_end - stage_start
+        stage_start = stage_end
+
         # if this is the first room, where the player starts...
         if len( rooms ) == 0:
 
-            player.place( *new_room.center, dungeon )
+            dungeon.player_start_location = new_room.center
 
         else: # all rooms after the first room
 
             # dig out a tunnel between this room and the previous one
-            for x, y in tunnel_between( rooms[ -1 ].center, new_room.center ):
+            tunnels.append(
+                tunnel_coordinates( rooms[ -1 ].center, new_room.center, layout_rng )
+            )
+            if not batch_corridors:
 
-                dungeon.tiles[ x, y ] = tile_types.floor
+                carve_tunnels( dungeon, tunnels )
+                tunnels.clear()
 
             #
             center_of_last_room = new_room.center
 
+        stage_end = time.perf_counter()
+        tunnels_time += stage_end - stage_start
+        stage_start = stage_end
+
         # populate the room with enemies
-        place_entities( new_room, dungeon, engine.game_world.current_floor )
+        place_entities( new_room, dungeon, floor_number, spawn_rng )
 
-        #
-        dungeon.tiles[ center_of_last_room ] = tile_types.down_stairs
-        dungeon.downstairs_location = center_of_last_room
+        entities_time += time.perf_counter() - stage_start
 
         # finally, append the new room to the list
         rooms.append( new_room )
 
+    stage_start = time.perf_counter()
+
+    carve_tunnels( dungeon, tunnels )
+
+    tunnels_time += time.perf_counter() - stage_start
+
+    # the stairs go in the center of the last room, after every tunnel has been dug
+    dungeon.tiles[ center_of_last_room ] = tile_types.down_stairs
+    dungeon.downstairs_location = center_of_last_room
+
+    if stats is not None:
+
+        stats[ "rooms" ] = len( rooms )
+        stats[ "rooms_time" ] = rooms_time
+        stats[ "tunnels_time" ] = tunnels_time
+        stats[ "entities_time" ] = entities_time
+
     # return the generated map
-    return dungeon
\ No newline at end of file
+    return dungeon
+
+# walkable tiles per group of monsters and items on cave floors, roughly the inner area
+# of a room from generate_dungeon
+CAVE_TILES_PER_GROUP = 64
+
+# groups on one cave floor at most, a design limit rather than a shortcut. the standard
+# map has a few dozen and never reaches it, far larger maps are spread thinner. every
+# monster on the floor takes a turn every turn, so density has to give way on huge maps:
+# a full 1000x1000 cave holds about 26,000 entities and spends over 200ms on each enemy
+# turn, at this limit about 2,500 and 5ms. rooms floors are bounded by max_rooms instead
+MAX_CAVE_GROUPS = 1000
+
+# return the number of blocked neighbors of every tile, tiles outside the map count as
+# blocked. the eight shifted views of the padded grid are summed as whole arrays
+def count_neighbors( blocked: np.ndarray ) -> np.ndarray:
+
+    padded = np.pad( blocked, 1, constant_values=True ).astype( np.uint8 )
+
+    width, height = blocked.shape
+
+    count = np.zeros( blocked.shape, dtype=np.uint8, order="F" )
+
+    for dx in ( 0, 1, 2 ):
+
+        for dy in ( 0, 1, 2 ):
+
+            if dx != 1 or dy != 1:
+
+                count += padded[ dx : dx + width, dy : dy + height ]
+
+    return count
+
+# cave-style floors grown with a cellular automaton. the map starts as random noise and
+# every step turns a tile into wall if at least five of the nine tiles around it
+# ( itself included ) are walls. only the largest cave is kept, the player starts on a
+# random tile of it and the stairs go on the tile farthest from the player. accepts the
+# same arguments as generate_dungeon so GameWorld can pick either one, room sizes are
+# not used
+def generate_caves(
+    max_rooms: int,
+    room_min_size: int,
+    room_max_size: int,
+    map_width: int,
+    map_height: int,
+    engine: Engine,
+    floor_number: int,
+    layout_rng: random.Random,
+    spawn_rng: random.Random,
+    stats: Optional[ Dict[ str, float ] ] = None,
+    wall_chance: float = 0.45,
+    smoothing_steps: int = 4
+) -> GameMap:
+
+    stage_start = time.perf_counter()
+
+    dungeon = GameMap( engine, map_width, map_height )
+
+    noise = np.random.default_rng( layout_rng.getrandbits( 64 ) )
+
+    blocked = noise.random( ( map_width, map_height ) ) < wall_chance
+
+    for _ in range( smoothing_steps ):
+
+        blocked = ( count_neighbors( blocked ) + blocked ) >= 5
+
+    # the outer edge is always wall
+    blocked[ [ 0, -1 ], : ] = True
+    blocked[ :, [ 0, -1 ] ] = True
+
+    # keep the largest cave and fill in the others
+    labels, regions = label_regions( ~blocked )
+
+    if regions == 0:
+
+        # nothing survived the smoothing, open up the center so the floor is playable
+        labels[ map_width // 2, map_height // 2 ] = 0
+
+    largest = np.argmax( np.bincount( labels[ labels >= 0 ] ) )
+    cave = labels == largest
+
+    dungeon.tiles[ cave ] = tile_types.floor
+
+    cave_x, cave_y = np.nonzero( cave )
+
+    start = layout_rng.randrange( cave_x.size )
+    dungeon.player_start_location = int( cave_x[ start ] ), int( cave_y[ start ] )
+
+    farthest = np.argmax( ( cave_x - cave_x[ start ] ) ** 2 + ( cave_y - cave_y[ start ] ) ** 2 )
+    dungeon.downstairs_location = int( cave_x[ farthest ] ), int( cave_y[ farthest ] )
+    dungeon.tiles[ dungeon.downstairs_location ] = tile_types.down_stairs
+
+    layout_time = time.perf_counter() - stage_start
+    stage_start = time.perf_counter()
+
+    # spread groups of monsters and items over the whole cave
+    occupied: Set[ Tuple[ int, int ] ] = set()
+
+    def random_position() -> Tuple[ int, int ]:
+
+        i = spawn_rng.randrange( cave_x.size )
+
+        return int( cave_x[ i ] ), int( cave_y[ i ] )
+
+    for _ in range( min( max( 1, cave_x.size // CAVE_TILES_PER_GROUP ), MAX_CAVE_GROUPS ) ):
+
+        spawn_group( dungeon, floor_number, spawn_rng, random_position, occupied )
+
+    if stats is not None:
+
+        stats[ "rooms" ] = 0
+        stats[ "rooms_time" ] = layout_time
+        stats[ "tunnels_time" ] = 0.0
+        stats[ "entities_time" ] = time.perf_counter() - stage_start
+
+    return dungeon
+
+# floors built by binary space partitioning. the map is split in two along its longer
+# side, at a random point, until every part is at most twice the maximum room size.
+# each part gets one room, and at every split a random room from one half is joined to a
+# random room from the other, so the floor is always connected. all rooms are dug
+# through one mask and all tunnels in one batch. accepts the same arguments as
+# generate_dungeon, the number of rooms follows from the map and room sizes so
+# "max_rooms" is not used
+def generate_bsp(
+    max_rooms: int,
+    room_min_size: int,
+    room_max_size: int,
+    map_width: int,
+    map_height: int,
+    engine: Engine,
+    floor_number: int,
+    layout_rng: random.Random,
+    spawn_rng: random.Random,
+    stats: Optional[ Dict[ str, float ] ] = None
+) -> GameMap:
+
+    stage_start = time.perf_counter()
+
+    dungeon = GameMap( engine, map_width, map_height )
+
+    rooms: List[ RectangularRoom ] = []
+    tunnels: List[ np.ndarray ] = []
+
+    # split a part of the map and return the rooms made inside of it, in order
+    def partition( x: int, y: int, width: int, height: int ) -> List[ RectangularRoom ]:
+
+        split_x = width > room_max_size * 2 and ( width >= height or height <= room_max_size * 2 )
+        split_y = not split_x and height > room_max_size * 2
+
+        if split_x or split_y:
+
+            if split_x:
+
+                cut = layout_rng.randint( room_max_size, width - room_max_size )
+
+                first = partition( x, y, cut, height )
+                second = partition( x + cut, y, width - cut, height )
+
+            else:
+
+                cut = layout_rng.randint( room_max_size, height - room_max_size )
+
+                first = partition( x, y, width, cut )
+                second = partition( x, y + cut, width, height - cut )
+
+            tunnels.append( tunnel_coordinates(
+                layout_rng.choice( first ).center, layout_rng.choice( second ).center, layout_rng
+            ) )
+            return first + second
+
+        # a leaf, leave at least one tile of wall towards the next part
+        room_width = layout_rng.randint(
+            min( room_min_size, width - 1 ), min( room_max_size, width - 1 )
+        )
+        room_height = layout_rng.randint(
+            min( room_min_size, height - 1 ), min( room_max_size, height - 1 )
+        )
+        room = RectangularRoom(
+            layout_rng.randint( x, x + width - 1 - room_width ),
+            layout_rng.randint( y, y + height - 1 - room_height ),
+            room_width,
+            room_height
+        )
+        rooms.append( room )
+
+        return [ room ]
+
+    partition( 0, 0, map_width, map_height )
+
+    dug = np.zeros( ( map_width, map_height ), dtype=bool, order="F" )
+
+    for room in rooms:
+
+        dug[ room.inner ] = True
+
+    dungeon.tiles[ dug ] = tile_types.floor
+
+    rooms_time = time.perf_counter() - stage_start
+    stage_start = time.perf_counter()
+
+    carve_tunnels( dungeon, tunnels )
+
+    # the first and last rooms come from opposite corners of the partition
+    dungeon.player_start_location = rooms[ 0 ].center
+    dungeon.downstairs_location = rooms[ -1 ].center
+    dungeon.tiles[ dungeon.downstairs_location ] = tile_types.down_stairs
+
+    tunnels_time = time.perf_counter() - stage_start
+    stage_start = time.perf_counter()
+
+    for room in rooms:
+
+        place_entities( room, dungeon, floor_number, spawn_rng )
+
+    if stats is not None:
+
+        stats[ "rooms" ] = len( rooms )
+        stats[ "rooms_time" ] = rooms_time
+        stats[ "tunnels_time" ] = tunnels_time
+        stats[ "entities_time" ] = time.perf_counter() - stage_start
+
+    return dungeon
+
+# the generators GameWorld can choose from, they all take the same arguments and return
+# a GameMap with the player's start and the stairs filled in
+generators: Dict[ str, Callable[ ..., GameMap ] ] = {
+    "rooms": generate_dungeon,
+    "caves": generate_caves,
+    "bsp": generate_bsp
+}
+
+# weighted chances of each generator, by floor, in the same form as the spawn tables
+generator_chances: Dict[ int, List[ Tuple[ str, int ] ] ] = {
+    0: [ ( "rooms", 100 ) ],
+    3: [ ( "bsp", 40 ) ],
+    5: [ ( "caves", 40 ) ]
+}
+
+# pick the name of the generator used for a floor
+def choose_generator(
+    chances: Dict[ int, List[ Tuple[ str, int ] ] ], floor: int, rng: random.Random
+) -> str:
+
+    return get_entities_at_random( chances, 1, floor, rng )[ 0 ] # type: ignore
+
+# return a boolean array of the walkable tiles that can be reached from "start",
+# moving in all eight directions like actors do. the flood fill runs in tcod's
+# dijkstra implementation, so it is cheap even for very large maps
+def reachable_from( walkable: np.ndarray, start: Tuple[ int, int ] ) -> np.ndarray:
+
+    distance = tcod.path.maxarray( walkable.shape, dtype=np.int32, order="F" )
+    distance[ start ] = 0
+
+    tcod.path.dijkstra2d( distance, walkable, cardinal=1, diagonal=1, out=distance )
+
+    return distance != np.iinfo( np.int32 ).max
+
+# label the connected regions of walkable tiles, moving in all eight directions.
+# returns an array holding the region of every tile ( -1 for blocked tiles ) and the
+# number of regions. tiles are first grouped into horizontal runs, which are connected
+# for free, and only the first overlap between two runs ( or a diagonal corner touch ) is
+# kept as an edge. the runs are then joined with a vectorized union-find: every pass hooks
+# the root of each edge's larger end onto the smaller one and compresses the trees
+# completely, which converges in a handful of whole-array passes
+def label_regions( walkable: np.ndarray ) -> Tuple[ np.ndarray, int ]:
+
+    # number every horizontal run of walkable tiles
+    run_starts = walkable.copy( order="F" )
+    run_starts[ 1:, : ] &= ~walkable[ :-1, : ]
+
+    run_id = np.cumsum( run_starts.ravel( order="F" ), dtype=np.int32 ) - 1
+    run_id = run_id.reshape( walkable.shape, order="F" )
+    runs = int( np.count_nonzero( run_starts ) )
+
+    if runs == 0:
+
+        return np.full( walkable.shape, -1, dtype=np.int32, order="F" ), 0
+
+    # runs in neighboring rows touch where tiles are stacked vertically,
+    # one edge per stretch of stacked tiles is enough
+    stacked = walkable[ :, :-1 ] & walkable[ :, 1: ]
+    first_stacked = stacked.copy( order="F" )
+    first_stacked[ 1:, : ] &= ~stacked[ :-1, : ]
+
+    # diagonal neighbors only matter when both tiles between them are blocked
+    diagonal = walkable[ :-1, :-1 ] & walkable[ 1:, 1: ] & ~walkable[ 1:, :-1 ] & ~walkable[ :-1, 1: ]
+    anti_diagonal = walkable[ 1:, :-1 ] & walkable[ :-1, 1: ] & ~walkable[ :-1, :-1 ] & ~walkable[ 1:, 1: ]
+
+    u = np.concatenate( (
+        run_id[ :, :-1 ][ first_stacked ],
+        run_id[ :-1, :-1 ][ diagonal ],
+        run_id[ 1:, :-1 ][ anti_diagonal ]
+    ) )
+    v = np.concatenate( (
+        run_id[ :, 1: ][ first_stacked ],
+        run_id[ 1:, 1: ][ diagonal ],
+        run_id[ :-1, 1: ][ anti_diagonal ]
+    ) )
+
+    parent = np.arange( runs, dtype=np.int32 )
+
+    while u.size:
+
+        root_u = parent[ u ]
+        root_v = parent[ v ]
+
+        # edges inside a single tree are finished for good
+        split = root_u != root_v
+        u, v, root_u, root_v = u[ split ], v[ split ], root_u[ split ], root_v[ split ]
+
+        if not u.size:
+
+            break
+
+        # always point at the smaller index, so no cycles can form
+        parent[ np.maximum( root_u, root_v ) ] = np.minimum( root_u, root_v )
+
+        while True:
+
+            grandparent = parent[ parent ]
+
+            if np.array_equal( grandparent, parent ):
+
+                break
+
+            parent = grandparent
+
+    # number the roots 0, 1, 2, ... in index order
+    is_root = parent == np.arange( runs, dtype=np.int32 )
+    root_label = np.cumsum( is_root, dtype=np.int32 ) - 1
+
+    labels = np.where( walkable, root_label[ parent ][ run_id ], -1 )
+
+    return labels, int( is_root.sum() )
+
+# how well the walkable tiles of a floor are connected to the player's starting location,
+# counts describe the floor before any repair was made
+class ConnectivityReport:
+
+    def __init__(
+        self,
+        regions: int,
+        unreachable_tiles: int,
+        unreachable_entities: int,
+        stairs_reachable: bool,
+        tunnels_added: int = 0,
+        tiles_filled: int = 0
+    ):
+        self.regions = regions
+        self.unreachable_tiles = unreachable_tiles
+        self.unreachable_entities = unreachable_entities
+        self.stairs_reachable = stairs_reachable
+        self.tunnels_added = tunnels_added
+        self.tiles_filled = tiles_filled
+
+    # true if every walkable tile could be reached from the start
+    @property
+    def connected( self ) -> bool:
+
+        return self.unreachable_tiles == 0
+
+    def __repr__( self ) -> str:
+
+        return (
+            f"ConnectivityReport(regions={ self.regions }, "
+            f"unreachable_tiles={ self.unreachable_tiles }, "
+            f"unreachable_entities={ self.unreachable_entities }, "
+            f"stairs_reachable={ self.stairs_reachable }, "
+            f"tunnels_added={ self.tunnels_added }, tiles_filled={ self.tiles_filled })"
+        )
+
+# build a report from the region labels of a floor
+def _connectivity_report( dungeon: GameMap, labels: np.ndarray, regions: int ) -> ConnectivityReport:
+
+    reachable = labels == labels[ dungeon.player_start_location ]
+
+    return ConnectivityReport(
+        regions=regions,
+        unreachable_tiles=int( np.count_nonzero( labels >= 0 ) - np.count_nonzero( reachable ) ),
+        unreachable_entities=sum( not reachable[ e.x, e.y ] for e in dungeon.entities ),
+        stairs_reachable=bool( reachable[ dungeon.downstairs_location ] )
+    )
+
+# report on the connectivity of a floor without changing it
+def check_connectivity( dungeon: GameMap ) -> ConnectivityReport:
+
+    labels, regions = label_regions( dungeon.tiles[ "walkable" ] )
+
+    return _connectivity_report( dungeon, labels, regions )
+
+# make every walkable tile of a floor reachable from the player's starting location.
+# regions smaller than "min_region_size" are filled in with walls ( along with anything
+# standing in them ) unless they hold the stairs. every other region is joined to the
+# reachable area by a tunnel from its closest tile: one dijkstra pass measures the
+# distance from the reachable area to every tile, and each tunnel climbs down that field
+def repair_connectivity( dungeon: GameMap, min_region_size: int = 1 ) -> ConnectivityReport:
+
+    labels, regions = label_regions( dungeon.tiles[ "walkable" ] )
+
+    report = _connectivity_report( dungeon, labels, regions )
+
+    if report.connected:
+
+        return report
+
+    start_label = labels[ dungeon.player_start_location ]
+
+    # fill in the regions which are too small to be worth connecting
+    sizes = np.bincount( labels[ labels >= 0 ], minlength=regions )
+    too_small = sizes < min_region_size
+    too_small[ start_label ] = False
+
+    if labels[ dungeon.downstairs_location ] >= 0:
+
+        too_small[ labels[ dungeon.downstairs_location ] ] = False
+
+    if too_small.any():
+
+        filled = ( labels >= 0 ) & too_small[ labels ]
+
+        dungeon.tiles[ filled ] = tile_types.wall
+        labels[ filled ] = -1
+        report.tiles_filled = int( np.count_nonzero( filled ) )
+
+        dungeon.entities = {
+            e for e in dungeon.entities if not filled[ e.x, e.y ]
+        }
+
+    # tiles of the regions that still have to be connected
+    disconnected = ( labels >= 0 ) & ( labels != start_label )
+
+    if not disconnected.any():
+
+        return report
+
+    # distance from the reachable area to every tile, walls included. tunnels only
+    # move cardinally so they look like the ones between rooms
+    distance = tcod.path.maxarray( labels.shape, dtype=np.int32, order="F" )
+    distance[ labels == start_label ] = 0
+
+    tcod.path.dijkstra2d(
+        distance, np.ones( labels.shape, dtype=np.int8 ), cardinal=1, diagonal=None, out=distance
+    )
+
+    # the closest tile of every region, found by sorting on ( region, distance )
+    index = np.flatnonzero( disconnected.ravel( order="F" ) )
+    region_of = labels.ravel( order="F" )[ index ]
+    order = np.lexsort( ( distance.ravel( order="F" )[ index ], region_of ) )
+    _, first = np.unique( region_of[ order ], return_index=True )
+
+    sources = np.unravel_index( index[ order[ first ] ], labels.shape, order="F" )
+
+    tunnels = [
+        tcod.path.hillclimb2d( distance, ( x, y ), cardinal=True, diagonal=False ).T
+        for x, y in zip( *sources )
+    ]
+    carve_tunnels( dungeon, tunnels )
+
+    report.tunnels_added = len( tunnels )
+
+    return report
\ No newline at end of file
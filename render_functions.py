@@ -4,6 +4,7 @@ from __future__ import annotations
 from typing import Tuple, TYPE_CHECKING
 
 import color
+import instrumentation # type: ignore
 
 if TYPE_CHECKING:
     from tcod import console
@@ -61,4 +62,32 @@ def render_names_at_mouse_location(
         x=mouse_x, y=mouse_y, game_map=engine.game_map
     )
     #console.print( x=x, y=y, string=names_at_mouse_location )
-    console.print(x=x, y=y, string=names_at_mouse_location)
\ No newline at end of file
+    console.print(x=x, y=y, string=names_at_mouse_location)
+
+# draw frame time, turn time and the slowest phases in the top right corner
+def render_performance_overlay( console: Console ) -> None:
+
+    width = 30
+    x = console.width - width
+
+    frame_mean, frame_max, _ = instrumentation.stats( "frame" )
+    turn_mean, turn_max, turn_last = instrumentation.stats( "turn" )
+
+    lines = [
+        f"frame {frame_mean * 1000:6.2f}ms max {frame_max * 1000:6.2f}",
+        f"turn  {turn_mean * 1000:6.2f}ms max {turn_max * 1000:6.2f}",
+        f"last turn {turn_last * 1000:6.2f}ms  #{instrumentation.counter( 'turns' )}",
+        f"ai fallbacks {instrumentation.counter( 'ai.fallback' )}"
+    ]
+    lines += [
+        f"  {name:<8} {mean * 1000:6.2f}ms" for name, mean in instrumentation.top_phases( 3 )
+    ]
+
+    console.draw_rect(
+        x=x, y=0, width=width, height=len( lines ) + 2, ch=ord( " " ), bg=color.black
+    )
+    console.draw_frame( x=x, y=0, width=width, height=len( lines ) + 2, title="F3" )
+
+    for i, line in enumerate( lines ):
+
+        console.print( x=x + 1, y=1 + i, string=line, fg=color.white )
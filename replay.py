@@ -0,0 +1,251 @@
+# record the input of a session so it can be played back exactly, to reproduce and
+# profile a slow session.
+#
+# a recording holds the seed used for new games, a copy of the save and journal the
+# session could continue from, and every event the event handlers react to, grouped into
+# the frames they arrived in. each frame also records how long its events took to handle
+# when it was recorded, so playback can be compared with the original.
+#
+# header: magic ( 8 bytes ) | version ( u16 ) | seed ( u64 ) | file count ( u16 )
+# file: name length ( u16 ) | data length ( u32 ) | name | data
+# then records, each a type ( u8 ) followed by its fields
+from __future__ import annotations
+
+import glob
+import os
+import struct
+from typing import BinaryIO, List, Tuple
+
+import tcod.event
+
+import exceptions # type: ignore
+
+MAGIC = b"RLDRPLY\x00"
+
+VERSION = 1
+
+HEADER = struct.Struct( "<8sHQH" )
+FILE_HEADER = struct.Struct( "<HI" )
+
+RECORD_TYPE = struct.Struct( "<B" )
+
+# end of a frame, microseconds spent handling its events when recorded
+RECORD_FRAME = 0
+FRAME_RECORD = struct.Struct( "<I" )
+
+# scancode, sym, mod
+RECORD_KEY_DOWN = 1
+KEY_DOWN_RECORD = struct.Struct( "<iiH" )
+
+# tile x, y
+RECORD_MOUSE_MOTION = 2
+MOUSE_MOTION_RECORD = struct.Struct( "<hh" )
+
+# tile x, y, button
+RECORD_MOUSE_BUTTON_DOWN = 3
+MOUSE_BUTTON_DOWN_RECORD = struct.Struct( "<hhB" )
+
+RECORD_QUIT = 4
+
+# the events of one frame and the microseconds they took when recorded
+Frame = Tuple[ int, List[ tcod.event.Event ] ]
+
+# the files a session can continue from
+def session_files( save_filename: str ) -> List[ str ]:
+
+    return sorted(
+        filename for filename in [ save_filename ] + glob.glob( glob.escape( save_filename ) + ".journal-*" )
+        if os.path.isfile( filename )
+    )
+
+class Recorder:
+
+    def __init__( self, filename: str, seed: int, save_filename: str ):
+
+        self._file: BinaryIO = open( filename, "wb" )
+
+        files = session_files( save_filename )
+
+        self._file.write( HEADER.pack( MAGIC, VERSION, seed, len( files ) ) )
+
+        for name in files:
+
+            with open( name, "rb" ) as f:
+
+                data = f.read()
+
+            # stored relative to the save, so playback can put them anywhere
+            encoded_name = os.path.basename( name ).replace(
+                os.path.basename( save_filename ), "", 1
+            ).encode()
+
+            self._file.write( FILE_HEADER.pack( len( encoded_name ), len( data ) ) )
+            self._file.write( encoded_name + data )
+
+    # record an event after context.convert_event, events the handlers ignore are skipped
+    def record( self, event: tcod.event.Event ) -> None:
+
+        if isinstance( event, tcod.event.KeyDown ):
+
+            self._file.write(
+                RECORD_TYPE.pack( RECORD_KEY_DOWN )
+                + KEY_DOWN_RECORD.pack( event.scancode, event.sym, event.mod )
+            )
+
+        elif isinstance( event, tcod.event.MouseMotion ):
+
+            self._file.write(
+                RECORD_TYPE.pack( RECORD_MOUSE_MOTION )
+                + MOUSE_MOTION_RECORD.pack( int( event.tile.x ), int( event.tile.y ) )
+            )
+
+        elif isinstance( event, tcod.event.MouseButtonDown ):
+
+            self._file.write(
+                RECORD_TYPE.pack( RECORD_MOUSE_BUTTON_DOWN )
+                + MOUSE_BUTTON_DOWN_RECORD.pack(
+                    int( event.tile.x ), int( event.tile.y ), event.button
+                )
+            )
+
+        elif isinstance( event, tcod.event.Quit ):
+
+            self._file.write( RECORD_TYPE.pack( RECORD_QUIT ) )
+
+    # close the frame, "seconds" is how long its events took to handle
+    def end_frame( self, seconds: float ) -> None:
+
+        self._file.write(
+            RECORD_TYPE.pack( RECORD_FRAME )
+            + FRAME_RECORD.pack( min( int( seconds * 1e6 ), 0xFFFFFFFF ) )
+        )
+
+    def close( self ) -> None:
+
+        self._file.close()
+
+class Recording:
+
+    def __init__( self, seed: int, files: List[ Tuple[ str, bytes ] ], frames: List[ Frame ] ):
+
+        # the seed new games were started with
+        self.seed = seed
+
+        # the save and journal segments, named relative to the save
+        self.files = files
+
+        self.frames = frames
+
+    @classmethod
+    def load( cls, filename: str ) -> Recording:
+
+        with open( filename, "rb" ) as f:
+
+            data = f.read()
+
+        if len( data ) < HEADER.size:
+
+            raise exceptions.RecordingError( "Not a recording." )
+
+        magic, version, seed, file_count = HEADER.unpack_from( data )
+
+        if magic != MAGIC:
+
+            raise exceptions.RecordingError( "Not a recording." )
+
+        if version > VERSION:
+
+            raise exceptions.RecordingError( f"Recording version { version } is too new." )
+
+        position = HEADER.size
+        files = []
+
+        for _ in range( file_count ):
+
+            name_length, data_length = FILE_HEADER.unpack_from( data, position )
+            position += FILE_HEADER.size
+
+            name = data[ position : position + name_length ].decode()
+            position += name_length
+
+            files.append( ( name, data[ position : position + data_length ] ) )
+            position += data_length
+
+        frames: List[ Frame ] = []
+        events: List[ tcod.event.Event ] = []
+
+        # a frame cut short, by a crash for instance, is dropped
+        while position + RECORD_TYPE.size <= len( data ):
+
+            record_type, = RECORD_TYPE.unpack_from( data, position )
+            position += RECORD_TYPE.size
+
+            try:
+
+                if record_type == RECORD_FRAME:
+
+                    microseconds, = FRAME_RECORD.unpack_from( data, position )
+                    position += FRAME_RECORD.size
+
+                    frames.append( ( microseconds, events ) )
+                    events = []
+
+                elif record_type == RECORD_KEY_DOWN:
+
+                    scancode, sym, mod = KEY_DOWN_RECORD.unpack_from( data, position )
+                    position += KEY_DOWN_RECORD.size
+
+                    events.append(
+                        tcod.event.KeyDown( scancode, tcod.event.KeySym( sym ), tcod.event.Modifier( mod ) )
+                    )
+
+                elif record_type == RECORD_MOUSE_MOTION:
+
+                    x, y = MOUSE_MOTION_RECORD.unpack_from( data, position )
+                    position += MOUSE_MOTION_RECORD.size
+
+                    events.append( tcod.event.MouseMotion( tile=( x, y ) ) )
+
+                elif record_type == RECORD_MOUSE_BUTTON_DOWN:
+
+                    x, y, button = MOUSE_BUTTON_DOWN_RECORD.unpack_from( data, position )
+                    position += MOUSE_BUTTON_DOWN_RECORD.size
+
+                    events.append( tcod.event.MouseButtonDown( tile=( x, y ), button=button ) )
+
+                elif record_type == RECORD_QUIT:
+
+                    events.append( tcod.event.Quit() )
+
+                else:
+
+                    raise exceptions.RecordingError( f"Unknown record type { record_type }." )
+
+            except struct.error:
+
+                break
+
+        return cls( seed, files, frames )
+
+    # write the save and journal into "directory" and return the save's filename
+    def extract( self, directory: str, save_name: str = "savegame.sav" ) -> str:
+
+        save_filename = os.path.join( directory, save_name )
+
+        for name, data in self.files:
+
+            with open( save_filename + name, "wb" ) as f:
+
+                f.write( data )
+
+        return save_filename
+
+    @property
+    def events( self ) -> int:
+
+        return sum( len( events ) for _, events in self.frames )
+
+# the "count" slowest frames as ( frame index, seconds ) pairs, slowest first
+def slowest_frames( timings: List[ float ], count: int = 5 ) -> List[ Tuple[ int, float ] ]:
+
+    return sorted( enumerate( timings ), key=lambda item: item[ 1 ], reverse=True )[ :count ]
@@ -0,0 +1,912 @@
+# versioned, columnar save files.
+#
+# a save file is a small fixed header, a json header and a compressed body:
+#
+#   magic ( 8 bytes ) | format version ( u16 ) | json header length ( u32 ) | json header | body
+#
+# the json header is never compressed, it holds the codec, a checksum of the body and a
+# summary of the game ( floor, player stats, time saved ) that can be read on its own.
+#
+# the body is a set of named numpy arrays, a json table of their names, dtypes and shapes
+# followed by the raw contents of each array in table order:
+#
+#   table length ( u32 ) | json table | array data ...
+#
+# the map is kept as raw arrays ( tiles are stored as a palette of distinct tiles plus an
+# index array ), entities and their components as one array per column, and the message
+# log in its own section. nothing in the file is pickled, so loading a save never runs
+# arbitrary code and renaming a class doesn't break old saves
+from __future__ import annotations
+
+import json
+import lzma
+import math
+import os
+import random
+import struct
+import time
+import zlib
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+import components.ai # type: ignore
+from components import consumable, equippable # type: ignore
+from components.equipment import Equipment # type: ignore
+from components.fighter import Fighter # type: ignore
+from components.inventory import Inventory # type: ignore
+from components.level import Level # type: ignore
+from engine import Engine # type: ignore
+from entity import Actor, Entity, Item # type: ignore
+from equipment_types import EquipmentType # type: ignore
+import exceptions # type: ignore
+from game_map import GameMap, GameWorld # type: ignore
+from message_log import Message # type: ignore
+from render_order import RenderOrder # type: ignore
+
+MAGIC = b"RLDSAVE\x00"
+
+# bumped whenever the layout of the file changes, older versions are still readable
+FORMAT_VERSION = 4
+
+# magic, format version, json header length
+PREFIX = struct.Struct( "<8sHI" )
+
+# entity kinds stored in the "entities.kind" column
+KIND_ENTITY = 0
+KIND_ACTOR = 1
+KIND_ITEM = 2
+
+# GameWorld constructor arguments stored in the save
+WORLD_FIELDS = (
+    "map_width",
+    "map_height",
+    "max_rooms",
+    "room_min_size",
+    "room_max_size",
+    "current_floor",
+    "seed",
+    "reject_disconnected_floors",
+    "max_generation_attempts",
+    "min_region_size",
+    "generator_chances",
+    "floor_memory_budget"
+)
+
+# a snapshot is everything needed to write a save, as plain arrays
+Snapshot = Dict[ str, np.ndarray ]
+
+# return true if the file starts with the save format's magic bytes
+def is_save_file( filename: str ) -> bool:
+
+    with open( filename, "rb" ) as f:
+
+        return f.read( len( MAGIC ) ) == MAGIC
+
+# store a list of strings as one utf-8 buffer and the offsets into it
+def _pack_strings( snapshot: Snapshot, name: str, strings: List[ str ] ) -> None:
+
+    encoded = [ s.encode( "utf-8" ) for s in strings ]
+
+    snapshot[ f"{ name }.data" ] = np.frombuffer( b"".join( encoded ), dtype=np.uint8 )
+    snapshot[ f"{ name }.offsets" ] = np.cumsum(
+        [ 0 ] + [ len( s ) for s in encoded ], dtype=np.int64
+    )
+
+def _unpack_strings( snapshot: Snapshot, name: str ) -> List[ str ]:
+
+    data = snapshot[ f"{ name }.data" ].tobytes()
+    offsets = snapshot[ f"{ name }.offsets" ].tolist()
+
+    return [
+        data[ start:end ].decode( "utf-8" ) for start, end in zip( offsets, offsets[ 1: ] )
+    ]
+
+# store any json-compatible value as a byte array
+def pack_json( snapshot: Snapshot, name: str, value: Any ) -> None:
+
+    snapshot[ name ] = np.frombuffer( json.dumps( value ).encode( "utf-8" ), dtype=np.uint8 )
+
+def unpack_json( snapshot: Snapshot, name: str ) -> Any:
+
+    return json.loads( snapshot[ name ].tobytes().decode( "utf-8" ) )
+
+# the state of a random.Random as an array, and back
+def _pack_rng( rng: random.Random ) -> np.ndarray:
+
+    version, internal_state, gauss_next = rng.getstate()
+
+    return np.array( internal_state, dtype=np.uint32 )
+
+def _unpack_rng( state: np.ndarray ) -> random.Random:
+
+    rng = random.Random()
+    rng.setstate( ( 3, tuple( state.tolist() ), None ) )
+
+    return rng
+
+# split a tile array into the distinct tiles it holds and an index into them. maps only use
+# a handful of tiles, so comparing against each distinct tile is much cheaper than sorting
+def palettize( tiles: np.ndarray ) -> Tuple[ np.ndarray, np.ndarray ]:
+
+    flat = tiles.ravel( order="F" )
+    raw = flat.view( np.dtype( ( np.void, flat.dtype.itemsize ) ) )
+
+    index = np.zeros( raw.shape, dtype=np.uint8 )
+    remaining = np.ones( raw.shape, dtype=bool )
+    palette: List[ int ] = []
+
+    position = 0
+
+    while remaining[ position: ].any():
+
+        if len( palette ) == 256:
+
+            # too many distinct tiles to index with a byte
+            unique, index = np.unique( raw, return_inverse=True )
+
+            return unique.view( tiles.dtype ), index.astype( np.uint32 )
+
+        position += int( np.argmax( remaining[ position: ] ) )
+
+        matches = raw == raw[ position ]
+        index[ matches ] = len( palette )
+        remaining &= ~matches
+
+        palette.append( position )
+
+    return flat[ palette ], index
+
+# the plain attributes of an ai, with the previous ai of a confused enemy stored inline
+def _encode_ai( ai: Optional[ components.ai.BaseAI ] ) -> Optional[ dict ]:
+
+    if ai is None:
+
+        return None
+
+    state = { "type": type( ai ).__name__ }
+
+    for key, value in vars( ai ).items():
+
+        if key == "entity":
+
+            continue
+
+        if isinstance( value, components.ai.BaseAI ) or ( key == "previous_ai" and value is None ):
+
+            value = _encode_ai( value )
+
+        state[ key ] = value
+
+    return state
+
+def _decode_ai( state: Optional[ dict ], actor: Actor ) -> Optional[ components.ai.BaseAI ]:
+
+    if state is None:
+
+        return None
+
+    state = dict( state )
+
+    ai = object.__new__( getattr( components.ai, state.pop( "type" ) ) )
+    ai.entity = actor
+
+    for key, value in state.items():
+
+        if key == "previous_ai":
+
+            value = _decode_ai( value, actor )
+
+        elif key == "path":
+
+            value = [ tuple( step ) for step in value ]
+
+        setattr( ai, key, value )
+
+    return ai
+
+# consumables and equippables only hold plain numbers, plus the equipment type
+def _encode_item_component( component: Any ) -> Optional[ dict ]:
+
+    if component is None:
+
+        return None
+
+    state = { "type": type( component ).__name__ }
+
+    for key, value in vars( component ).items():
+
+        if key == "parent":
+
+            continue
+
+        if isinstance( value, EquipmentType ):
+
+            value = value.name
+
+        state[ key ] = value
+
+    return state
+
+def _decode_item_component( state: Optional[ dict ], module: Any, item: Item ) -> Any:
+
+    if state is None:
+
+        return None
+
+    state = dict( state )
+
+    component = object.__new__( getattr( module, state.pop( "type" ) ) )
+    component.parent = item
+
+    for key, value in state.items():
+
+        if key == "equipment_type":
+
+            value = EquipmentType[ value ]
+
+        setattr( component, key, value )
+
+    return component
+
+# order the entities of a map so that every item in an inventory comes after its owner
+# and in inventory order, and return them with the index of each one's owner ( -1 when
+# the entity is on the map itself )
+def _collect_entities( game_map: GameMap ) -> Tuple[ List[ Entity ], List[ int ] ]:
+
+    entities: List[ Entity ] = []
+    owners: List[ int ] = []
+
+    for entity in sorted( game_map.entities, key=lambda e: ( e.y, e.x, e.name ) ):
+
+        owner = len( entities )
+
+        entities.append( entity )
+        owners.append( -1 )
+
+        if isinstance( entity, Actor ):
+
+            for item in entity.inventory.items:
+
+                entities.append( item )
+                owners.append( owner )
+
+    return entities, owners
+
+# what the main menu shows about a save without loading it, kept in the file's header
+def summarize( engine: Engine ) -> Dict[ str, Any ]:
+
+    player = engine.player
+
+    return {
+        "dungeon_level": engine.game_world.current_floor,
+        "character_level": player.level.current_level,
+        "xp": player.level.current_xp,
+        "hp": player.fighter.hp,
+        "max_hp": player.fighter.max_hp,
+        "power": player.fighter.power,
+        "defense": player.fighter.defense,
+        "turn": engine.turn,
+        "journal_sequence": engine.journal.sequence if engine.journal is not None else None,
+        "saved_at": time.time()
+    }
+
+# add the state of one map, its entities and their components to a snapshot, with every
+# name starting with "prefix". tiles and explored are left out when "arrays" is false, for
+# floors that keep those in files of their own. returns the map's scalar state, which is
+# stored in the snapshot's meta section, and the index of each entity by id
+def snapshot_map(
+    game_map: GameMap, data: Snapshot, prefix: str = "", arrays: bool = True
+) -> Tuple[ Dict[ str, Any ], Dict[ int, int ] ]:
+
+    entities, owners = _collect_entities( game_map )
+    index = { id( entity ): i for i, entity in enumerate( entities ) }
+
+    # the map, tiles are reduced to the distinct tiles in use and an index into them
+    if arrays:
+
+        data[ prefix + "map.palette" ], data[ prefix + "map.tiles" ] = palettize( game_map.tiles )
+        data[ prefix + "map.explored" ] = game_map.explored.ravel( order="F" ).copy()
+
+    data[ prefix + "map.visible" ] = game_map.visible.ravel( order="F" ).copy()
+    data[ prefix + "map.ai_rng" ] = _pack_rng( game_map.ai_rng )
+
+    # entity columns
+    data[ prefix + "entities.kind" ] = np.array(
+        [
+            KIND_ACTOR if isinstance( e, Actor ) else KIND_ITEM if isinstance( e, Item ) else KIND_ENTITY
+            for e in entities
+        ],
+        dtype=np.uint8
+    )
+    data[ prefix + "entities.owner" ] = np.array( owners, dtype=np.int32 )
+    data[ prefix + "entities.x" ] = np.array( [ e.x for e in entities ], dtype=np.int32 )
+    data[ prefix + "entities.y" ] = np.array( [ e.y for e in entities ], dtype=np.int32 )
+    data[ prefix + "entities.color" ] = np.array(
+        [ e.color for e in entities ], dtype=np.uint8
+    ).reshape( -1, 3 )
+    data[ prefix + "entities.blocks_movement" ] = np.array(
+        [ e.blocks_movement for e in entities ], dtype=bool
+    )
+    data[ prefix + "entities.render_order" ] = np.array(
+        [ e.render_order.value for e in entities ], dtype=np.uint8
+    )
+    _pack_strings( data, prefix + "entities.char", [ e.char for e in entities ] )
+    _pack_strings( data, prefix + "entities.name", [ e.name for e in entities ] )
+
+    # component columns, one row per actor in entity order
+    actors = [ e for e in entities if isinstance( e, Actor ) ]
+
+    data[ prefix + "fighters" ] = np.array(
+        [
+            ( a.fighter.max_hp, a.fighter.hp, a.fighter.base_defense, a.fighter.base_power )
+            for a in actors
+        ],
+        dtype=np.int32
+    ).reshape( -1, 4 )
+    data[ prefix + "levels" ] = np.array(
+        [
+            (
+                a.level.current_level,
+                a.level.current_xp,
+                a.level.level_up_base,
+                a.level.level_up_factor,
+                a.level.xp_given
+            )
+            for a in actors
+        ],
+        dtype=np.int32
+    ).reshape( -1, 5 )
+    data[ prefix + "inventories" ] = np.array(
+        [ a.inventory.capacity for a in actors ], dtype=np.int32
+    )
+    data[ prefix + "equipment" ] = np.array(
+        [
+            (
+                index[ id( a.equipment.weapon ) ] if a.equipment.weapon else -1,
+                index[ id( a.equipment.armor ) ] if a.equipment.armor else -1
+            )
+            for a in actors
+        ],
+        dtype=np.int32
+    ).reshape( -1, 2 )
+    pack_json( data, prefix + "ais", [ _encode_ai( a.ai ) for a in actors ] )
+
+    # item components, one row per item in entity order
+    items = [ e for e in entities if isinstance( e, Item ) ]
+
+    pack_json(
+        data, prefix + "consumables", [ _encode_item_component( i.consumable ) for i in items ]
+    )
+    pack_json(
+        data, prefix + "equippables", [ _encode_item_component( i.equippable ) for i in items ]
+    )
+
+    map_state = {
+        "width": game_map.width,
+        "height": game_map.height,
+        "downstairs_location": game_map.downstairs_location,
+        "upstairs_location": game_map.upstairs_location,
+        "player_start_location": game_map.player_start_location
+    }
+    return map_state, index
+
+# capture the state of an engine as a set of arrays. this is the only part of saving that
+# touches live game objects, the result can be encoded and written from another thread
+def snapshot( engine: Engine ) -> Snapshot:
+
+    data: Snapshot = {}
+
+    world = engine.game_world
+
+    map_state, index = snapshot_map( engine.game_map, data )
+
+    # every other floor visited so far
+    floors = world.floors.snapshot( data )
+
+    # message log
+    messages = engine.message_log.messages
+
+    _pack_strings( data, "messages.text", [ m.plain_text for m in messages ] )
+    data[ "messages.fg" ] = np.array( [ m.fg for m in messages ], dtype=np.uint8 ).reshape( -1, 3 )
+    data[ "messages.count" ] = np.array( [ m.count for m in messages ], dtype=np.int32 )
+
+    # everything else is a handful of scalars
+    pack_json( data, "meta", {
+        "world": { field: getattr( world, field ) for field in WORLD_FIELDS },
+        "map": map_state,
+        "floors": floors,
+        "player": index[ id( engine.player ) ],
+        "mouse_location": engine.mouse_location,
+        "summary": summarize( engine )
+    } )
+    return data
+
+# rebuild a map and its entities from a snapshot, the reverse of snapshot_map. when the
+# snapshot has no tiles or explored arrays the map keeps its defaults for the caller to
+# replace. returns the map and every entity in snapshot order
+def restore_map(
+    data: Snapshot, engine: Optional[ Engine ], map_state: Dict[ str, Any ], prefix: str = ""
+) -> Tuple[ GameMap, List[ Entity ] ]:
+
+    kinds = data[ prefix + "entities.kind" ].tolist()
+    owners = data[ prefix + "entities.owner" ].tolist()
+    xs = data[ prefix + "entities.x" ].tolist()
+    ys = data[ prefix + "entities.y" ].tolist()
+    colors = [ tuple( c ) for c in data[ prefix + "entities.color" ].tolist() ]
+    blocks = data[ prefix + "entities.blocks_movement" ].tolist()
+    render_orders = data[ prefix + "entities.render_order" ].tolist()
+    chars = _unpack_strings( data, prefix + "entities.char" )
+    names = _unpack_strings( data, prefix + "entities.name" )
+
+    actor_rows = iter( range( kinds.count( KIND_ACTOR ) ) )
+    item_rows = iter( range( kinds.count( KIND_ITEM ) ) )
+
+    fighters = data[ prefix + "fighters" ].tolist()
+    levels = data[ prefix + "levels" ].tolist()
+    capacities = data[ prefix + "inventories" ].tolist()
+    equipment = data[ prefix + "equipment" ].tolist()
+    ais = unpack_json( data, prefix + "ais" )
+    consumables = unpack_json( data, prefix + "consumables" )
+    equippables = unpack_json( data, prefix + "equippables" )
+
+    entities: List[ Entity ] = []
+    equipped: List[ Tuple[ Actor, int, int ] ] = []
+    ai_states: List[ Tuple[ Actor, Optional[ dict ] ] ] = []
+
+    for i, kind in enumerate( kinds ):
+
+        common = dict( x=xs[ i ], y=ys[ i ], char=chars[ i ], color=colors[ i ], name=names[ i ] )
+
+        entity: Entity
+
+        if kind == KIND_ACTOR:
+
+            row = next( actor_rows )
+            max_hp, hp, base_defense, base_power = fighters[ row ]
+
+            fighter = Fighter( hp=max_hp, base_defense=base_defense, base_power=base_power )
+            fighter._hp = hp
+
+            current_level, current_xp, level_up_base, level_up_factor, xp_given = levels[ row ]
+
+            entity = Actor(
+                **common,
+                ai_cls=components.ai.HostileEnemy,
+                equipment=Equipment(),
+                fighter=fighter,
+                inventory=Inventory( capacity=capacities[ row ] ),
+                level=Level(
+                    current_level=current_level,
+                    current_xp=current_xp,
+                    level_up_base=level_up_base,
+                    level_up_factor=level_up_factor,
+                    xp_given=xp_given
+                )
+            )
+            equipped.append( ( entity, *equipment[ row ] ) )
+            ai_states.append( ( entity, ais[ row ] ) )
+
+        elif kind == KIND_ITEM:
+
+            row = next( item_rows )
+
+            entity = Item( **common )
+            entity.consumable = _decode_item_component( consumables[ row ], consumable, entity )
+            entity.equippable = _decode_item_component( equippables[ row ], equippable, entity )
+
+        else:
+
+            entity = Entity( **common )
+
+        entity.blocks_movement = blocks[ i ]
+        entity.render_order = RenderOrder( render_orders[ i ] )
+
+        entities.append( entity )
+
+    for actor, state in ai_states:
+
+        actor.ai = _decode_ai( state, actor )
+
+    # equipped through the equipment so the items' bonuses are added to the fighter
+    for actor, weapon, armor in equipped:
+
+        for slot, row in ( ( "weapon", weapon ), ( "armor", armor ) ):
+
+            if row >= 0:
+
+                actor.equipment.equip_to_slot( slot, entities[ row ], add_message=False ) # type: ignore
+
+    # the map
+    width, height = map_state[ "width" ], map_state[ "height" ]
+
+    game_map = GameMap( engine, width, height ) # type: ignore
+
+    if prefix + "map.tiles" in data:
+
+        game_map.tiles = np.take( data[ prefix + "map.palette" ], data[ prefix + "map.tiles" ] ).reshape(
+            ( width, height ), order="F"
+        )
+        game_map.explored = data[ prefix + "map.explored" ].reshape(
+            ( width, height ), order="F"
+        ).copy( order="F" )
+
+    game_map.visible = data[ prefix + "map.visible" ].reshape(
+        ( width, height ), order="F"
+    ).copy( order="F" )
+    game_map.ai_rng = _unpack_rng( data[ prefix + "map.ai_rng" ] )
+    game_map.downstairs_location = tuple( map_state[ "downstairs_location" ] )
+    game_map.player_start_location = tuple( map_state[ "player_start_location" ] )
+
+    # saves from before floors could be revisited have no up stairs
+    if map_state.get( "upstairs_location" ) is not None:
+
+        game_map.upstairs_location = tuple( map_state[ "upstairs_location" ] )
+
+    for entity, owner in zip( entities, owners ):
+
+        if owner < 0:
+
+            entity.parent = game_map
+            game_map.entities.add( entity )
+
+        else:
+
+            inventory = entities[ owner ].inventory # type: ignore
+
+            entity.parent = inventory
+            inventory.items.append( entity )
+
+    return game_map, entities
+
+# rebuild an engine from a snapshot
+def restore( data: Snapshot ) -> Engine:
+
+    meta = unpack_json( data, "meta" )
+
+    # the engine is created from the player, so the current floor comes first
+    game_map, entities = restore_map( data, None, meta[ "map" ] )
+
+    engine = Engine( player=entities[ meta[ "player" ] ] ) # type: ignore
+    engine.mouse_location = tuple( meta[ "mouse_location" ] )
+    engine.turn = meta[ "summary" ].get( "turn", 0 ) if meta.get( "summary" ) else 0
+
+    world_state = meta[ "world" ]
+
+    if world_state[ "generator_chances" ] is not None:
+
+        world_state[ "generator_chances" ] = {
+            int( floor ): [ tuple( chance ) for chance in chances ]
+            for floor, chances in world_state[ "generator_chances" ].items()
+        }
+    engine.game_world = GameWorld( engine=engine, **world_state )
+
+    game_map.engine = engine
+    engine.game_map = game_map
+
+    # the other floors visited, saves from before floors could be revisited have none
+    engine.game_world.floors.restore( data, meta.get( "floors", {} ), engine )
+
+    # message log
+    for text, fg, count in zip(
+        _unpack_strings( data, "messages.text" ),
+        data[ "messages.fg" ].tolist(),
+        data[ "messages.count" ].tolist()
+    ):
+        message = Message( text, tuple( fg ) )
+        message.count = count
+
+        engine.message_log.messages.append( message )
+
+    return engine
+
+# numpy describes structured dtypes as nested lists of tuples, which json turns into lists
+def _descr_from_json( descr: Any ) -> Any:
+
+    if isinstance( descr, str ):
+
+        return descr
+
+    # each field is a name, a format and optionally a shape
+    return [
+        ( name, _descr_from_json( field_format ), *[ tuple( shape ) for shape in field_shape ] )
+        for name, field_format, *field_shape in descr
+    ]
+
+# bit-pack boolean arrays, eight values to a byte
+def _bitpack( array: np.ndarray ) -> np.ndarray:
+
+    return np.packbits( array.ravel() )
+
+def _bitunpack( stored: np.ndarray, count: int ) -> np.ndarray:
+
+    return np.unpackbits( stored, count=count ).astype( bool )
+
+# store integer arrays as the difference from the previous value, so that sorted and
+# slowly changing columns turn into runs of small numbers. the arithmetic wraps around,
+# which the running sum on load undoes exactly
+def _delta( array: np.ndarray ) -> np.ndarray:
+
+    flat = array.ravel()
+
+    stored = np.empty_like( flat )
+    stored[ :1 ] = flat[ :1 ]
+    np.subtract( flat[ 1: ], flat[ :-1 ], out=stored[ 1: ] )
+
+    return stored
+
+def _undelta( stored: np.ndarray, count: int ) -> np.ndarray:
+
+    return np.cumsum( stored, dtype=stored.dtype )
+
+# pre-filters applied to single arrays before the body is compressed, by name: a test for
+# whether the filter applies to an array, the filter, and its inverse
+FILTERS: Dict[ str, Tuple[ Callable[ [ np.ndarray ], bool ], Callable, Callable ] ] = {
+    "bitpack": ( lambda array: array.dtype == bool, _bitpack, _bitunpack ),
+    "delta": (
+        lambda array: array.dtype.kind in "iu" and array.dtype.itemsize > 1,
+        _delta,
+        _undelta
+    )
+}
+
+# compressors applied to the whole body, by name: compress( data, level ), decompress( data )
+# and the default level
+COMPRESSORS: Dict[ str, Tuple[ Callable[ [ bytes, int ], bytes ], Callable[ [ bytes ], bytes ], int ] ] = {
+    "none": ( lambda data, level: data, lambda data: data, 0 ),
+    "zlib": ( lambda data, level: zlib.compress( data, level ), zlib.decompress, 6 ),
+    "lzma": ( lambda data, level: lzma.compress( data, preset=level ), lzma.decompress, 6 )
+}
+
+# how a save is compressed, written as the pre-filters and compressor joined by "+" with an
+# optional level, e.g. "bitpack+delta+lzma:1"
+class Codec:
+
+    def __init__( self, compressor: str, level: Optional[ int ] = None, filters: Tuple[ str, ... ] = () ):
+
+        if compressor not in COMPRESSORS:
+
+            raise ValueError( f"Unknown compressor { compressor!r}." )
+
+        for name in filters:
+
+            if name not in FILTERS:
+
+                raise ValueError( f"Unknown save filter { name!r}." )
+
+        self.compressor = compressor
+        self.level = COMPRESSORS[ compressor ][ 2 ] if level is None else level
+        self.filters = filters
+
+    @classmethod
+    def parse( cls, spec: str ) -> Codec:
+
+        *filters, compressor = spec.split( "+" )
+        compressor, _, level = compressor.partition( ":" )
+
+        return cls( compressor, int( level ) if level else None, tuple( filters ) )
+
+    # the codec to save with given a codec, a spec or nothing for the default
+    @classmethod
+    def of( cls, codec: Union[ str, Codec, None ] ) -> Codec:
+
+        if codec is None:
+
+            return DEFAULT_CODEC
+
+        if isinstance( codec, str ):
+
+            return cls.parse( codec )
+
+        return codec
+
+    def __str__( self ) -> str:
+
+        return "+".join( [ *self.filters, f"{ self.compressor }:{ self.level }" ] )
+
+    def __repr__( self ) -> str:
+
+        return f"Codec( { str( self )!r} )"
+
+# boolean masks are most of a map's state, packing them first is nearly free and leaves
+# zlib an eighth of the data to compress. see benchmarks/save_codecs.py for the others
+DEFAULT_CODEC = Codec( "zlib", 6, ( "bitpack", "delta" ) )
+
+# serialize a snapshot into the uncompressed body, applying the first of the given
+# pre-filters that suits each array
+def encode_body( data: Snapshot, filters: Tuple[ str, ... ] = () ) -> bytes:
+
+    table = []
+    buffers = []
+
+    for name, array in data.items():
+
+        array = np.ascontiguousarray( array )
+
+        applied = next(
+            ( f for f in filters if array.size > 1 and FILTERS[ f ][ 0 ]( array ) ), None
+        )
+        stored = FILTERS[ applied ][ 1 ]( array ) if applied else array
+
+        table.append(
+            [ name, np.lib.format.dtype_to_descr( array.dtype ), array.shape, applied ]
+        )
+        buffers.append( stored.tobytes() )
+
+    encoded_table = json.dumps( table ).encode( "utf-8" )
+
+    return b"".join( [ struct.pack( "<I", len( encoded_table ) ), encoded_table, *buffers ] )
+
+def decode_body( body: bytes ) -> Snapshot:
+
+    ( table_length, ) = struct.unpack_from( "<I", body )
+    position = 4 + table_length
+
+    data: Snapshot = {}
+
+    # version 1 tables have no filter column
+    for name, descr, shape, *applied in json.loads( bytes( body[ 4 : position ] ) ):
+
+        dtype = np.dtype( _descr_from_json( descr ) )
+        count = math.prod( shape )
+
+        applied = applied[ 0 ] if applied else None
+
+        if applied == "bitpack":
+
+            stored_dtype, stored_count = np.dtype( np.uint8 ), ( count + 7 ) // 8
+
+        else:
+
+            stored_dtype, stored_count = dtype, count
+
+        array = np.frombuffer( body, dtype=stored_dtype, count=stored_count, offset=position )
+        position += stored_count * stored_dtype.itemsize
+
+        if applied:
+
+            if applied not in FILTERS:
+
+                raise exceptions.SaveFormatError( f"Unknown save filter { applied!r}." )
+
+            array = FILTERS[ applied ][ 2 ]( array, count )
+
+        data[ name ] = array.reshape( shape )
+
+    if position != len( body ):
+
+        raise exceptions.SaveFormatError( "The save file is corrupted." )
+
+    return data
+
+# encode a snapshot into the bytes of a complete save file
+def encode( data: Snapshot, codec: Codec = DEFAULT_CODEC ) -> bytes:
+
+    compress = COMPRESSORS[ codec.compressor ][ 0 ]
+
+    body = compress( encode_body( data, codec.filters ), codec.level )
+
+    header = json.dumps( {
+        "codec": codec.compressor,
+        "level": codec.level,
+        "filters": codec.filters,
+        "body_length": len( body ),
+        "checksum": zlib.crc32( body ),
+        "summary": unpack_json( data, "meta" ).get( "summary" )
+    } ).encode( "utf-8" )
+
+    return PREFIX.pack( MAGIC, FORMAT_VERSION, len( header ) ) + header + body
+
+# check the fixed part of a save and return the format version and json header length
+def _read_prefix( prefix: bytes ) -> Tuple[ int, int ]:
+
+    if len( prefix ) < PREFIX.size:
+
+        raise exceptions.SaveFormatError( "The save file is truncated." )
+
+    magic, version, header_length = PREFIX.unpack_from( prefix )
+
+    if magic != MAGIC:
+
+        raise exceptions.SaveFormatError( "This is not a save file." )
+
+    if version > FORMAT_VERSION:
+
+        raise exceptions.SaveFormatError(
+            f"The save file is from a newer version of the game ( format { version } )."
+        )
+
+    return version, header_length
+
+# read only the header of a save file, which holds the format version, the codec, a
+# checksum of the body and, from version 3 on, a summary of the game. this doesn't touch
+# the body, so it's cheap enough to call every time the main menu opens
+def read_header( filename: str ) -> Dict[ str, Any ]:
+
+    with open( filename, "rb" ) as f:
+
+        version, header_length = _read_prefix( f.read( PREFIX.size ) )
+
+        encoded_header = f.read( header_length )
+
+    if len( encoded_header ) != header_length:
+
+        raise exceptions.SaveFormatError( "The save file is truncated." )
+
+    header = json.loads( encoded_header )
+    header[ "version" ] = version
+
+    return header
+
+# decode the bytes of a save file back into a snapshot, the codec is read from the header
+def decode( save_data: bytes ) -> Snapshot:
+
+    return decode_with_header( save_data )[ 1 ]
+
+# decode a save file into its header and snapshot, parsing the header only once
+def decode_with_header( save_data: bytes ) -> Tuple[ Dict[ str, Any ], Snapshot ]:
+
+    version, header_length = _read_prefix( save_data )
+
+    header = json.loads( save_data[ PREFIX.size : PREFIX.size + header_length ] )
+    header[ "version" ] = version
+
+    # a view, the body is the bulk of the file and is only read from
+    body = memoryview( save_data )[ PREFIX.size + header_length : ]
+
+    if len( body ) != header[ "body_length" ]:
+
+        raise exceptions.SaveFormatError( "The save file is truncated." )
+
+    if "checksum" in header and zlib.crc32( body ) != header[ "checksum" ]:
+
+        raise exceptions.SaveFormatError( "The save file is corrupted." )
+
+    if header[ "codec" ] not in COMPRESSORS:
+
+        raise exceptions.SaveFormatError( f"Unknown save codec { header[ 'codec' ]!r}." )
+
+    decompress = COMPRESSORS[ header[ "codec" ] ][ 1 ]
+
+    data = decode_body( decompress( body ) )
+
+    if version == 1:
+
+        # version 1 bit-packed the visible and explored masks itself
+        map_state = unpack_json( data, "meta" )[ "map" ]
+
+        for name in ( "map.visible", "map.explored" ):
+
+            data[ name ] = _bitunpack( data[ name ], map_state[ "width" ] * map_state[ "height" ] )
+
+    return header, data
+
+# write a snapshot to a file. the save is written to a temporary file first and renamed
+# over the old one, so a crash part way through never leaves a truncated save behind
+def write_snapshot( data: Snapshot, filename: str, codec: Codec = DEFAULT_CODEC ) -> None:
+
+    save_data = encode( data, codec )
+
+    temporary_filename = filename + ".tmp"
+
+    with open( temporary_filename, "wb" ) as f:
+
+        f.write( save_data )
+        f.flush()
+        os.fsync( f.fileno() )
+
+    os.replace( temporary_filename, filename )
+
+# save an engine to a file
+def save_engine( engine: Engine, filename: str, codec: Codec = DEFAULT_CODEC ) -> None:
+
+    write_snapshot( snapshot( engine ), filename, codec )
+
+# load an engine from a file, along with the save's header
+def load_engine( filename: str ) -> Tuple[ Engine, Dict[ str, Any ] ]:
+
+    with open( filename, "rb" ) as f:
+
+        header, data = decode_with_header( f.read() )
+
+    return restore( data ), header
@@ -3,6 +3,7 @@ from __future__ import annotations
 import copy
 import lzma
 import pickle
+import time
 import traceback
 from typing import Optional
 
@@ -12,14 +13,18 @@ from tcod import libtcodpy
 import color
 from engine import Engine
 import entity_factories
+import exceptions
 import input_handlers
+from journal import Journal
+import save_format
 from game_map import GameWorld
 
 # load the background image and remove the alpha channel
 background_image = tcod.image.load( "menu_background.png")[:, :, :3]
 
-# return a brand new game session as an engine instance
-def new_game():
+# return a brand new game session as an engine instance, the seed makes the whole
+# dungeon reproducible and a random one is chosen when it isn't given
+def new_game( seed: Optional[ int ] = None ) -> Engine:
 
     map_width = 80
     map_height = 43
@@ -38,7 +43,8 @@ def new_game():
         room_min_size=room_min_size,
         room_max_size=room_max_size,
         map_width=map_width,
-        map_height=map_height
+        map_height=map_height,
+        seed=seed
     )
     engine.game_world.generate_floor()
     
@@ -61,20 +67,94 @@ def new_game():
 
     return engine
 
-# load an engine instance from a file
+# load an engine from a save file, saves from before the save format are whole pickled
+# engines and are still accepted, see the __setstate__ methods of Engine, GameWorld,
+# GameMap, MessageLog and Fighter
 def load_game( filename: str ) -> Engine:
 
-    with open( filename, "rb" ) as f:
+    summary = None
 
-        engine = pickle.loads( lzma.decompress( f.read() ) )
+    if save_format.is_save_file( filename ):
+
+        engine, header = save_format.load_engine( filename )
+        summary = header.get( "summary" )
+
+    else:
+
+        with open( filename, "rb" ) as f:
+
+            engine = pickle.loads( lzma.decompress( f.read() ) )
 
     assert isinstance( engine, Engine )
 
+    engine.save_filename = filename
+
+    # replay the turns journaled after the save was written, and keep journaling
+    journal = Journal( filename, engine.game_world.seed )
+
+    if summary is None or summary.get( "journal_sequence" ) is None:
+
+        journal.delete()
+        engine.journal = journal
+
+    else:
+
+        engine, replayed = journal.replay( engine, summary[ "journal_sequence" ] )
+
+        if replayed:
+
+            engine.message_log.add_message( f"Recovered { replayed } turns from the journal." )
+
+    # resume building the next floor in the background
+    engine.game_world.pregenerate_next_floor()
+
+    return engine
+
+# journal a new game, so a crash loses at most the turn in progress
+def start_journal( engine: Engine, save_filename: str ) -> Engine:
+
+    journal = Journal( save_filename, engine.game_world.seed )
+
+    # segments left by an earlier game
+    journal.delete()
+
+    engine.journal = journal
+    engine.save_filename = save_filename
+
     return engine
 
+# describe a save file for the main menu, or return None if there isn't a readable one.
+# only the header is read, the game itself is loaded when the player continues
+def describe_save( filename: str ) -> Optional[ str ]:
+
+    try:
+        summary = save_format.read_header( filename ).get( "summary" )
+    except ( OSError, ValueError, exceptions.SaveFormatError ):
+        return None
+
+    if summary is None:
+
+        return None
+
+    saved_at = time.strftime( "%Y-%m-%d %H:%M", time.localtime( summary[ "saved_at" ] ) )
+
+    return (
+        f"Floor { summary[ 'dungeon_level' ] }, Level { summary[ 'character_level' ] }, "
+        f"HP { summary[ 'hp' ] }/{ summary[ 'max_hp' ] } - { saved_at }"
+    )
+
 # handles the main menu rendering and input
 class MainMenu( input_handlers.BaseEventHandler ):
 
+    # "seed" is used for new games, which get a random one when it isn't given
+    def __init__( self, save_filename: str = "savegame.sav", seed: Optional[ int ] = None ) -> None:
+
+        self.save_filename = save_filename
+        self.seed = seed
+
+        # shown under the menu options if there is a game to continue
+        self.save_description = describe_save( save_filename )
+
     def on_render( self, console: tcod.console.Console ) -> None:
 
         # render the main menu on a background image
@@ -109,6 +189,18 @@ class MainMenu( input_handlers.BaseEventHandler ):
                 bg_blend=libtcodpy.BKGND_ALPHA(64)
             )
 
+        if self.save_description:
+
+            console.print(
+                console.width // 2,
+                console.height // 2 + 2,
+                self.save_description,
+                fg=color.menu_text,
+                bg=color.black,
+                alignment=libtcodpy.CENTER,
+                bg_blend=libtcodpy.BKGND_ALPHA(64)
+            )
+
     def ev_keydown(
         self, event: tcod.event.KeyDown
     ) -> Optional[ input_handlers.BaseEventHandler ]:
@@ -117,12 +209,14 @@ class MainMenu( input_handlers.BaseEventHandler ):
             raise SystemExit()
         elif event.sym == tcod.event.KeySym.c:
             try:
-                return input_handlers.MainGameEventHandler( load_game( "savegame.sav" ) )
+                return input_handlers.MainGameEventHandler( load_game( self.save_filename ) )
             except FileNotFoundError:
                 return input_handlers.PopupMessage( self, "No saved game to load." )
             except Exception as exc:
                 traceback.print_exc() # print to stderr
                 return input_handlers.PopupMessage( self, f"Failed to load save:\n{exc}" )
         elif event.sym == tcod.event.KeySym.n:
-            return input_handlers.MainGameEventHandler( new_game() )
+            return input_handlers.MainGameEventHandler(
+                start_journal( new_game( self.seed ), self.save_filename )
+            )
         return None
\ No newline at end of file
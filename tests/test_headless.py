@@ -0,0 +1,49 @@
+# run from the repository root:
+#   python -m pytest tests
+from __future__ import annotations
+
+from typing import Tuple
+
+from headless import Bot, HeadlessGame # type: ignore
+from setup_game import new_game # type: ignore
+
+# the bot dies on the third floor around turn 990 with this seed, which takes it past
+# plenty of fights with more than one enemy in view
+SEED = 7
+TURNS = 1500
+
+# play one game and return the turn it ended on and what was left of it
+def play( seed: int, turns: int ) -> Tuple[ int, tuple ]:
+
+    engine = new_game( seed )
+
+    # unlimited, as in headless.simulate
+    engine.ai_budget = None
+
+    game = HeadlessGame( engine, Bot() ).run( turns )
+
+    engine.game_world.cancel_pregeneration()
+
+    player = engine.player
+
+    state = (
+        engine.game_world.current_floor,
+        player.x,
+        player.y,
+        player.fighter.hp,
+        player.level.current_level,
+        player.level.current_xp,
+        game.kills,
+        sorted( ( actor.y, actor.x, actor.name, actor.fighter.hp ) for actor in engine.game_map.actors ),
+        [ message.full_text for message in engine.message_log.messages ]
+    )
+
+    return engine.turn, state
+
+def test_same_seed_plays_the_same_game() -> None:
+
+    first = play( SEED, TURNS )
+    second = play( SEED, TURNS )
+
+    assert first[ 0 ] == second[ 0 ]
+    assert first[ 1 ] == second[ 1 ]
@@ -57,4 +57,10 @@ down_stairs = new_tile(
     transparent=True,
     dark=( ord(">"), ( 255, 255, 255 ), ( 200, 180, 50 ) ),
     light=( ord(">"), ( 255, 255, 255 ), ( 200, 180, 50 ) )
+)
+up_stairs = new_tile(
+    walkable=True,
+    transparent=True,
+    dark=( ord("<"), ( 255, 255, 255 ), ( 200, 180, 50 ) ),
+    light=( ord("<"), ( 255, 255, 255 ), ( 200, 180, 50 ) )
 )
\ No newline at end of file
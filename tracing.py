@@ -0,0 +1,198 @@
+# opt-in tracing of engine phases and ai decisions, written as trace event json that
+# loads in chrome://tracing or ui.perfetto.dev. every instrumentation timer is traced too.
+#
+# every span is a complete ( "X" ) event with the thread it ran on and optional args,
+# such as the actor and action type. spans are buffered in memory as plain tuples and
+# only turned into json by flush(), which the main loop calls while it is idle, just
+# before waiting for input, so writing the file doesn't land inside the spans it times.
+#
+# the file is in the json array format, which the viewers also accept without the
+# closing bracket, so a trace cut short by a crash still loads.
+from __future__ import annotations
+
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, ContextManager, Dict, Iterator, List, Optional, Tuple, TypeVar
+
+import instrumentation # type: ignore
+
+F = TypeVar( "F", bound=Callable[ ..., Any ] )
+
+# name, start, end, thread id, args
+Span = Tuple[ str, float, float, int, Optional[ Dict[ str, Any ] ] ]
+
+class Tracer:
+
+    def __init__( self, filename: str, flush_spans: int = 50000, flush_interval: float = 5.0 ):
+
+        self.filename = filename
+
+        # flush once this many spans are buffered, or this many seconds have passed
+        self.flush_spans = flush_spans
+        self.flush_interval = flush_interval
+
+        self._spans: List[ Span ] = []
+
+        self._file = open( filename, "w" )
+        self._file.write( "[" )
+        self._first = True
+
+        # timestamps are microseconds from here
+        self._origin = time.perf_counter()
+        self._last_flush = self._origin
+
+        self._threads: Dict[ int, str ] = {}
+
+    # add a span, "start" and "end" are time.perf_counter() values
+    def complete(
+        self, name: str, start: float, end: float, args: Optional[ Dict[ str, Any ] ] = None
+    ) -> None:
+
+        self._spans.append( ( name, start, end, threading.get_ident(), args ) )
+
+    def _write( self, event: Dict[ str, Any ] ) -> None:
+
+        self._file.write( ( "\n" if self._first else ",\n" ) + json.dumps( event ) )
+        self._first = False
+
+    # write the buffered spans to the file
+    def flush( self ) -> None:
+
+        start = time.perf_counter()
+
+        spans, self._spans = self._spans, []
+
+        pid = os.getpid()
+
+        names = { thread.ident: thread.name for thread in threading.enumerate() }
+
+        for name, span_start, span_end, tid, args in spans:
+
+            if tid not in self._threads:
+
+                self._threads[ tid ] = names.get( tid, str( tid ) )
+
+                self._write( {
+                    "name": "thread_name", "ph": "M", "pid": pid, "tid": tid,
+                    "args": { "name": self._threads[ tid ] }
+                } )
+
+            event: Dict[ str, Any ] = {
+                "name": name,
+                "ph": "X",
+                "ts": ( span_start - self._origin ) * 1e6,
+                "dur": ( span_end - span_start ) * 1e6,
+                "pid": pid,
+                "tid": tid
+            }
+
+            if args:
+
+                event[ "args" ] = args
+
+            self._write( event )
+
+        self._file.flush()
+
+        # the flush itself, so its cost shows up in the trace
+        self._last_flush = time.perf_counter()
+        self.complete( "trace.flush", start, self._last_flush, { "spans": len( spans ) } )
+
+    # flush if enough spans are buffered or enough time has passed since the last flush
+    def flush_if_due( self ) -> None:
+
+        if (
+            len( self._spans ) >= self.flush_spans
+            or time.perf_counter() - self._last_flush >= self.flush_interval
+        ):
+            self.flush()
+
+    def close( self ) -> None:
+
+        self.flush()
+
+        self._file.write( "\n]\n" )
+        self._file.close()
+
+# the active tracer, None while tracing is off
+tracer: Optional[ Tracer ] = None
+
+def start( filename: str, **kwargs: Any ) -> Tracer:
+
+    global tracer
+
+    stop()
+
+    tracer = Tracer( filename, **kwargs )
+
+    instrumentation.add_sink( tracer.complete )
+
+    return tracer
+
+def stop() -> None:
+
+    global tracer
+
+    if tracer is not None:
+
+        instrumentation.remove_sink( tracer.complete )
+
+        tracer.close()
+        tracer = None
+
+def flush_if_due() -> None:
+
+    if tracer is not None:
+
+        tracer.flush_if_due()
+
+@contextlib.contextmanager
+def _span( name: str, args: Dict[ str, Any ] ) -> Iterator[ None ]:
+
+    start = time.perf_counter()
+
+    try:
+        yield
+    finally:
+        if tracer is not None:
+            tracer.complete( name, start, time.perf_counter(), args or None )
+
+# trace a block of code, keyword arguments are shown with the span:
+#   with tracing.span( "dispatch", event="KeyDown" ):
+def span( name: str, **args: Any ) -> ContextManager[ None ]:
+
+    if tracer is None:
+
+        return contextlib.nullcontext()
+
+    return _span( name, args )
+
+# trace every call of an Action's perform, named after the action's class and tagged
+# with the actor performing it
+def traced_perform( function: F ) -> F:
+
+    @functools.wraps( function )
+    def wrapper( self: Any ) -> Any:
+
+        if tracer is None:
+
+            return function( self )
+
+        # taken first, an actor that dies is renamed
+        actor = self.entity.name
+
+        start = time.perf_counter()
+
+        try:
+            return function( self )
+        finally:
+            if tracer is not None:
+                tracer.complete(
+                    f"{ type( self ).__name__ }.perform", start, time.perf_counter(), { "actor": actor }
+                )
+
+    return wrapper # type: ignore